@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import time
+
+import batch
+import cache
+
+# Замер решений в секунду: несколько соединений, запросы идут пачками без ожидания ответов
+HOST = '127.0.0.1'
+BASE_PORT = 18089
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Server.py')
+LENGTH_PREFIX = struct.Struct('!I')
+
+
+def make_batch(size, framing, seed=1, distinct=0):
+    """Пачка случайных уравнений, закодированная заранее: клиент не должен тратить процессор на JSON.
+    distinct > 0 - коэффициенты берутся из набора такого размера, и уравнения повторяются."""
+    rng = random.Random(seed)
+    pool = [(rng.randint(-50, 50) or 1, rng.randint(-100, 100), rng.randint(-100, 100)) for _ in range(distinct)]
+    requests = []
+    for number in range(size):
+        if pool:
+            a, b, c = rng.choice(pool)
+        else:
+            a, b, c = rng.randint(-50, 50) or 1, rng.randint(-100, 100), rng.randint(-100, 100)
+        data = json.dumps({"id": number, "a": a, "b": b, "c": c}).encode()
+        requests.append(data + b'\n' if framing == 'ndjson' else LENGTH_PREFIX.pack(len(data)) + data)
+    return b''.join(requests)
+
+
+async def count_responses(reader, expected, framing, buffer):
+    """Дочитывает expected ответов; JSON не разбирается, считаются только границы кадров."""
+    received = 0
+    while received < expected:
+        if framing == 'ndjson':
+            data = await reader.read(65536)
+            if not data:
+                raise ConnectionError("сервер закрыл соединение")
+            received += data.count(b'\n')
+            continue
+        while len(buffer) >= LENGTH_PREFIX.size:
+            length, = LENGTH_PREFIX.unpack_from(buffer)
+            if len(buffer) < LENGTH_PREFIX.size + length:
+                break
+            del buffer[:LENGTH_PREFIX.size + length]
+            received += 1
+        if received < expected:
+            data = await reader.read(65536)
+            if not data:
+                raise ConnectionError("сервер закрыл соединение")
+            buffer += data
+    return received
+
+
+async def cache_stats(port):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.write(b'{"stats": true}\n')
+    response = json.loads(await reader.readline())
+    writer.close()
+    return response.get('cache', {})
+
+
+async def connection_loop(port, requests, batch_size, framing, deadline):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    solved = 0
+    buffer = bytearray()
+    try:
+        while time.monotonic() < deadline:
+            writer.write(requests)
+            solved += await count_responses(reader, batch_size, framing, buffer)
+    finally:
+        writer.close()
+    return solved
+
+
+def make_columns(size, seed=1):
+    """Столбцы коэффициентов для пакетного запроса: все виды уравнений вперемешку."""
+    rng = random.Random(seed)
+    a = [rng.randint(-50, 50) for _ in range(size)]
+    b = [rng.randint(-100, 100) for _ in range(size)]
+    c = [rng.randint(-100, 100) for _ in range(size)]
+    return a, b, c
+
+
+async def read_frame(reader):
+    length, = LENGTH_PREFIX.unpack(await reader.readexactly(LENGTH_PREFIX.size))
+    return await reader.readexactly(length)
+
+
+async def run_vector(port, size, repeat, workers):
+    """Пакетный режим: size уравнений одним запросом, JSON по строке и двоичный кадр."""
+    a, b, c = make_columns(size)
+    binary_request = batch.encode_binary_request(a, b, c)
+    json_request = json.dumps({"a": a, "b": b, "c": c}).encode()
+
+    # Только вычисление, без сети и разбора запроса
+    columns = [batch.to_column(column, name) for column, name in ((a, 'a'), (b, 'b'), (c, 'c'))]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        batch.solve_columns(*columns)
+    timings = {'вычисление': (time.perf_counter() - start) / repeat}
+
+    server = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--port', str(port), '--workers', str(workers)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        await wait_for_port(port)
+        reader, writer = await asyncio.open_connection(HOST, port)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            writer.write(LENGTH_PREFIX.pack(len(binary_request)) + binary_request)
+            kind = batch.decode_binary_response(await read_frame(reader))[0]
+            assert len(kind) == size
+        timings['двоичный кадр'] = (time.perf_counter() - start) / repeat
+        writer.close()
+
+        reader, writer = await asyncio.open_connection(HOST, port, limit=batch.MAX_BATCH * 64)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            writer.write(json_request + b'\n')
+            response = json.loads(await reader.readline())
+            assert response['count'] == size, response
+        timings['JSON'] = (time.perf_counter() - start) / repeat
+        writer.close()
+    finally:
+        server.terminate()
+        server.wait()
+    return timings
+
+
+async def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Сервер на порту {port} не запустился")
+
+
+async def run(port, connections, batch_size, duration, framing, workers, distinct, cache_size):
+    server = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--port', str(port), '--workers', str(workers),
+                               '--cache-size', str(cache_size)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        await wait_for_port(port)
+        requests = make_batch(batch_size, framing, distinct=distinct)
+        start = time.monotonic()
+        solved = await asyncio.gather(*(connection_loop(port, requests, batch_size, framing, start + duration)
+                                        for _ in range(connections)))
+        elapsed = time.monotonic() - start
+        stats = await cache_stats(port)
+    finally:
+        server.terminate()
+        server.wait()
+    return sum(solved), elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервиса квадратных уравнений Task2")
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=500, help="запросов в пачке одного соединения")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--framing', choices=['ndjson', 'length'], default='ndjson')
+    parser.add_argument('--workers', type=int, default=1, help="число процессов сервера")
+    parser.add_argument('--vector', type=int, metavar='N', default=0,
+                        help="вместо потока запросов замерить один пакетный запрос из N уравнений")
+    parser.add_argument('--repeat', type=int, default=5, help="повторов пакетного запроса")
+    parser.add_argument('--distinct', type=int, default=0,
+                        help="сколько разных уравнений в пачке (0 - все случайные), чтобы проверить кэш")
+    parser.add_argument('--cache-size', type=int, default=cache.CACHE_SIZE, help="размер кэша сервера, 0 - без кэша")
+    args = parser.parse_args()
+
+    if args.vector:
+        timings = asyncio.run(run_vector(BASE_PORT, args.vector, args.repeat, args.workers))
+        print(f"[пакет из {args.vector} уравнений, {batch.BACKEND}]")
+        for name, seconds in timings.items():
+            print(f"  {name}: {seconds * 1000:.1f} мс - {args.vector / seconds:.0f} решений/с")
+        return
+
+    solved, elapsed, stats = asyncio.run(run(BASE_PORT, args.connections, args.batch, args.duration, args.framing,
+                                             args.workers, args.distinct, args.cache_size))
+    print(f"[{args.framing}, соединений: {args.connections}, пачка: {args.batch}, процессов: {args.workers}] "
+          f"решено: {solved} за {elapsed:.1f} с - {solved / elapsed:.0f} решений/с")
+    # При нескольких процессах счётчики - только того, кому достался запрос статистики
+    print(f"  кэш: попаданий {stats.get('hits')}, промахов {stats.get('misses')}, "
+          f"доля попаданий {stats.get('hit_ratio')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,72 +1,177 @@
+import argparse
 import json
 import socket
 
 # Параметры сервера для подключения
 HOST = '127.0.0.1'
 PORT = 8089
+RECV_SIZE = 65536
+# Сколько запросов пакетного режима отправлять, прежде чем читать ответы на них
+BATCH_SIZE = 1000
+
+
+def print_result(result):
+    # Вывод результата
+    print("\n--- Результат от сервера ---")
+
+    if result.get("status") == "success":
+        print(f"Уравнение: {result['equation']}")
+        print(f"Статус: {result['message']}")
+        print("Корни:")
+        for root in result['roots']:
+            print(f"  {root}")
+    else:
+        print(f"Ошибка: {result.get('message', 'Неизвестная ошибка')}")
+
+    print("----------------------------\n")
+
+
+def read_lines(s, count, buffer=b''):
+    """Читает из сокета count строк-ответов; возвращает их и остаток буфера."""
+    lines = []
+    while len(lines) < count:
+        end = buffer.find(b'\n')
+        if end >= 0:
+            lines.append(buffer[:end])
+            buffer = buffer[end + 1:]
+            continue
+        data = s.recv(RECV_SIZE)
+        if not data:
+            raise ConnectionError("сервер закрыл соединение")
+        buffer += data
+    return lines, buffer
 
 
 def start_client():
-    """Запускает TCP-клиент, отправляющий JSON."""
-    print("Введите коэффициенты квадратного уравнения (ax^2 + bx + c = 0).")
-    try:
-        a = float(input("Введите коэффициент 'a': "))
-        b = float(input("Введите коэффициент 'b': "))
-        c = float(input("Введите коэффициент 'c': "))
-    except ValueError:
-        print("Ошибка ввода: Введите числовые значения.")
-        return
-
-    # 1. Формирование Python-словаря
-    data_dict = {
-        "a": a,
-        "b": b,
-        "c": c
-    }
-
-    # 2. Кодирование словаря в JSON-строку
-    data_to_send = json.dumps(data_dict)
-
+    """Запускает TCP-клиент, отправляющий JSON: все уравнения идут по одному соединению."""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         try:
             print(f"Подключение к серверу {HOST}:{PORT}...")
             s.connect((HOST, PORT))
             print("Соединение установлено.")
-
-            # 3. Отправка JSON-строки
-            print(f"Отправка данных (JSON): {data_to_send}")
-            s.sendall(data_to_send.encode('utf-8'))
-
-            # 4. Получение ответа от сервера
-            print("Ожидание ответа от сервера...")
-            data = s.recv(1024)
-
-            received_json_str = data.decode('utf-8')
-
-            # 5. Декодирование ответа
-            result = json.loads(received_json_str)
-
-            # Вывод результата
-            print("\n--- Результат от сервера ---")
-
-            if result.get("status") == "success":
-                print(f"Уравнение: {result['equation']}")
-                print(f"Статус: {result['message']}")
-                print("Корни:")
-                for root in result['roots']:
-                    print(f"  {root}")
-            else:
-                print(f"Ошибка: {result.get('message', 'Неизвестная ошибка')}")
-
-            print("----------------------------\n")
-
         except ConnectionRefusedError:
             print(f"Ошибка: Не удалось подключиться к серверу {HOST}:{PORT}. Убедитесь, что сервер запущен.")
-        except json.JSONDecodeError:
-            print("Ошибка: Получен неверный JSON-ответ от сервера.")
-        except Exception as e:
-            print(f"Произошла ошибка: {e}")
+            return
+
+        buffer = b''
+        while True:
+            print("Введите коэффициенты квадратного уравнения (ax^2 + bx + c = 0), пустой ввод - выход.")
+            try:
+                raw = input("Введите коэффициент 'a': ")
+                if not raw.strip():
+                    break
+                a = float(raw)
+                b = float(input("Введите коэффициент 'b': "))
+                c = float(input("Введите коэффициент 'c': "))
+            except ValueError:
+                print("Ошибка ввода: Введите числовые значения.")
+                continue
+            except EOFError:
+                break
+
+            # 1. Формирование Python-словаря
+            data_dict = {
+                "a": a,
+                "b": b,
+                "c": c
+            }
+
+            # 2. Кодирование словаря в JSON-строку; запросы разделяются переводом строки
+            data_to_send = json.dumps(data_dict)
+
+            try:
+                # 3. Отправка JSON-строки
+                print(f"Отправка данных (JSON): {data_to_send}")
+                s.sendall(data_to_send.encode('utf-8') + b'\n')
+
+                # 4. Получение ответа от сервера и декодирование
+                lines, buffer = read_lines(s, 1, buffer)
+                print_result(json.loads(lines[0]))
+            except json.JSONDecodeError:
+                print("Ошибка: Получен неверный JSON-ответ от сервера.")
+            except Exception as e:
+                print(f"Произошла ошибка: {e}")
+                break
+
+
+def read_equations(path):
+    """Уравнения из файла, по строке "a b c"; строки с ошибками пропускаются."""
+    equations = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                a, b, c = (float(value) for value in line.split())
+            except ValueError:
+                print(f"Строка {number} пропущена: нужно три числа")
+                continue
+            equations.append({"id": number, "a": a, "b": b, "c": c})
+    return equations
+
+
+def run_batch(path):
+    """Пакетный режим: уравнения из файла (строки "a b c") уходят пачками по BATCH_SIZE,
+    ответы на пачку читаются после её отправки."""
+    equations = read_equations(path)
+    lines = []
+    with socket.create_connection((HOST, PORT)) as s:
+        # Если отправить всё сразу и только потом читать, сервер, которому некуда девать ответы,
+        # перестанет читать запросы, и обе стороны будут ждать друг друга
+        for start in range(0, len(equations), BATCH_SIZE):
+            batch = equations[start:start + BATCH_SIZE]
+            s.sendall(b''.join(json.dumps(equation).encode('utf-8') + b'\n' for equation in batch))
+            batch_lines, _ = read_lines(s, len(batch))
+            lines += batch_lines
+    for line in lines:
+        result = json.loads(line)
+        print(f"[строка {result.get('id')}] {result.get('equation', '')}: "
+              f"{result.get('message')} {result.get('roots', '')}")
+
+
+def run_columns(path):
+    """Все уравнения файла одним запросом с массивами коэффициентов; ответ приходит по столбцам."""
+    equations = read_equations(path)
+    request = {name: [equation[name] for equation in equations] for name in ('a', 'b', 'c')}
+    with socket.create_connection((HOST, PORT)) as s:
+        s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        lines, _ = read_lines(s, 1)
+    result = json.loads(lines[0])
+    if result.get("status") != "success":
+        print(f"Ошибка: {result.get('message')}")
+        return
+    # Коды столбца kind - из batch.py: 0 ошибка, 1 линейное, 2 комплексные, 3 один корень, 4 два корня
+    for equation, kind, x1, x2, im in zip(equations, result['kind'], result['x1'], result['x2'], result['im']):
+        if kind == 2:
+            roots = f"{x1} ± {abs(im)}i"
+        else:
+            roots = ", ".join(str(x) for x in (x1, x2) if x is not None) or "нет"
+        print(f"[строка {equation['id']}] {equation['a']}x^2 + {equation['b']}x + {equation['c']} = 0: {roots}")
+
+
+def print_stats():
+    """Счётчики кэша ответов сервера (у каждого процесса сервера свои)."""
+    with socket.create_connection((HOST, PORT)) as s:
+        s.sendall(b'{"stats": true}\n')
+        lines, _ = read_lines(s, 1)
+    stats = json.loads(lines[0]).get("cache", {})
+    print(f"Кэш: попаданий {stats.get('hits')}, промахов {stats.get('misses')}, "
+          f"доля попаданий {stats.get('hit_ratio')}, записей {stats.get('size')} из {stats.get('capacity')}")
 
 
 if __name__ == '__main__':
-    start_client()
+    parser = argparse.ArgumentParser(description="Клиент сервиса квадратных уравнений")
+    parser.add_argument('--batch', metavar='FILE', default=None,
+                        help="решить все уравнения из файла (по строке \"a b c\") пачками без ожидания ответов")
+    parser.add_argument('--columns', action='store_true',
+                        help="вместе с --batch: отправить файл одним запросом с массивами a, b, c")
+    parser.add_argument('--stats', action='store_true', help="показать счётчики кэша ответов сервера")
+    args = parser.parse_args()
+    if args.stats:
+        print_stats()
+    elif args.batch and args.columns:
+        run_columns(args.batch)
+    elif args.batch:
+        run_batch(args.batch)
+    else:
+        start_client()
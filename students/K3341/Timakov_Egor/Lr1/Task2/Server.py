@@ -1,11 +1,48 @@
+"""Сервис решения квадратных уравнений: долгоживущий, много клиентов одновременно.
+
+Клиент держит одно соединение и шлёт по нему сколько угодно запросов
+{"a": ..., "b": ..., "c": ...} (поле "id" возвращается в ответе как есть).
+Ответы на одиночные уравнения кэшируются (см. cache.py); запрос {"stats": true}
+возвращает счётчики попаданий и промахов кэша.
+Если a, b и c - массивы, это пакетный запрос: все уравнения решаются разом
+и ответ приходит по столбцам (см. batch.py); в кадрах с длиной тот же пакет
+можно прислать и в двоичном виде.
+Ответы приходят в порядке запросов, поэтому запросы можно слать пачкой,
+не дожидаясь ответов. Формат кадров определяется по первому байту соединения:
+
+* JSON-объект и перевод строки (NDJSON) - обычный случай, первый байт '{';
+* 4 байта длины (big-endian) и JSON или двоичный пакет - любой другой первый байт.
+
+Ответы идут в том же формате. Ошибка в JSON запроса даёт ответ со
+status "error" и не мешает следующим запросам; нарушение формата кадров
+(слишком длинная строка или кадр) закрывает только это соединение.
+"""
+import argparse
+import asyncio
 import json
 import math
-import socket
+import os
+import struct
+import sys
+
+# Запуск в нескольких процессах (pre-fork) лежит в каталоге Lr1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prefork  # noqa: E402
+
+import batch  # noqa: E402
+import cache  # noqa: E402
 
 
 # Параметры сервера
 HOST = '127.0.0.1'
 PORT = 8089
+# Максимальный размер одного запроса: пакет из MAX_BATCH уравнений в JSON занимает до ~30 МБ
+MAX_REQUEST = 32 * 1024 * 1024
+LENGTH_PREFIX = struct.Struct('!I')
+# С этих байтов начинается NDJSON-соединение; с любого другого - кадры с длиной
+NDJSON_FIRST_BYTES = (b'{', b' ', b'\t', b'\r', b'\n')
+# Пока клиент не забирает ответы и их накопилось больше, новые запросы не читаются
+WRITE_HIGH_WATER = 1024 * 1024
 
 
 def solve_quadratic(a, b, c):
@@ -52,54 +89,173 @@ def solve_quadratic(a, b, c):
     return result
 
 
-def start_server():
-    """Запускает TCP-сервер, обрабатывающий JSON."""
-    print(f"Сервер запускается на {HOST}:{PORT}...")
+# Кэш ответов на одиночные уравнения; у каждого процесса pre-fork он свой
+result_cache = cache.ResultCache(solve_quadratic)
+
+
+def handle_request(data):
+    """Разбирает один запрос (bytes с JSON) и возвращает уже закодированный ответ:
+    JSON или, на двоичный пакетный запрос, двоичный ответ."""
+    if data[:len(batch.BINARY_MAGIC)] == batch.BINARY_MAGIC:
+        try:
+            return batch.solve_binary(data)
+        except batch.BatchError as e:
+            return cache.encode({"status": "error", "message": f"Ошибка пакета: {e}"})
+
+    coeffs = None
+    try:
+        # 1. Декодирование JSON
+        coeffs = json.loads(data)
+
+        if isinstance(coeffs, dict) and coeffs.get('stats'):
+            # Запрос статистики кэша этого процесса
+            response_data = {"status": "success", "cache": result_cache.stats()}
+        else:
+            # Проверка наличия всех коэффициентов
+            a = coeffs['a']
+            b = coeffs['b']
+            c = coeffs['c']
+
+            # 2. Решение уравнения (через кэш, сразу в байтах JSON) или, если пришли массивы, всего пакета разом
+            if isinstance(a, list):
+                response_data = batch.solve_json(a, b, c)
+            else:
+                response_data = result_cache.lookup(a, b, c)
+
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return cache.encode({"status": "error", "message": "Ошибка декодирования JSON. Неверный формат."})
+    except KeyError:
+        response_data = {"status": "error", "message": "Ошибка: Отсутствует один из ключей (a, b, c)."}
+    except batch.BatchError as e:
+        response_data = {"status": "error", "message": f"Ошибка пакета: {e}"}
+    except Exception as e:
+        response_data = {"status": "error", "message": f"Неизвестная ошибка на сервере: {e}"}
+
+    response = response_data if isinstance(response_data, bytes) else cache.encode(response_data)
+    if isinstance(coeffs, dict) and 'id' in coeffs:
+        response = cache.with_id(response, coeffs["id"])
+    return response
+
+
+class FrameError(ValueError):
+    """Поток нарушает формат кадров: соединение дальше не разобрать."""
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
-        s.listen()
-        print("Сервер запущен. Ожидание соединения...")
 
-        # Основной цикл для обработки одного клиента
-        connection, address = s.accept()
-        with connection:
-            print(f"Соединение установлено с {address}")
-            data = connection.recv(1024)
+class QuadraticProtocol(asyncio.Protocol):
+    """Одно соединение: все запросы, пришедшие одним куском, обрабатываются разом,
+    а их ответы уходят одним вызовом write."""
 
-            if not data:
-                return
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = bytearray()
+        # 'ndjson' или 'length', определяется по первому байту
+        self.framing = None
 
-            received_json_str = data.decode('utf-8')
-            print(f"Получены данные (JSON) от клиента: {received_json_str}")
+    def data_received(self, data):
+        self.buffer += data
+        if self.framing is None:
+            self.framing = 'ndjson' if self.buffer[:1] in NDJSON_FIRST_BYTES else 'length'
+        responses = []
+        try:
+            if self.framing == 'ndjson':
+                self._split_lines(responses, len(data))
+            else:
+                self._split_frames(responses)
+        except FrameError as e:
+            responses.append(self._encode(cache.encode({"status": "error", "message": f"Ошибка формата: {e}"})))
+            self.transport.write(b''.join(responses))
+            self.transport.close()
+            return
+        if responses:
+            self.transport.write(b''.join(responses))
 
-            response_data = {}
-            try:
-                # 1. Декодирование JSON
-                coeffs = json.loads(received_json_str)
+    def _split_lines(self, responses, received):
+        # Перевод строки ищем только в новом куске: большой пакет приходит сотнями кусков,
+        # и поиск по всему буферу каждый раз сделал бы приём квадратичным
+        end = self.buffer.rfind(b'\n', len(self.buffer) - received)
+        if end >= 0:
+            # Режем буфер один раз на все полные строки куска
+            lines = bytes(self.buffer[:end]).split(b'\n')
+            del self.buffer[:end + 1]
+            for line in lines:
+                if len(line) > MAX_REQUEST:
+                    raise FrameError("слишком длинная строка")
+                if line.strip():
+                    responses.append(self._encode(handle_request(line)))
+        if len(self.buffer) > MAX_REQUEST:
+            raise FrameError("слишком длинная строка")
 
-                # Проверка наличия всех коэффициентов
-                a = coeffs['a']
-                b = coeffs['b']
-                c = coeffs['c']
+    def _split_frames(self, responses):
+        pos = 0
+        buffer = self.buffer
+        while len(buffer) - pos >= LENGTH_PREFIX.size:
+            length, = LENGTH_PREFIX.unpack_from(buffer, pos)
+            if length > MAX_REQUEST:
+                raise FrameError("слишком длинный кадр")
+            end = pos + LENGTH_PREFIX.size + length
+            if len(buffer) < end:
+                break
+            responses.append(self._encode(handle_request(bytes(buffer[pos + LENGTH_PREFIX.size:end]))))
+            pos = end
+        del buffer[:pos]
 
-                # 2. Решение уравнения
-                response_data = solve_quadratic(a, b, c)
+    def _encode(self, data):
+        if self.framing == 'ndjson':
+            if data[:1] != b'{':
+                data = cache.encode({"status": "error",
+                                     "message": "Двоичный пакет передаётся только в кадрах с длиной."})
+            return data + b'\n'
+        return LENGTH_PREFIX.pack(len(data)) + data
 
-            except json.JSONDecodeError:
-                response_data = {"status": "error", "message": "Ошибка декодирования JSON. Неверный формат."}
-            except KeyError:
-                response_data = {"status": "error", "message": "Ошибка: Отсутствует один из ключей (a, b, c)."}
-            except Exception as e:
-                response_data = {"status": "error", "message": f"Неизвестная ошибка на сервере: {e}"}
+    def eof_received(self):
+        # Клиент, который шлёт один запрос без перевода строки и закрывает запись, тоже получает ответ
+        if self.framing == 'ndjson' and self.buffer.strip():
+            self.transport.write(self._encode(handle_request(bytes(self.buffer))))
+        return False
 
-            # 3. Отправка ответа (JSON)
-            response_json_str = json.dumps(response_data)
-            print(f"Отправка ответа: {response_data['status']}")
-            connection.sendall(response_json_str.encode('utf-8'))
+    def pause_writing(self):
+        # Клиент не успевает читать ответы - перестаём читать его запросы
+        self.transport.pause_reading()
 
+    def resume_writing(self):
+        self.transport.resume_reading()
 
 
+async def serve(server_socket=None, port=PORT):
+    loop = asyncio.get_running_loop()
+    if server_socket is not None:
+        server = await loop.create_server(QuadraticProtocol, sock=server_socket)
+    else:
+        server = await loop.create_server(QuadraticProtocol, HOST, port)
+    for transport_socket in server.sockets:
+        print(f"Сервер запущен на {HOST}:{transport_socket.getsockname()[1]} (PID {os.getpid()}). "
+              f"Ожидание соединений...")
+    async with server:
+        await server.serve_forever()
+
+
+def start_server(port=PORT, workers=1, cache_size=cache.CACHE_SIZE, cache_ttl=cache.CACHE_TTL):
+    """Запускает TCP-сервер, обрабатывающий JSON; workers > 1 - несколько процессов на одном порту."""
+    global result_cache
+    result_cache = cache.ResultCache(solve_quadratic, cache_size, cache_ttl)
+    print(f"Сервер запускается на {HOST}:{port}...")
+    try:
+        if workers > 1:
+            prefork.run(lambda server_socket: asyncio.run(serve(server_socket)), HOST, port, workers)
+        else:
+            asyncio.run(serve(port=port))
+    except KeyboardInterrupt:
+        print("\nСервер остановлен.")
+    except OSError as e:
+        print(f"Не удалось запустить сервер: {e}")
+
 
 if __name__ == '__main__':
-    start_server()
+    parser = argparse.ArgumentParser(description="Сервис решения квадратных уравнений (JSON по TCP)")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=1, help="число процессов на одном порту (pre-fork)")
+    parser.add_argument('--cache-size', type=int, default=cache.CACHE_SIZE,
+                        help="сколько ответов хранить в кэше каждого процесса, 0 - без кэша")
+    parser.add_argument('--cache-ttl', type=float, default=cache.CACHE_TTL, help="время жизни ответа в кэше, с")
+    args = parser.parse_args()
+    start_server(args.port, args.workers, args.cache_size, args.cache_ttl)
@@ -0,0 +1,209 @@
+"""Пакетное решение квадратных уравнений: все коэффициенты сразу, ответ по столбцам.
+
+Запрос приходит в одном из двух видов:
+
+* JSON {"a": [...], "b": [...], "c": [...]} - массивы одинаковой длины;
+* двоичный кадр: BINARY_MAGIC, число уравнений n ('<I'), затем столбцы
+  a[n], b[n], c[n] в float64 little-endian.
+
+Ответ тоже по столбцам: kind - вид решения (коды ниже), x1 и x2 - корни,
+im - мнимая часть для комплексных корней (x1 + im*i и x2 - im*i).
+Отсутствующий корень - null в JSON и NaN в двоичном ответе, который
+устроен так: RESULT_MAGIC, n ('<I'), столбцы x1, x2, im (float64) и kind (uint8).
+
+Если установлен NumPy, дискриминант и корни считаются векторно над всеми
+уравнениями сразу; без него - тем же алгоритмом в цикле на чистом Python.
+"""
+import math
+import struct
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Виды решения (столбец kind). Порядок кодов COMPLEX < ONE_ROOT < TWO_ROOTS
+# важен: векторная версия получает их сложением сравнений дискриминанта с нулём
+ERROR = 0       # a и b равны 0 - не уравнение
+LINEAR = 1      # a = 0: bx + c = 0, корень x1
+COMPLEX = 2     # x1 = x2 - действительная часть, im - мнимая
+ONE_ROOT = 3    # дискриминант 0, корень x1
+TWO_ROOTS = 4   # два действительных корня x1, x2
+KIND_NAMES = {
+    ERROR: "Не квадратное уравнение: a и b равны 0.",
+    LINEAR: "Линейное уравнение",
+    ONE_ROOT: "Один действительный корень",
+    TWO_ROOTS: "Два действительных корня",
+    COMPLEX: "Комплексные корни",
+}
+
+BACKEND = 'numpy' if np is not None else 'python'
+# Больше уравнений в одном запросе не принимаем: миллион занимает около 24 МБ
+MAX_BATCH = 1 << 20
+BINARY_MAGIC = b'QBAT'
+RESULT_MAGIC = b'QRES'
+BINARY_HEADER = struct.Struct('<4sI')
+FLOAT_SIZE = 8
+
+
+class BatchError(ValueError):
+    """Пакетный запрос составлен неверно."""
+
+
+def _solve_numpy(a, b, c):
+    # Деление на 0 и корень из NaN в строках, где они не нужны, ожидаемы - предупреждения не нужны
+    with np.errstate(all='ignore'):
+        discriminant = b * b
+        discriminant -= 4 * a * c
+        # COMPLEX + (D >= 0) + (D > 0); при D = NaN (NaN в коэффициентах) получается ERROR
+        kind = (discriminant == discriminant).astype(np.uint8)
+        kind *= COMPLEX
+        kind += discriminant >= 0
+        kind += discriminant > 0
+        # При a = 0 решение зависит только от b
+        kind = np.where(a != 0, kind, (b != 0).astype(np.uint8))
+
+        two_a = 2 * a
+        real = -b / two_a
+        offset = np.sqrt(np.abs(discriminant))
+        offset /= two_a
+        two_roots = kind == TWO_ROOTS
+        complex_roots = kind == COMPLEX
+        # При D = 0 offset равен 0, и real + offset - тот самый единственный корень
+        x1 = np.where(two_roots, real + offset, real)
+        x1 = np.where(kind == LINEAR, -c / b, x1)
+        x1[kind == ERROR] = np.nan
+        x2 = np.where(two_roots, real - offset, np.where(complex_roots, real, np.nan))
+        im = np.where(complex_roots, offset, 0.0)
+    return kind, x1, x2, im
+
+
+def _solve_python(a, b, c):
+    kinds, x1s, x2s, ims = [], [], [], []
+    nan = math.nan
+    for ai, bi, ci in zip(a, b, c):
+        kind, x1, x2, im = ERROR, nan, nan, 0.0
+        if ai == 0:
+            if bi != 0:
+                kind, x1 = LINEAR, -ci / bi
+        elif ai == ai:
+            discriminant = bi * bi - 4 * ai * ci
+            real = -bi / (2 * ai)
+            if discriminant > 0:
+                root = math.sqrt(discriminant)
+                kind, x1, x2 = TWO_ROOTS, (-bi + root) / (2 * ai), (-bi - root) / (2 * ai)
+            elif discriminant == 0:
+                kind, x1 = ONE_ROOT, real
+            elif discriminant < 0:
+                kind, x1, x2, im = COMPLEX, real, real, math.sqrt(-discriminant) / (2 * ai)
+        kinds.append(kind)
+        x1s.append(x1)
+        x2s.append(x2)
+        ims.append(im)
+    return kinds, x1s, x2s, ims
+
+
+def solve_columns(a, b, c):
+    """Решает уравнения по столбцам коэффициентов; возвращает столбцы (kind, x1, x2, im)."""
+    if np is not None:
+        return _solve_numpy(a, b, c)
+    return _solve_python(a, b, c)
+
+
+def to_column(values, name):
+    """Массив коэффициентов из JSON -> столбец для solve_columns."""
+    if not isinstance(values, list):
+        raise BatchError(f"'{name}' должен быть массивом")
+    try:
+        if np is not None:
+            return np.asarray(values, dtype=np.float64)
+        return [float(value) for value in values]
+    except (TypeError, ValueError):
+        raise BatchError(f"в '{name}' есть не числа") from None
+
+
+def _json_column(values):
+    # NaN и бесконечности в JSON не пишутся - там null
+    return [value if math.isfinite(value) else None for value in values]
+
+
+def solve_json(a, b, c):
+    """Пакетный JSON-запрос: массивы коэффициентов -> словарь ответа со столбцами."""
+    a, b, c = to_column(a, 'a'), to_column(b, 'b'), to_column(c, 'c')
+    if not (len(a) == len(b) == len(c)):
+        raise BatchError("массивы a, b и c разной длины")
+    if len(a) > MAX_BATCH:
+        raise BatchError(f"больше {MAX_BATCH} уравнений в одном запросе")
+    kind, x1, x2, im = solve_columns(a, b, c)
+    if np is not None:
+        kind, x1, x2, im = kind.tolist(), x1.tolist(), x2.tolist(), im.tolist()
+    return {"status": "success", "message": f"Решено уравнений: {len(kind)}", "count": len(kind),
+            "kind": kind, "x1": _json_column(x1), "x2": _json_column(x2), "im": _json_column(im)}
+
+
+def encode_binary_request(a, b, c):
+    """Двоичный пакетный запрос из трёх последовательностей коэффициентов."""
+    if np is not None:
+        columns = [np.asarray(column, dtype='<f8').tobytes() for column in (a, b, c)]
+    else:
+        columns = [_pack_floats(column) for column in (a, b, c)]
+    return BINARY_HEADER.pack(BINARY_MAGIC, len(a)) + b''.join(columns)
+
+
+def _pack_floats(values):
+    column = array('d', values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _unpack_floats(data, offset, count):
+    column = array('d')
+    column.frombytes(data[offset:offset + count * FLOAT_SIZE])
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def solve_binary(data):
+    """Двоичный пакетный запрос -> двоичный ответ (bytes)."""
+    if len(data) < BINARY_HEADER.size:
+        raise BatchError("кадр короче заголовка")
+    magic, count = BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC:
+        raise BatchError("неизвестный двоичный формат")
+    if count > MAX_BATCH:
+        raise BatchError(f"больше {MAX_BATCH} уравнений в одном запросе")
+    if len(data) != BINARY_HEADER.size + 3 * count * FLOAT_SIZE:
+        raise BatchError("длина кадра не совпадает с числом уравнений")
+
+    offsets = [BINARY_HEADER.size + column * count * FLOAT_SIZE for column in range(3)]
+    if np is not None:
+        # frombuffer не копирует данные: столбцы читаются прямо из кадра
+        a, b, c = (np.frombuffer(data, dtype='<f8', count=count, offset=offset) for offset in offsets)
+        kind, x1, x2, im = _solve_numpy(a, b, c)
+        columns = [column.astype('<f8', copy=False).tobytes() for column in (x1, x2, im)]
+        kinds = kind.tobytes()
+    else:
+        a, b, c = (_unpack_floats(data, offset, count) for offset in offsets)
+        kind, x1, x2, im = _solve_python(a, b, c)
+        columns = [_pack_floats(column) for column in (x1, x2, im)]
+        kinds = bytes(kind)
+    return BINARY_HEADER.pack(RESULT_MAGIC, count) + b''.join(columns) + kinds
+
+
+def decode_binary_response(data):
+    """Разбирает двоичный ответ в столбцы (kind, x1, x2, im)."""
+    magic, count = BINARY_HEADER.unpack_from(data)
+    if magic != RESULT_MAGIC:
+        raise BatchError("это не двоичный ответ пакетного запроса")
+    offsets = [BINARY_HEADER.size + column * count * FLOAT_SIZE for column in range(4)]
+    if np is not None:
+        x1, x2, im = (np.frombuffer(data, dtype='<f8', count=count, offset=offset) for offset in offsets[:3])
+        kind = np.frombuffer(data, dtype=np.uint8, count=count, offset=offsets[3])
+    else:
+        x1, x2, im = (_unpack_floats(data, offset, count) for offset in offsets[:3])
+        kind = list(data[offsets[3]:offsets[3] + count])
+    return kind, x1, x2, im
@@ -0,0 +1,100 @@
+"""Кэш ответов solve_quadratic: одни и те же коэффициенты клиенты присылают снова и снова.
+
+Ключ - нормализованные (a, b, c): 1, 1.0 и -0.0/0 дают один и тот же ключ,
+уравнение решается уже над нормализованными числами, поэтому ответ зависит
+только от ключа. В кэше лежат готовые байты JSON, и попадание в кэш не
+вызывает ни solve_quadratic, ни json.dumps. Записи вытесняются по LRU, когда
+их больше capacity, и считаются устаревшими через ttl секунд.
+"""
+import json
+import math
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = 10000
+# Время жизни записи, с
+CACHE_TTL = 300.0
+# Целые числа до 2**53 представимы в float точно - их храним как int
+MAX_EXACT_INT = 2 ** 53
+
+
+def normalize(value):
+    """Коэффициент для ключа кэша; None - если число не годится для кэша (не число, NaN, бесконечность)."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    try:
+        value = float(value)
+    except OverflowError:
+        return None
+    if not math.isfinite(value):
+        return None
+    if value.is_integer() and abs(value) < MAX_EXACT_INT:
+        return int(value)
+    return value
+
+
+def encode(response_data):
+    return json.dumps(response_data).encode('utf-8')
+
+
+class ResultCache:
+    """LRU-кэш закодированных ответов с ограничением времени жизни записей."""
+
+    def __init__(self, solve, capacity=CACHE_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        self.solve = solve
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        # ключ -> (момент устаревания, байты JSON); порядок - от давно использованных к недавним
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Запросы, которые нельзя кэшировать (коэффициент не число, NaN) или при выключенном кэше
+        self.bypassed = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def lookup(self, a, b, c):
+        """Ответ на уравнение в виде байтов JSON - из кэша или только что решённый."""
+        key = (normalize(a), normalize(b), normalize(c))
+        if None in key or self.capacity <= 0:
+            self.bypassed += 1
+            return encode(self.solve(a, b, c))
+
+        now = self.clock()
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, data = entry
+            if expires > now:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return data
+            self.expired += 1
+            del self.entries[key]
+
+        self.misses += 1
+        data = encode(self.solve(*key))
+        self.entries[key] = (now + self.ttl, data)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return data
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "ttl": self.ttl,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def with_id(data, request_id):
+    """Дописывает "id" запроса в готовый JSON-объект, не разбирая и не кодируя его заново."""
+    return data[:-1] + b', "id": ' + encode(request_id) + b'}'
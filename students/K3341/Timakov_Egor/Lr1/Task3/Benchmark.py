@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+# Нагрузочный тест: сравнивает режимы sequential и pool сервера статики под множеством клиентов
+HOST = '127.0.0.1'
+BASE_PORT = 18090
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Server.py')
+REQUEST = f"GET / HTTP/1.1\r\nHost: {HOST}\r\nConnection: close\r\n\r\n".encode('utf-8')
+
+
+async def wait_for_port(port, timeout=10.0):
+    """Ждёт, пока сервер начнёт принимать соединения."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Сервер на порту {port} не запустился")
+
+
+async def slow_client(port, stop):
+    """Медленный клиент (slowloris): шлёт запрос по байту раз в секунду и не дочитывает его до конца."""
+    while not stop.is_set():
+        try:
+            reader, writer = await asyncio.open_connection(HOST, port)
+            for byte in REQUEST[:-2]:
+                if stop.is_set():
+                    break
+                writer.write(bytes([byte]))
+                await writer.drain()
+                await asyncio.sleep(1.0)
+            writer.close()
+        except OSError:
+            await asyncio.sleep(0.1)
+
+
+async def request_worker(port, deadline, timeout, latencies, stats):
+    """Последовательно выполняет GET-запросы до наступления deadline."""
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+            writer.write(REQUEST)
+            # сервер закрывает соединение после ответа
+            response = await asyncio.wait_for(reader.read(), timeout)
+            writer.close()
+        except (OSError, asyncio.TimeoutError):
+            stats['errors'] += 1
+            continue
+        if response.startswith(b'HTTP/1.1 200'):
+            latencies.append(time.perf_counter() - start)
+        elif response.startswith(b'HTTP/1.1 503'):
+            stats['rejected'] += 1
+            # Сервер просит повторить позже - не долбим его в цикле
+            await asyncio.sleep(0.05)
+        else:
+            stats['errors'] += 1
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run_mode(mode, port, concurrency, duration, slow, timeout, pool_size, max_queue):
+    """Запускает сервер в заданном режиме и снимает метрики."""
+    command = [sys.executable, SERVER_SCRIPT, '--mode', mode, '--port', str(port),
+               '--pool-size', str(pool_size), '--max-queue', str(max_queue)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, cwd=os.path.dirname(SERVER_SCRIPT))
+    try:
+        await wait_for_port(port)
+
+        stop = asyncio.Event()
+        slow_tasks = [asyncio.ensure_future(slow_client(port, stop)) for _ in range(slow)]
+        await asyncio.sleep(0.5)
+
+        latencies, stats = [], {'errors': 0, 'rejected': 0}
+        deadline = time.monotonic() + duration
+        clients = (request_worker(port, deadline, timeout, latencies, stats) for _ in range(concurrency))
+        await asyncio.gather(*clients)
+
+        stop.set()
+        for task in slow_tasks:
+            task.cancel()
+        await asyncio.gather(*slow_tasks, return_exceptions=True)
+
+        return {
+            'mode': mode,
+            'requests': len(latencies),
+            'rejected': stats['rejected'],
+            'errors': stats['errors'],
+            'rps': len(latencies) / duration,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение режимов sequential и pool сервера Task3")
+    parser.add_argument('--concurrency', type=int, default=1000, help="число одновременных клиентов")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность замера, с")
+    parser.add_argument('--slow', type=int, default=10, help="число медленных клиентов (slowloris)")
+    parser.add_argument('--timeout', type=float, default=10.0, help="таймаут одного запроса клиента, с")
+    parser.add_argument('--pool-size', type=int, default=32, help="число потоков пула сервера")
+    parser.add_argument('--max-queue', type=int, default=256, help="длина очереди пула сервера")
+    parser.add_argument('--modes', nargs='+', default=['sequential', 'pool'], choices=['sequential', 'pool'])
+    args = parser.parse_args()
+
+    for offset, mode in enumerate(args.modes):
+        result = asyncio.run(run_mode(mode, BASE_PORT + offset, args.concurrency, args.duration, args.slow,
+                                      args.timeout, args.pool_size, args.max_queue))
+        print(f"[{result['mode']}] успешных: {result['requests']} ({result['rps']:.0f} rps), "
+              f"отклонено (503): {result['rejected']}, ошибок/таймаутов: {result['errors']}, "
+              f"p50: {result['p50_ms']:.2f} мс, p99: {result['p99_ms']:.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,63 +1,140 @@
+import argparse
+import os
 import socket
+import sys
+import time
+
+# Общий потоковый парсер HTTP и pre-fork лежат в каталоге Lr1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prefork  # noqa: E402
+from http_parser import ParseError, RequestParser  # noqa: E402
+from static_files import StaticFiles, send_static  # noqa: E402
+from worker_pool import MAX_QUEUE, POOL_SIZE, WorkerPool  # noqa: E402
 
 # Конфигурация сервера
 HOST = '127.0.0.1'
 PORT = 8090
 HTML_FILE = 'index.html'
+RECV_SIZE = 4096
+BACKLOG = 1
+# В режиме пула соединения не должны теряться ещё до accept()
+POOL_BACKLOG = socket.SOMAXCONN
+# Защита от медленных клиентов (slowloris): весь запрос должен прийти за READ_TIMEOUT секунд,
+# а каждая операция отправки ответа - завершиться за WRITE_TIMEOUT секунд
+READ_TIMEOUT = 5.0
+WRITE_TIMEOUT = 10.0
 
+BAD_REQUEST_RESPONSE = (
+    b"HTTP/1.1 400 Bad Request\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+REQUEST_TIMEOUT_RESPONSE = (
+    b"HTTP/1.1 408 Request Timeout\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+SERVICE_UNAVAILABLE_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Retry-After: 1\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
 
-def start_server():
-    """Запускает простой HTTP-сервер на сокетах."""
 
-    # 1. Загрузка содержимого HTML-файла
-    try:
-        with open(HTML_FILE, 'r', encoding='utf-8') as f:
-            html_content = f.read()
+def read_request(conn):
+    """Читает из сокета один полный HTTP-запрос; возвращает None, если клиент закрыл соединение.
+
+    При нарушении формата запроса бросает ParseError, если запрос не пришёл
+    целиком за READ_TIMEOUT секунд - TimeoutError.
+    """
+    parser = RequestParser()
+    # Общий срок на весь запрос: клиент, присылающий по байту, не продлевает его
+    deadline = time.monotonic() + READ_TIMEOUT
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("запрос не получен вовремя")
+        conn.settimeout(remaining)
+        data = conn.recv(RECV_SIZE)
+        if not data:
+            return None
+        requests = parser.feed(data)
+        if requests:
+            return requests[0]
+        if parser.error is not None:
+            raise parser.error
+
 
-    except FileNotFoundError:
-        print(f"Ошибка: Файл '{HTML_FILE}' не найден. Убедитесь, что он находится в той же директории.")
+def handle_connection(conn, files):
+    """Читает запрос клиента и отправляет ответ."""
+    # 4. Получение HTTP-запроса от клиента (браузера)
+    try:
+        request = read_request(conn)
+    except ParseError as e:
+        print(f"Некорректный запрос: {e}")
+        conn.sendall(BAD_REQUEST_RESPONSE)
+        return
+    except TimeoutError:
+        print("Клиент не прислал запрос вовремя")
+        conn.settimeout(WRITE_TIMEOUT)
+        conn.sendall(REQUEST_TIMEOUT_RESPONSE)
+        return
+    if request is None:
         return
+    print(f"{request.method} {request.path}")
+    conn.settimeout(WRITE_TIMEOUT)
 
-    # Формирование полного HTTP-ответа
-    # Строка статуса: HTTP/1.1 200 OK
-    # Заголовки: Content-Type и Content-Length
-    http_response = (
-        "HTTP/1.1 200 OK\r\n"
-        "Content-Type: text/html; charset=utf-8\r\n"
-        f"Content-Length: {len(html_content.encode('utf-8'))}\r\n"
-        "Connection: close\r\n"  # Закрываем соединение после ответа
-        "\r\n" 
-        f"{html_content}"
-    )
-
-    # 2. Создание и настройка сокета
-    print(f"Сервер запускается на {HOST}:{PORT}...")
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-        # Позволяет повторно использовать адрес сразу после закрытия
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-        # Привязка сокета к адресу и порту
-        server_socket.bind((HOST, PORT))
-
-        # Прослушивание входящих соединений
-        server_socket.listen(1)
-        print("Сервер запущен. Ожидание соединения...")
+    # 5. Отправка HTTP-ответа (заголовки из кэша, тело файла - через sendfile или сжатая копия из кэша)
+    send_static(conn, request, files)
+
+
+def serve_connection(conn, addr, files):
+    """Обслуживает одно принятое соединение и закрывает его."""
+    with conn:
+        print(f"\nПолучено соединение от {addr}")
+        try:
+            handle_connection(conn, files)
+        except OSError as e:
+            # Клиент оборвал соединение или не уложился в таймаут: это не повод останавливать сервер
+            print(f"Ошибка соединения с {addr}: {e}")
+
+
+def reject_connection(conn, addr):
+    """Отвечает 503, когда очередь пула переполнена."""
+    print(f"\nОчередь переполнена, соединение от {addr} отклонено")
+    with conn:
+        try:
+            conn.settimeout(WRITE_TIMEOUT)
+            conn.sendall(SERVICE_UNAVAILABLE_RESPONSE)
+        except OSError:
+            pass
+
+
+def serve(server_socket, files, mode='pool', pool_size=POOL_SIZE, max_queue=MAX_QUEUE):
+    """Обслуживает соединения на уже открытом слушающем сокете, отдавая файлы из files.
+
+    В режиме 'sequential' соединения обслуживаются по одному, в режиме 'pool' -
+    пулом из pool_size потоков с очередью на max_queue соединений.
+    """
+    pool = None
+    if mode == 'pool':
+        pool = WorkerPool(lambda conn, addr: serve_connection(conn, addr, files), pool_size, max_queue)
+
+    with server_socket:
+        print(f"Сервер запущен (PID {os.getpid()}, режим {mode}). Ожидание соединения...")
 
         try:
             while True:
                 # 3. Принятие соединения
                 conn, addr = server_socket.accept()
-                with conn:
-                    print(f"\nПолучено соединение от {addr}")
-
-                    # 4. Получение HTTP-запроса от клиента (браузера)
-                    request = conn.recv(1024).decode('utf-8')
-                    if not request:
-                        continue
-
-                    # 5. Отправка HTTP-ответа
-                    conn.sendall(http_response.encode('utf-8'))
-                    print(f"Ответ (файл {HTML_FILE}) отправлен.")
+                if pool is None:
+                    serve_connection(conn, addr, files)
+                elif not pool.submit(conn, addr):
+                    reject_connection(conn, addr)
 
         except KeyboardInterrupt:
             print("\nСервер остановлен пользователем.")
@@ -65,8 +142,62 @@ def start_server():
             print(f"Произошла ошибка: {e}")
         finally:
             server_socket.close()
+            if pool is not None:
+                # Уже принятые соединения обслуживаются до конца
+                pool.stop()
             print("Сокет закрыт.")
 
 
+def start_server(port=PORT, workers=1, static_root=None, compress=True, mode='pool',
+                 pool_size=POOL_SIZE, max_queue=MAX_QUEUE):
+    """Запускает простой HTTP-сервер на сокетах; при workers > 1 - в нескольких процессах (pre-fork).
+
+    Без static_root на любой запрос отдаётся HTML_FILE, со static_root - файлы из этого каталога.
+    С compress=True текстовые файлы отдаются в gzip клиентам, которые его принимают.
+    mode, pool_size и max_queue задают способ обслуживания соединений (см. serve).
+    """
+    # 1. Подготовка раздаваемых файлов
+    if static_root:
+        if not os.path.isdir(static_root):
+            print(f"Ошибка: каталог '{static_root}' не найден.")
+            return
+        files = StaticFiles(static_root, compress=compress)
+    else:
+        if not os.path.isfile(HTML_FILE):
+            print(f"Ошибка: Файл '{HTML_FILE}' не найден. Убедитесь, что он находится в той же директории.")
+            return
+        files = StaticFiles('.', single_file=HTML_FILE, compress=compress)
+
+    backlog = POOL_BACKLOG if mode == 'pool' else BACKLOG
+
+    def worker_main(server_socket):
+        serve(server_socket, files, mode, pool_size, max_queue)
+
+    print(f"Сервер запускается на {HOST}:{port}...")
+    try:
+        if workers > 1:
+            prefork.run(worker_main, HOST, port, workers, backlog)
+            return
+        # 2. Создание и настройка сокета (SO_REUSEADDR, bind, listen)
+        server_socket = prefork.create_listener(HOST, port, backlog)
+    except OSError as e:
+        print(f"Не удалось запустить сервер: {e}")
+        return
+    worker_main(server_socket)
+
+
 if __name__ == '__main__':
-    start_server()
+    parser = argparse.ArgumentParser(description="Простой HTTP-сервер на сокетах")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=1, help="число рабочих процессов (pre-fork)")
+    parser.add_argument('--static', metavar='DIR', default=None,
+                        help="раздавать файлы из каталога DIR вместо одного index.html")
+    parser.add_argument('--no-gzip', action='store_true', help="не сжимать ответы")
+    parser.add_argument('--mode', choices=['pool', 'sequential'], default='pool',
+                        help="pool - пул потоков, sequential - по одному соединению за раз")
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE, help="число потоков в пуле")
+    parser.add_argument('--max-queue', type=int, default=MAX_QUEUE,
+                        help="сколько соединений может ждать свободного потока")
+    args = parser.parse_args()
+    start_server(args.port, args.workers, args.static, not args.no_gzip, args.mode,
+                 args.pool_size, args.max_queue)
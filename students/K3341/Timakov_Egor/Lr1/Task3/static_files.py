@@ -0,0 +1,315 @@
+"""Раздача статических файлов для сервера Task3.
+
+Содержимое файлов уходит в сокет через sendfile и не копируется в память
+Python. Метаданные файла (размер, mtime, готовые заголовки) кэшируются и
+перепроверяются через os.stat не чаще STAT_INTERVAL секунд.
+
+Текстовые файлы клиентам с Accept-Encoding: gzip отдаются сжатыми. Сжатая
+версия строится один раз для каждой версии файла (размер, mtime в наносекундах
+и inode) и хранится в LRU-кэше, ограниченном COMPRESSED_CACHE_SIZE байтами.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote
+
+# Как часто перепроверять, не изменился ли файл на диске (с)
+STAT_INTERVAL = 1.0
+INDEX_FILE = 'index.html'
+
+# Сжимаем только текст: картинки и архивы уже сжаты
+COMPRESSIBLE_TYPES = ('application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+# Маленькие файлы сжимать невыгодно, огромные - не держим в памяти
+MIN_COMPRESS_SIZE = 256
+MAX_COMPRESS_SIZE = 8 * 1024 * 1024
+# Суммарный размер сжатых версий в кэше (байт)
+COMPRESSED_CACHE_SIZE = 32 * 1024 * 1024
+GZIP_LEVEL = 9
+
+
+def _simple_response(status_line, extra_headers=b''):
+    return (
+        status_line + b"\r\n"
+        b"Content-Length: 0\r\n"
+        b"Connection: close\r\n" + extra_headers + b"\r\n"
+    )
+
+
+NOT_FOUND_RESPONSE = (
+    b"HTTP/1.1 404 Not Found\r\n"
+    b"Content-Type: text/html; charset=utf-8\r\n"
+    b"Content-Length: 22\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"<h1>404 Not Found</h1>"
+)
+METHOD_NOT_ALLOWED_RESPONSE = _simple_response(b"HTTP/1.1 405 Method Not Allowed", b"Allow: GET, HEAD\r\n")
+
+
+class StaticFile:
+    """Метаданные одного файла и заранее закодированная общая часть заголовков ответа."""
+    __slots__ = ('path', 'size', 'mtime', 'mtime_ns', 'inode', 'headers', 'checked_at', 'compressible')
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.size = stat.st_size
+        # Целые секунды - только для Last-Modified и If-Modified-Since: файл, переписанный
+        # в ту же секунду с тем же размером, отличается лишь mtime_ns или inode
+        self.mtime = int(stat.st_mtime)
+        self.mtime_ns = stat.st_mtime_ns
+        self.inode = stat.st_ino
+        self.checked_at = time.monotonic()
+
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        is_text = content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES
+        self.compressible = is_text and MIN_COMPRESS_SIZE <= self.size <= MAX_COMPRESS_SIZE
+        if is_text and content_type != 'image/svg+xml':
+            content_type += '; charset=utf-8'
+        self.headers = (
+            f"Content-Type: {content_type}\r\n"
+            f"Last-Modified: {formatdate(self.mtime, usegmt=True)}\r\n"
+            "Accept-Ranges: bytes\r\n"
+            + ("Vary: Accept-Encoding\r\n" if self.compressible else "")
+            + "Connection: close\r\n"
+        ).encode('ascii')
+
+    @property
+    def version(self):
+        """Ключ версии файла для кэша сжатых копий."""
+        return self.path, self.size, self.mtime_ns, self.inode
+
+    def is_stale(self, stat):
+        return (stat.st_size != self.size or stat.st_mtime_ns != self.mtime_ns
+                or stat.st_ino != self.inode)
+
+
+class StaticFiles:
+    """Находит файл по пути из URL внутри каталога root и кэширует его метаданные.
+
+    Если задан single_file, на любой путь отдаётся этот файл (исходное поведение Task3).
+    С compress=True текстовые файлы сжимаются в gzip через общий CompressedCache.
+    """
+
+    def __init__(self, root, single_file=None, compress=True):
+        self.root = os.path.realpath(root)
+        self.single_file = single_file
+        self.compressed = CompressedCache() if compress else None
+        # Нормализованный путь URL -> StaticFile; хранятся только существующие файлы
+        self._cache = {}
+
+    def lookup(self, url_path):
+        """Возвращает StaticFile для пути из запроса или None, если файла нет."""
+        key = self.single_file or self._normalize(url_path)
+        if key is None:
+            return None
+
+        entry = self._cache.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < STAT_INTERVAL:
+            return entry
+
+        path = entry.path if entry is not None else self._resolve(key)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None:
+            self._cache.pop(key, None)
+            return None
+
+        if entry is None or entry.is_stale(stat):
+            entry = StaticFile(path, stat)
+            self._cache[key] = entry
+        entry.checked_at = now
+        return entry
+
+    @staticmethod
+    def _normalize(url_path):
+        path = unquote(url_path.split('?', 1)[0].split('#', 1)[0])
+        if '\x00' in path:
+            return None
+        # normpath от абсолютного пути не даёт подняться выше корня через '..'
+        return posixpath.normpath('/' + path)
+
+    def _resolve(self, key):
+        if self.single_file:
+            return os.path.realpath(self.single_file)
+
+        path = os.path.realpath(os.path.join(self.root, *key.strip('/').split('/')))
+        # Символические ссылки не должны выводить за пределы каталога
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        if os.path.isdir(path):
+            path = os.path.join(path, INDEX_FILE)
+        return path if os.path.isfile(path) else None
+
+
+class CompressedCache:
+    """LRU-кэш сжатых версий файлов, ограниченный суммарным размером в байтах.
+
+    Ключ - версия файла, поэтому изменённый файл сжимается заново, а старая
+    сжатая копия просто вытесняется. Если сжатие не уменьшает файл, в кэше
+    запоминается None, чтобы не пытаться сжать его снова.
+    """
+
+    def __init__(self, max_bytes=COMPRESSED_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, entry):
+        """Возвращает gzip-версию файла или None, если отдавать её не нужно."""
+        key = entry.version
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+
+        # Сжимаем без блокировки; в худшем случае два потока сожмут один файл одновременно
+        data = self._compress(entry)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = data
+                self.size += len(data or b'')
+                while self.size > self.max_bytes and self._items:
+                    _, evicted = self._items.popitem(last=False)
+                    self.size -= len(evicted or b'')
+        return data
+
+    @staticmethod
+    def _compress(entry):
+        try:
+            with open(entry.path, 'rb') as f:
+                raw = f.read(entry.size + 1)
+        except OSError:
+            return None
+        if len(raw) != entry.size:
+            # Файл меняется прямо сейчас: отдадим его как есть
+            return None
+        # mtime=0 делает результат одинаковым для одинакового содержимого
+        data = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+        return data if len(data) < len(raw) else None
+
+
+def accepts_gzip(header):
+    """Проверяет, разрешает ли Accept-Encoding клиента gzip (с учётом q=0)."""
+    wildcard = False
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding in ('gzip', 'x-gzip'):
+            return quality > 0
+        if coding == '*':
+            wildcard = quality > 0
+    return wildcard
+
+
+def _is_number(text):
+    return text.isascii() and text.isdigit()
+
+
+def parse_range(header, size):
+    """Разбирает заголовок Range с одним диапазоном байт.
+
+    Возвращает (начало, длина), None - если заголовок нужно проигнорировать
+    и отдать весь файл, или 'unsatisfiable' для диапазона за пределами файла.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        # Несколько диапазонов не поддерживаем: по RFC 9110 можно отдать файл целиком
+        return None
+    first, sep, last = (part.strip() for part in spec.partition('-'))
+    if not sep or not (first or last) or not all(_is_number(part) for part in (first, last) if part):
+        return None
+
+    if not first:
+        # bytes=-N: последние N байт
+        length = min(int(last), size)
+        if length == 0:
+            return 'unsatisfiable'
+        return size - length, length
+
+    start = int(first)
+    if start >= size:
+        return 'unsatisfiable'
+    end = min(int(last), size - 1) if last else size - 1
+    if end < start:
+        return None
+    return start, end - start + 1
+
+
+def not_modified_since(header, mtime):
+    """Проверяет условие If-Modified-Since."""
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return False
+    return mtime <= since
+
+
+def send_static(conn, request, files):
+    """Отвечает на запрос содержимым файла, поддерживая HEAD, Range, If-Modified-Since и gzip."""
+    if request.method not in ('GET', 'HEAD'):
+        conn.sendall(METHOD_NOT_ALLOWED_RESPONSE)
+        return
+
+    entry = files.lookup(request.path)
+    if entry is None:
+        conn.sendall(NOT_FOUND_RESPONSE)
+        return
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and not_modified_since(if_modified_since, entry.mtime):
+        conn.sendall(b"HTTP/1.1 304 Not Modified\r\n" + entry.headers + b"\r\n")
+        return
+
+    # Range относится к несжатому содержимому, такие запросы обслуживаем без сжатия
+    if (files.compressed is not None and entry.compressible and 'range' not in request.headers
+            and accepts_gzip(request.headers.get('accept-encoding', ''))):
+        data = files.compressed.get(entry)
+        if data is not None:
+            conn.sendall(b"HTTP/1.1 200 OK\r\n" + entry.headers
+                         + b"Content-Encoding: gzip\r\nContent-Length: %d\r\n\r\n" % len(data))
+            if request.method == 'GET':
+                conn.sendall(data)
+            return
+
+    offset, length = 0, entry.size
+    status_line = b"HTTP/1.1 200 OK\r\n"
+    extra = b""
+    byte_range = parse_range(request.headers['range'], entry.size) if 'range' in request.headers else None
+    if byte_range == 'unsatisfiable':
+        conn.sendall(_simple_response(b"HTTP/1.1 416 Range Not Satisfiable",
+                                      f"Content-Range: bytes */{entry.size}\r\n".encode('ascii')))
+        return
+    if byte_range is not None:
+        offset, length = byte_range
+        status_line = b"HTTP/1.1 206 Partial Content\r\n"
+        extra = f"Content-Range: bytes {offset}-{offset + length - 1}/{entry.size}\r\n".encode('ascii')
+
+    conn.sendall(status_line + entry.headers + extra + b"Content-Length: %d\r\n\r\n" % length)
+    if request.method == 'HEAD' or length == 0:
+        return
+
+    # Ядро копирует файл прямо в сокет, минуя память процесса
+    with open(entry.path, 'rb') as f:
+        conn.sendfile(f, offset, length)
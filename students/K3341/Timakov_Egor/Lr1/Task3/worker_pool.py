@@ -0,0 +1,58 @@
+"""Ограниченный пул потоков для обслуживания соединений сервера Task3.
+
+Одновременно обслуживается не больше size соединений, ещё до max_queue ждут
+в очереди. Когда очередь заполнена, submit() возвращает False, и сервер
+сразу отвечает 503 вместо того, чтобы копить соединения без ограничений.
+"""
+import queue
+import threading
+
+# Число потоков-обработчиков и длина очереди ожидающих соединений
+POOL_SIZE = 32
+MAX_QUEUE = 256
+
+
+class WorkerPool:
+    """Пул потоков, каждый из которых вызывает handler(conn, addr) для соединений из очереди."""
+
+    def __init__(self, handler, size=POOL_SIZE, max_queue=MAX_QUEUE):
+        self.handler = handler
+        self.size = size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        for number in range(size):
+            thread = threading.Thread(target=self._worker, name=f'task3-worker-{number}')
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, conn, addr):
+        """Ставит соединение в очередь; возвращает False, если очередь переполнена."""
+        try:
+            self._queue.put_nowait((conn, addr))
+        except queue.Full:
+            return False
+        return True
+
+    def pending(self):
+        """Сколько соединений ждут свободного потока."""
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            conn, addr = item
+            try:
+                self.handler(conn, addr)
+            except Exception as e:
+                # Ошибка одного соединения не должна убивать поток пула
+                print(f"Ошибка обработки соединения {addr}: {e}")
+
+    def stop(self):
+        """Дожидается обработки уже принятых соединений и останавливает потоки."""
+        for _ in self._threads:
+            # put() блокируется, пока в очереди нет места, - потоки её разгребут
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+
+from protocol import HELLO, JOIN, TEXT, encode_frame
+
+# Нагрузочный тест чата: много подключённых клиентов, несколько отправителей, задержка доставки
+HOST = '127.0.0.1'
+BASE_PORT = 18555
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Server.py')
+# Метка времени отправки внутри текста сообщения
+MARK_RE = re.compile(rb'<t=(\d+\.\d+)>')
+# Метка синхронизации: очереди клиентов упорядочены, поэтому получивший её клиент получил и всё, что было до неё
+SYNC_RE = re.compile(rb'<sync=(\d+)>')
+
+
+def read_rss_kb(pid):
+    """Возвращает резидентную память процесса в КБ (Linux, /proc)."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def wait_for_port(port, timeout=10.0):
+    """Ждёт, пока сервер начнёт принимать соединения."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Сервер на порту {port} не запустился")
+
+
+async def connect(port, number, room=None):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    frames = [encode_frame(HELLO, f"user{number}")]
+    if room is not None:
+        frames.append(encode_frame(JOIN, room))
+    writer.writelines(frames)
+    await writer.drain()
+    return reader, writer
+
+
+async def receiver(reader, latencies, synced):
+    """Читает всё, что присылает сервер, и замеряет задержку помеченных сообщений.
+
+    Кадры не разбираются: метки ищутся прямо в потоке байт, так клиенты меньше нагружают процессор.
+    """
+    tail = b''
+    last_sync = 0
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            data = tail + data
+            now = time.time()
+            last = 0
+            for match in MARK_RE.finditer(data):
+                latencies.append(now - float(match.group(1)))
+                last = max(last, match.end())
+            for match in SYNC_RE.finditer(data):
+                generation = int(match.group(1))
+                if generation > last_sync:
+                    last_sync = generation
+                    synced[generation] = synced.get(generation, 0) + 1
+                last = max(last, match.end())
+            # Метка могла разрезаться на стыке двух read()
+            tail = data[max(last, len(data) - 32):]
+    except (OSError, asyncio.CancelledError):
+        return
+
+
+async def sender(writer, rate, deadline):
+    """Отправляет rate сообщений в секунду до наступления deadline."""
+    interval = 1.0 / rate
+    sent = 0
+    while time.monotonic() < deadline:
+        writer.write(encode_frame(TEXT, f"<t={time.time():.6f}>"))
+        await writer.drain()
+        sent += 1
+        await asyncio.sleep(interval)
+    return sent
+
+
+async def wait_delivered(writers, synced, generation, receivers, timeout=600.0):
+    """Отправляет метку синхронизации от одного клиента каждой комнаты и ждёт, пока её получат все остальные."""
+    for writer in writers:
+        writer.write(encode_frame(TEXT, f"<sync={generation}>"))
+        await writer.drain()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and synced.get(generation, 0) < receivers:
+        await asyncio.sleep(0.2)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run_mode(mode, port, clients, senders, rate, duration, rooms=0, server_args=()):
+    """Запускает сервер в заданном режиме и снимает метрики.
+
+    При rooms > 0 клиент number входит в комнату room{number % rooms}, иначе все остаются в общей.
+    """
+    command = [sys.executable, SERVER_SCRIPT, '--mode', mode, '--port', str(port), *server_args]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, cwd=os.path.dirname(SERVER_SCRIPT))
+    connections = []
+    receivers = []
+    try:
+        await wait_for_port(port)
+        rss_before = read_rss_kb(server.pid)
+
+        latencies, synced = [], {}
+        start = time.monotonic()
+        for number in range(clients):
+            try:
+                reader, writer = await connect(port, number, f"room{number % rooms}" if rooms else None)
+            except OSError as e:
+                print(f"  не удалось подключить клиента #{number}: {e}")
+                break
+            connections.append(writer)
+            receivers.append(asyncio.ensure_future(receiver(reader, latencies, synced)))
+        connect_time = time.monotonic() - start
+
+        room_count = min(rooms, len(connections)) if rooms else 1
+        # Номер комнаты -> число участников; метку синхронизации шлёт последний вошедший в комнату
+        room_sizes = [len(range(room, len(connections), room_count)) for room in range(room_count)]
+        sync_writers = connections[-room_count:]
+        sync_receivers = len(connections) - room_count
+
+        # Каждый вход рассылается всем уже подключённым к комнате, т.е. ~размер_комнаты^2 / 2 уведомлений на комнату
+        await wait_delivered(sync_writers, synced, 1, sync_receivers)
+        settle_time = time.monotonic() - start - connect_time
+        rss_connected = read_rss_kb(server.pid)
+        latencies.clear()
+
+        deadline = time.monotonic() + duration
+        sent = await asyncio.gather(*(sender(writer, rate, deadline) for writer in connections[:senders]))
+        await wait_delivered(sync_writers, synced, 2, sync_receivers)
+        expected = sum(count * (room_sizes[number % room_count] - 1) for number, count in enumerate(sent))
+
+        return {
+            'mode': mode,
+            'clients': len(connections),
+            'rooms': room_count,
+            'connect_s': connect_time,
+            'settle_s': settle_time,
+            'rss_start_kb': rss_before,
+            'rss_connected_kb': rss_connected,
+            'sent': sum(sent),
+            'delivered': len(latencies),
+            'delivered_per_s': len(latencies) / duration,
+            'expected': expected,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
+    finally:
+        for task in receivers:
+            task.cancel()
+        for writer in connections:
+            writer.close()
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест чат-сервера Task4")
+    parser.add_argument('--clients', type=int, default=10000, help="число подключённых клиентов")
+    parser.add_argument('--senders', type=int, default=10, help="сколько из них отправляют сообщения")
+    parser.add_argument('--rate', type=float, default=5.0, help="сообщений в секунду от одного отправителя")
+    parser.add_argument('--duration', type=float, default=5.0, help="длительность замера, с")
+    parser.add_argument('--modes', nargs='+', default=['asyncio'], choices=['asyncio', 'threads'])
+    parser.add_argument('--rooms', type=int, default=0,
+                        help="распределить клиентов по стольким комнатам (только asyncio), 0 - одна общая")
+    parser.add_argument('--slow-policy', choices=['drop', 'disconnect'], default='drop',
+                        help="политика сервера для медленных клиентов (asyncio): при массовом подключении "
+                             "каждый клиент получает уведомления о входе всех остальных")
+    parser.add_argument('--max-queue', type=int, default=1000, help="длина очереди клиента на сервере (asyncio)")
+    args = parser.parse_args()
+
+    for offset, mode in enumerate(args.modes):
+        server_args = []
+        if mode == 'asyncio':
+            server_args = ['--slow-policy', args.slow_policy, '--max-queue', str(args.max_queue)]
+        elif args.rooms:
+            print(f"[{mode}] пропущен: комнаты есть только в режиме asyncio")
+            continue
+        result = asyncio.run(run_mode(mode, BASE_PORT + offset, args.clients, args.senders,
+                                      args.rate, args.duration, args.rooms, server_args))
+        print(f"[{result['mode']}] клиентов: {result['clients']} в {result['rooms']} комнатах "
+              f"(подключение {result['connect_s']:.1f} с, рассылка уведомлений о входе {result['settle_s']:.1f} с), "
+              f"RSS: {result['rss_start_kb']} -> {result['rss_connected_kb']} КБ, "
+              f"отправлено: {result['sent']}, доставлено: {result['delivered']} из {result['expected']} "
+              f"({result['delivered_per_s']:.0f}/с), p50: {result['p50_ms']:.2f} мс, p99: {result['p99_ms']:.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
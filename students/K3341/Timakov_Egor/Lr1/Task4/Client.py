@@ -1,30 +1,124 @@
 import socket
 import threading
 import sys
+import time
+
+from protocol import (HELLO, JOIN, JOINED, LEAVE, LIST, ROOM, TEXT, FrameDecoder, ProtocolError, decode_joined,
+                      decode_room, encode_frame, encode_resume)
 
 # Настройки сервера для подключения
 HOST = '127.0.0.1'
 PORT = 55555
-
-
-def receive_messages(client_socket):
-    """Функция, запускаемая в отдельном потоке для непрерывного получения сообщений."""
-    while True:
-        try:
-            # Получаем сообщение
-            message = client_socket.recv(1024).decode('utf-8')
-
-            if not message:
-                # Если нет сообщения, сервер, вероятно, отключился
-                print("\n[ОТКЛЮЧЕНИЕ] Сервер недоступен. Нажмите Enter для выхода.")
+RECV_SIZE = 65536
+HELP = "Команды: /join <комната>, /leave - вернуться в общую комнату, /rooms - список комнат, /quit - выход"
+# Сколько раз пытаться переподключиться после обрыва и с какой паузой, с
+RECONNECT_ATTEMPTS = 10
+RECONNECT_DELAY = 1.0
+
+
+class ChatConnection:
+    """Соединение с сервером.
+
+    Клиент помнит комнату и номер последнего полученного из неё сообщения,
+    поэтому после обрыва переподключается кадром RESUME и получает всё, что
+    было сказано в комнате за время отсутствия.
+    """
+
+    def __init__(self, nickname):
+        self.nickname = nickname
+        self.sock = None
+        # Комната и номер последнего сообщения из неё; None, пока сервер не прислал JOINED
+        self.room = None
+        self.last_seq = 0
+        self.closed = False
+
+    def connect(self):
+        """Подключается к серверу; первым кадром уходит HELLO или, если комната уже известна, RESUME."""
+        sock = socket.create_connection((HOST, PORT))
+        if self.room is None:
+            sock.sendall(encode_frame(HELLO, self.nickname))
+        else:
+            sock.sendall(encode_resume(self.nickname, self.room, self.last_seq))
+        self.sock = sock
+
+    def send(self, frame):
+        self.sock.sendall(frame)
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+
+    def show(self, frame_type, payload):
+        if frame_type == JOINED:
+            # Сообщения комнаты будут нумероваться от этого номера
+            self.room, self.last_seq = decode_joined(payload)
+            return
+        if frame_type == ROOM:
+            self.last_seq, _, text = decode_room(payload)
+        else:
+            text = payload.decode('utf-8', errors='replace')
+        print(f"\n{text}")
+
+    def receive_messages(self):
+        """Функция, запускаемая в отдельном потоке для непрерывного получения сообщений."""
+        while not self.closed:
+            self._receive(self.sock)
+            if self.closed or not self._reconnect():
+                break
+        self.closed = True
+
+    def _receive(self, client_socket):
+        decoder = FrameDecoder()
+        while True:
+            try:
+                # Получаем данные: за один recv может прийти часть кадра или несколько кадров
+                data = client_socket.recv(RECV_SIZE)
+            except OSError:
+                # Обработка ошибки сокета при отключении
+                data = b''
+
+            if not data:
+                # Если нет данных, сервер, вероятно, отключился
                 client_socket.close()
-                sys.exit()
+                return
 
-            # Выводим полученное сообщение
-            print(f"\n{message}")
-        except:
-            # Обработка ошибки сокета при отключении
-            break
+            # Выводим полученные сообщения
+            for frame_type, payload in decoder.feed(data):
+                self.show(frame_type, payload)
+            if decoder.error is not None:
+                print(f"\n[ОШИБКА] Некорректные данные от сервера: {decoder.error}")
+                client_socket.close()
+                return
+
+    def _reconnect(self):
+        print("\n[ОТКЛЮЧЕНИЕ] Соединение с сервером потеряно, переподключение...")
+        for _ in range(RECONNECT_ATTEMPTS):
+            time.sleep(RECONNECT_DELAY)
+            if self.closed:
+                return False
+            try:
+                self.connect()
+            except OSError:
+                continue
+            print(f"[ПОДКЛЮЧЕНО] Переподключено, пропущенные сообщения комнаты {self.room or ''} придут следом.")
+            return True
+        print("\n[ОТКЛЮЧЕНИЕ] Сервер недоступен. Нажмите Enter для выхода.")
+        return False
+
+
+def encode_command(line):
+    """Превращает введённую строку в кадр: команды комнат - в JOIN/LEAVE/LIST, остальное - в TEXT."""
+    command, _, argument = line.partition(' ')
+    command = command.lower()
+    if command == '/join':
+        if not argument.strip():
+            raise ProtocolError("укажите имя комнаты: /join <комната>")
+        return encode_frame(JOIN, argument.strip())
+    if command == '/leave':
+        return encode_frame(LEAVE, b'')
+    if command in ('/rooms', '/list'):
+        return encode_frame(LIST, b'')
+    return encode_frame(TEXT, line)
 
 
 def start_client():
@@ -33,21 +127,19 @@ def start_client():
     # Запрос никнейма
     nickname = input("Введите ваш никнейм: ")
 
-    #  Создание и подключение сокета
-    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    #  Подключение и отправка никнейма серверу (должно быть первым сообщением)
+    client = ChatConnection(nickname)
     try:
-        client.connect((HOST, PORT))
+        client.connect()
         print(f"Подключено к чату как {nickname}. Начните печатать сообщения...")
-    except ConnectionRefusedError:
+        print(HELP)
+    except OSError:
         print(f"Ошибка: Не удалось подключиться к серверу {HOST}:{PORT}. Убедитесь, что сервер запущен.")
         sys.exit()
 
-    #  Отправка никнейма серверу (должно быть первым сообщением)
-    client.send(nickname.encode('utf-8'))
-
     #  Запуск потока для получения сообщений
     # Поток будет работать независимо от основного потока ввода
-    receive_thread = threading.Thread(target=receive_messages, args=(client,))
+    receive_thread = threading.Thread(target=client.receive_messages)
     receive_thread.daemon = True  # Поток автоматически завершится, когда завершится основная программа
     receive_thread.start()
 
@@ -57,14 +149,23 @@ def start_client():
             # Чтение ввода пользователя (блокирует основной поток)
             message_to_send = input("")
 
-            # Проверка на команду выхода
-            if message_to_send.lower() in ('/quit', '/exit'):
+            # Проверка на команду выхода (или поток получения не смог переподключиться)
+            if client.closed or message_to_send.lower() in ('/quit', '/exit'):
                 print("Отключение от чата...")
                 client.close()
                 break
 
-            # Отправка сообщения серверу
-            client.send(message_to_send.encode('utf-8'))
+            # Отправка сообщения или команды серверу
+            try:
+                frame = encode_command(message_to_send)
+            except ProtocolError as e:
+                print(f"Сообщение не отправлено: {e}")
+                continue
+            try:
+                client.send(frame)
+            except OSError:
+                # Поток получения сам переподключится, а сообщение придётся повторить
+                print("Соединение потеряно, сообщение не отправлено.")
 
         except EOFError:
             # Обработка Ctrl+D
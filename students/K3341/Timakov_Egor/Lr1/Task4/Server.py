@@ -1,95 +1,164 @@
+import argparse
+import asyncio
+import os
 import socket
+import subprocess
 import threading
 import sys
+import time
+
+import chat_hub
+import metrics as chat_metrics
+from protocol import (HELLO, JOIN, LEAVE, LIST, RESUME, SYSTEM, TEXT, FrameDecoder, ProtocolError, decode_resume,
+                      encode_frame)
+from relay import RELAY_PORT
+
+# Запуск в нескольких процессах (pre-fork) лежит в каталоге Lr1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prefork  # noqa: E402
 
 # Настройки сервера
 HOST = '127.0.0.1'  # Локальный адрес
 PORT = 55555  # Выбранный порт
+RECV_SIZE = 65536
+RELAY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'relay.py')
 # Список для хранения всех подключенных клиентов (сокетов)
 clients = []
 # Блокировка для обеспечения безопасности при работе с общим списком клиентов
 lock = threading.Lock()
+# Сокет -> блокировка отправки: кадры из разных потоков не должны перемешиваться в одном сокете
+send_locks = {}
+# Счётчики меняются под lock
+metrics = chat_metrics.ChatMetrics()
 
 
 def broadcast(message, sender_socket=None):
-    """Отправляет сообщение всем подключенным клиентам, кроме отправителя (по желанию)."""
+    """Отправляет закодированный кадр всем подключенным клиентам, кроме отправителя (по желанию)."""
+    # Под блокировкой только копируем список: отправка в медленный сокет не должна задерживать остальных
+    with lock:
+        recipients = [(client, send_locks[client]) for client in clients if client != sender_socket]
+
+    start = time.monotonic()
+    dead = []
+    for client, send_lock in recipients:
+        try:
+            with send_lock:
+                client.sendall(message)
+        except OSError:
+            # Если отправка не удалась, значит, клиент отключился
+            client.close()
+            dead.append(client)
+
     with lock:
-        # Проходим по копии списка, чтобы избежать проблем, если клиент отключится во время цикла
-        for client in clients:
-            if client != sender_socket:
-                try:
-                    client.send(message)
-                except:
-                    # Если отправка не удалась, значит, клиент отключился
-                    client.close()
-                    # Удаляем "мертвый" сокет из списка
-                    if client in clients:
-                        clients.remove(client)
+        metrics.messages_out += len(recipients) - len(dead)
+        metrics.broadcast_seconds.observe(time.monotonic() - start)
+        # Удаляем "мертвые" сокеты из списка
+        for client in dead:
+            if client in clients:
+                clients.remove(client)
+                del send_locks[client]
+
+
+def reply(client_socket, text):
+    """Отправляет уведомление сервера одному клиенту."""
+    with lock:
+        send_lock = send_locks.get(client_socket)
+    if send_lock is not None:
+        with send_lock:
+            client_socket.sendall(encode_frame(SYSTEM, text))
 
 
 def handle_client(client_socket, client_address):
     """Функция, которая запускается в отдельном потоке для каждого клиента."""
     print(f"[НОВОЕ] Соединение установлено: {client_address}")
+    decoder = FrameDecoder()
+    nickname = None
 
-    # 1. Получаем никнейм клиента
     try:
-        nickname = client_socket.recv(1024).decode('utf-8')
-        print(f"[НИК] Клиент {client_address} представился как: {nickname}")
-
-        # Уведомляем всех о подключении нового пользователя
-        join_message = f"[СЕРВЕР] {nickname} присоединился к чату!".encode('utf-8')
-        broadcast(join_message, client_socket)
-
-    except:
-        # Если не удалось получить никнейм, закрываем соединение
-        client_socket.close()
-        with lock:
-            if client_socket in clients:
-                clients.remove(client_socket)
-        return
+        while True:
+            # Получаем данные от клиента: за один recv может прийти часть кадра или несколько кадров
+            data = client_socket.recv(RECV_SIZE)
+            if not data:
+                break
+            frames = decoder.feed(data)
 
-    while True:
-        try:
-            # Получаем сообщение от клиента
-            message = client_socket.recv(1024)
-            if message:
-                # Формируем сообщение для рассылки: "Никнейм: Сообщение"
-                full_message = f"[{nickname}] {message.decode('utf-8')}".encode('utf-8')
-                print(f"[РАССЫЛКА] {full_message.decode('utf-8')}")
-                broadcast(full_message, client_socket)
-            else:
-                # Если сообщение пустое, клиент отключился
-                raise Exception("Клиент отключился")
-
-        except:
-            # Обработка отключения клиента
-            print(f"[ОТКЛЮЧЕНИЕ] Клиент {nickname} ({client_address}) отключился.")
+            for frame_type, payload in frames:
+                text = payload.decode('utf-8', errors='replace')
+                if nickname is None:
+                    # 1. Первый кадр - никнейм клиента
+                    if frame_type == HELLO:
+                        nickname = text
+                    elif frame_type == RESUME:
+                        nickname = decode_resume(payload)[0]
+                        reply(client_socket, "[СЕРВЕР] История сообщений доступна только в режиме asyncio.")
+                    else:
+                        raise ProtocolError("Первым кадром должен быть HELLO")
+                    print(f"[НИК] Клиент {client_address} представился как: {nickname}")
+
+                    # Уведомляем всех о подключении нового пользователя
+                    broadcast(encode_frame(SYSTEM, f"[СЕРВЕР] {nickname} присоединился к чату!"), client_socket)
+                elif frame_type == TEXT:
+                    # Формируем сообщение для рассылки: "Никнейм: Сообщение"
+                    full_message = f"[{nickname}] {text}"
+                    with lock:
+                        metrics.messages_in += 1
+                        log = metrics.should_log()
+                    if log:
+                        print(f"[РАССЫЛКА] {full_message}")
+                    try:
+                        frame = encode_frame(TEXT, full_message)
+                    except ProtocolError:
+                        reply(client_socket, "[СЕРВЕР] Сообщение слишком длинное.")
+                        continue
+                    broadcast(frame, client_socket)
+                elif frame_type in (JOIN, LEAVE, LIST):
+                    reply(client_socket, "[СЕРВЕР] Комнаты доступны только в режиме asyncio.")
+
+            if decoder.error is not None:
+                raise decoder.error
+
+    except ProtocolError as e:
+        print(f"[ОШИБКА] Клиент {client_address} нарушил протокол: {e}")
+    except OSError:
+        pass
+
+    # Обработка отключения клиента
+    with lock:
+        if client_socket in clients:
+            clients.remove(client_socket)
+            del send_locks[client_socket]
+    client_socket.close()
+
+    if nickname is not None:
+        print(f"[ОТКЛЮЧЕНИЕ] Клиент {nickname} ({client_address}) отключился.")
+        # Уведомляем всех об отключении
+        broadcast(encode_frame(SYSTEM, f"[СЕРВЕР] {nickname} покинул чат."))
 
-            with lock:
-                if client_socket in clients:
-                    clients.remove(client_socket)
 
-            # Уведомляем всех об отключении
-            leave_message = f"[СЕРВЕР] {nickname} покинул чат.".encode('utf-8')
-            broadcast(leave_message)
-            client_socket.close()
-            break  # Выход из цикла while True
+def render_metrics():
+    with lock:
+        return metrics.render(len(clients))
 
 
-def start_server():
-    """Инициализация и запуск TCP-сервера."""
+def start_threaded_server(port=PORT, metrics_port=None):
+    """Инициализация и запуск TCP-сервера: отдельный поток на каждого клиента."""
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     # Позволяет повторно использовать адрес сразу после завершения работы
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
     try:
-        server.bind((HOST, PORT))
+        server.bind((HOST, port))
         server.listen()
     except Exception as e:
         print(f"Не удалось запустить сервер: {e}")
         sys.exit()
 
-    print(f"Чат-сервер запущен на {HOST}:{PORT}. Ожидание подключений...")
+    print(f"Чат-сервер запущен на {HOST}:{port}. Ожидание подключений...")
+    if metrics_port is not None:
+        try:
+            chat_metrics.start_metrics_thread(render_metrics, HOST, metrics_port)
+        except OSError as e:
+            print(f"Не удалось запустить сервер метрик: {e}")
 
     try:
         while True:
@@ -99,13 +168,15 @@ def start_server():
             # Добавляем новый сокет в список клиентов
             with lock:
                 clients.append(client_socket)
+                send_locks[client_socket] = threading.Lock()
+                connected = len(clients)
 
             # Запускаем новый поток для обработки этого клиента
             thread = threading.Thread(target=handle_client, args=(client_socket, client_address))
             thread.start()
 
-            # Выводим количество активных потоков (клиентов)
-            print(f"[АКТИВНО] Текущее количество подключений: {threading.active_count() - 1}")
+            # Число потоков не равно числу клиентов (есть ещё поток метрик), поэтому считаем по списку
+            print(f"[АКТИВНО] Текущее количество подключений: {connected}")
 
     except KeyboardInterrupt:
         print("\nСервер остановлен. Закрытие всех соединений.")
@@ -117,5 +188,87 @@ def start_server():
         print("Серверный сокет закрыт.")
 
 
+def parse_address(value):
+    """Разбирает адрес вида HOST:PORT или PORT."""
+    host, _, port = value.rpartition(':')
+    return host or HOST, int(port)
+
+
+def start_server(mode='asyncio', port=PORT, max_queue=chat_hub.MAX_QUEUE, policy=chat_hub.SLOW_CONSUMER_POLICY,
+                 relay=None, workers=1, history_dir=None, metrics_port=None, log_sample=chat_metrics.LOG_SAMPLE):
+    """Запускает чат-сервер в выбранном режиме: asyncio (по умолчанию) или threads.
+
+    relay - адрес (host, port) ретранслятора для кластера. При workers > 1 запускается
+    workers процессов на одном порту (pre-fork), и если relay не задан, главный
+    процесс сам поднимает ретранслятор на RELAY_PORT. history_dir - каталог журнала
+    истории комнат; в кластере его ведёт ретранслятор. metrics_port - порт HTTP-метрик
+    Prometheus; процессы кластера занимают порты metrics_port ... metrics_port + workers - 1.
+    log_sample - печатать каждое log_sample-е сообщение, 0 - не печатать.
+    """
+    if mode == 'threads':
+        if relay is not None or workers > 1 or history_dir is not None:
+            print("Кластер, несколько процессов и история доступны только в режиме asyncio.")
+            return
+        metrics.log_sample = log_sample
+        start_threaded_server(port, metrics_port)
+        return
+
+    if relay is not None and history_dir is not None:
+        print("Внешний ретранслятор ведёт историю сам: запустите его с --history-dir.")
+        return
+
+    if workers <= 1:
+        try:
+            asyncio.run(chat_hub.serve(HOST, port, max_queue, policy, relay, history_dir=history_dir,
+                                       metrics_port=metrics_port, log_sample=log_sample))
+        except KeyboardInterrupt:
+            print("\nСервер остановлен. Закрытие всех соединений.")
+        except OSError as e:
+            print(f"Не удалось запустить сервер: {e}")
+        return
+
+    relay_process = None
+    if relay is None:
+        relay = (HOST, RELAY_PORT)
+        command = [sys.executable, RELAY_SCRIPT, '--port', str(RELAY_PORT)]
+        if history_dir is not None:
+            command += ['--history-dir', history_dir]
+        relay_process = subprocess.Popen(command)
+
+    def worker_main(server_socket):
+        asyncio.run(chat_hub.serve(HOST, port, max_queue, policy, relay, server_socket, history_dir,
+                                   metrics_port, workers, log_sample))
+
+    try:
+        prefork.run(worker_main, HOST, port, workers)
+    except OSError as e:
+        print(f"Не удалось запустить сервер: {e}")
+    finally:
+        if relay_process is not None:
+            relay_process.terminate()
+            relay_process.wait()
+
+
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Многопользовательский чат на сокетах")
+    parser.add_argument('--mode', choices=['asyncio', 'threads'], default='asyncio',
+                        help="asyncio - все клиенты в одном потоке, threads - поток на клиента")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--max-queue', type=int, default=chat_hub.MAX_QUEUE,
+                        help="сколько сообщений может ждать отправки одному клиенту (asyncio)")
+    parser.add_argument('--slow-policy', choices=chat_hub.SLOW_CONSUMER_POLICIES,
+                        default=chat_hub.SLOW_CONSUMER_POLICY,
+                        help="что делать с клиентом, который не успевает читать (asyncio)")
+    parser.add_argument('--relay', metavar='HOST:PORT', type=parse_address, default=None,
+                        help="работать в кластере через ретранслятор relay.py по этому адресу")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="число процессов сервера на одном порту; без --relay запускается свой ретранслятор")
+    parser.add_argument('--history-dir', default=None,
+                        help="хранить историю комнат на диске в этом каталоге (asyncio), по умолчанию только в памяти")
+    parser.add_argument('--metrics-port', type=int, nargs='?', const=chat_metrics.METRICS_PORT, default=None,
+                        help=f"отдавать метрики Prometheus по HTTP (по умолчанию порт {chat_metrics.METRICS_PORT})")
+    parser.add_argument('--log-sample', type=int, default=chat_metrics.LOG_SAMPLE,
+                        help="печатать каждое N-е сообщение чата, 0 - не печатать")
+    args = parser.parse_args()
+    start_server(args.mode, args.port, args.max_queue, args.slow_policy, args.relay, args.workers, args.history_dir,
+                 args.metrics_port, args.log_sample)
\ No newline at end of file
@@ -0,0 +1,420 @@
+"""Асинхронный чат-сервер Task4 на asyncio.
+
+Все клиенты обслуживаются в одном потоке, поэтому общий список клиентов не
+нужно защищать блокировкой. Рассылка не ждёт сокетов: сообщение кодируется
+один раз и кладётся в ограниченную очередь каждого получателя, а отдельная
+задача клиента выгружает свою очередь в сокет. Медленный клиент задерживает
+только себя: при переполнении его очереди срабатывает политика
+SLOW_CONSUMER_POLICY ('drop' - выбрасывать самые старые сообщения,
+'disconnect' - отключать клиента).
+
+Клиенты и сервер обмениваются кадрами protocol.py. Сообщения рассылаются
+только участникам комнаты отправителя; после входа клиент попадает в общую
+комнату DEFAULT_ROOM и может переходить между комнатами кадрами JOIN/LEAVE.
+
+В режиме кластера (relay.py) сообщения комнат рассылаются не напрямую, а
+через ретранслятор, который доставляет их всем процессам-серверам.
+
+Сообщения комнаты нумеруются и хранятся в её истории (history.py): сам
+сервер ведёт историю, а в режиме кластера - ретранслятор. Переподключившийся
+клиент присылает RESUME и получает пропущенное одной пачкой перед живыми
+сообщениями.
+"""
+import asyncio
+import os
+import socket
+import time
+from collections import deque
+
+from history import MAX_RESUME_FRAMES, HistoryLog, RoomHistory, flush_periodically
+from metrics import LOG_SAMPLE, ChatMetrics, serve_metrics
+from protocol import (HELLO, JOIN, LEAVE, LIST, RESUME, SYSTEM, TEXT, ProtocolError, decode_resume,
+                      encode_frame, encode_joined, encode_room_frame, read_frame, room_body)
+from relay import NO_HISTORY, RelayLink
+
+# Сколько сообщений может ждать отправки одному клиенту
+MAX_QUEUE = 1000
+SLOW_CONSUMER_POLICY = 'disconnect'
+SLOW_CONSUMER_POLICIES = ('drop', 'disconnect')
+DEFAULT_ROOM = 'general'
+MAX_ROOM_NAME = 64
+# Сколько комнат показывать в ответе на LIST
+MAX_LISTED_ROOMS = 50
+
+
+class ChatClient:
+    """Подключённый клиент и его очередь исходящих сообщений."""
+    __slots__ = ('hub', 'writer', 'addr', 'nickname', 'room', 'joining', 'queue', 'queued_at', 'wakeup', 'dropped',
+                 'closed')
+
+    def __init__(self, hub, writer, addr):
+        self.hub = hub
+        self.writer = writer
+        self.addr = addr
+        self.nickname = None
+        self.room = None
+        # Имя комнаты, в которую клиент входит, пока ретранслятор присылает её историю
+        self.joining = None
+        self.queue = deque()
+        # Когда в пустую очередь попал первый кадр (для метрики задержки в очереди)
+        self.queued_at = 0.0
+        self.wakeup = asyncio.Event()
+        # Сколько сообщений выброшено из-за переполнения очереди
+        self.dropped = 0
+        self.closed = False
+
+    def send(self, data, now=None):
+        """Ставит готовый кадр в очередь; возвращает False, если клиента нужно отключить.
+
+        now - time.monotonic(), уже снятое вызывающим: рассылка снимает его один раз на всех получателей.
+        """
+        if self.closed:
+            return True
+        if not self.queue:
+            self.queued_at = time.monotonic() if now is None else now
+        elif len(self.queue) >= self.hub.max_queue:
+            if self.hub.policy == 'disconnect':
+                return False
+            self.queue.popleft()
+            self.dropped += 1
+            self.hub.metrics.dropped += 1
+        self.queue.append(data)
+        self.wakeup.set()
+        return True
+
+    async def write_loop(self):
+        """Выгружает очередь в сокет: все накопившиеся кадры уходят одним системным вызовом."""
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                if not self.queue:
+                    continue
+                batch = list(self.queue)
+                self.queue.clear()
+                self.hub.metrics.queue_delay_seconds.observe(time.monotonic() - self.queued_at)
+                # С Python 3.12 writelines отправляет кадры через sendmsg без склейки, раньше - одним send
+                self.writer.writelines(batch)
+                # Пока клиент не прочитал данные, новые сообщения копятся в его очереди
+                await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.close()
+
+    def close(self):
+        """Закрывает соединение немедленно, не дожидаясь отправки очереди."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.wakeup.set()
+        self.writer.transport.abort()
+
+
+class Room:
+    """Комната чата: рассылка в неё стоит O(числа участников), а не O(числа всех клиентов).
+
+    history - RoomHistory, если историю ведёт этот сервер, и None в режиме кластера.
+    """
+    __slots__ = ('name', 'members', 'history')
+
+    def __init__(self, name, history=None):
+        self.name = name
+        self.members = set()
+        self.history = history
+
+
+def valid_room_name(name):
+    return bool(name) and len(name) <= MAX_ROOM_NAME and name.isprintable()
+
+
+class ChatHub:
+    """Реестр клиентов и комнат, рассылка сообщений.
+
+    Все методы выполняются в одном потоке цикла событий, поэтому каждая
+    комната - по сути актор: её состояние меняется только между await и
+    не требует блокировок.
+    """
+
+    def __init__(self, max_queue=MAX_QUEUE, policy=SLOW_CONSUMER_POLICY, history_log=None, relay=None,
+                 log_sample=LOG_SAMPLE):
+        """history_log - HistoryLog для хранения истории на диске; relay - адрес ретранслятора для кластера;
+        log_sample - печатать каждое log_sample-е сообщение (0 - не печатать)."""
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Неизвестная политика: {policy}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.clients = set()
+        self.metrics = ChatMetrics(log_sample)
+        self.history_log = history_log
+        # Подключение к ретранслятору в режиме кластера
+        self.relay = RelayLink(self, *relay) if relay is not None else None
+        # Имя комнаты -> Room; пустые комнаты, кроме общей, удаляются вместе с историей в памяти
+        self.rooms = {}
+        self._create_room(DEFAULT_ROOM)
+
+    def _create_room(self, name):
+        if self.relay is not None:
+            room = self.rooms[name] = Room(name)
+            self.relay.subscribe(name)
+        else:
+            room = self.rooms[name] = Room(name, RoomHistory(name, self.history_log))
+        return room
+
+    def _drop_if_empty(self, name):
+        room = self.rooms.get(name)
+        if room is None or room.members or name == DEFAULT_ROOM:
+            return
+        del self.rooms[name]
+        if self.relay is not None:
+            self.relay.unsubscribe(name)
+        elif self.history_log is not None:
+            self.history_log.close_room(name)
+
+    def publish(self, room, body, exclude=None):
+        """Рассылает сообщение комнаты (protocol.room_body): сразу или, в режиме кластера, через ретранслятор."""
+        if self.relay is None:
+            self.broadcast(room, self._record(room, body), exclude)
+        else:
+            self.relay.publish(room.name, body, exclude)
+
+    def _record(self, room, body):
+        """Присваивает сообщению следующий номер комнаты, сохраняет его в истории и возвращает кадр ROOM."""
+        seq = room.history.last_seq + 1
+        frame = encode_room_frame(seq, body)
+        room.history.append(seq, frame)
+        return frame
+
+    def deliver(self, room_name, message, exclude=None):
+        """Принимает кадр комнаты от ретранслятора и рассылает его локальным участникам."""
+        room = self.rooms.get(room_name)
+        if room is not None:
+            self.broadcast(room, message, exclude)
+
+    def broadcast(self, room, message, sender=None):
+        """Отправляет закодированный кадр всем участникам комнаты, кроме отправителя."""
+        # Уведомления об уходе отключённых медленных клиентов рассылаются в этом же цикле,
+        # а не рекурсивно: иначе каскад отключений переполняет стек
+        pending = [(room, message, sender)]
+        metrics = self.metrics
+        while pending:
+            room, message, sender = pending.pop()
+            now = time.monotonic()
+            slow = [client for client in room.members if client is not sender and not client.send(message, now)]
+            metrics.messages_out += len(room.members) - (sender in room.members) - len(slow)
+            metrics.broadcast_seconds.observe(time.monotonic() - now)
+            # Отключаем медленных клиентов после обхода, чтобы не менять множество во время итерации
+            for client in slow:
+                metrics.slow_disconnects += 1
+                print(f"[МЕДЛЕННЫЙ] {client.nickname} ({client.addr}) не успевает читать, отключён.")
+                departure = self._remove(client)
+                if departure is None:
+                    continue
+                if self.relay is not None:
+                    self.relay.publish(departure[0].name, departure[1])
+                else:
+                    pending.append((departure[0], self._record(*departure), None))
+                self._drop_if_empty(departure[0].name)
+
+    def join(self, client, name, after=None):
+        """Переводит клиента в комнату name, создавая её при необходимости.
+
+        after - номер последнего сообщения комнаты, полученного клиентом до
+        переподключения (RESUME); пропущенное после него придёт одной пачкой.
+        """
+        current = client.room.name if client.room is not None else client.joining
+        if current == name and after is None:
+            client.send(encode_frame(SYSTEM, f"[СЕРВЕР] Вы уже в комнате {name}."))
+            return
+        if client.room is not None:
+            old_room = self._leave_room(client)
+            self.publish(old_room, room_body(SYSTEM, f"[СЕРВЕР] {client.nickname} перешёл в комнату {name}."))
+            self._drop_if_empty(old_room.name)
+
+        room = self.rooms.get(name) or self._create_room(name)
+        client.joining = name
+        # История запрашивается до уведомления о входе, чтобы оно не попало клиенту в пачку пропущенного
+        if self.relay is not None:
+            def on_history(last_seq, total, history):
+                if last_seq is None:
+                    # Ретранслятор недоступен: входим без истории
+                    last_seq = self.relay.room_seq.get(name, 0)
+                self._attach(client, name, last_seq if after is None else after, history, total)
+
+            self.relay.replay(name, NO_HISTORY if after is None else after, on_history)
+        elif after is None:
+            self._attach(client, name, room.history.last_seq)
+        else:
+            frames, total = room.history.since(after)
+            self._attach(client, name, after, b''.join(frames), total)
+
+        action = "вернулся в комнату" if after is not None else "присоединился к комнате"
+        self.publish(room, room_body(SYSTEM, f"[СЕРВЕР] {client.nickname} {action} {name}!"), client)
+
+    def _attach(self, client, name, seq, history=b'', total=0):
+        """Добавляет клиента в комнату: JOINED, пропущенные сообщения одной пачкой, затем живые сообщения."""
+        if client.closed or client.joining != name:
+            # Клиент отключился или попросился в другую комнату, пока ретранслятор присылал историю
+            self._drop_if_empty(name)
+            return
+        client.joining = None
+        room = self.rooms.get(name) or self._create_room(name)
+        client.send(encode_joined(name, seq))
+        if history:
+            client.send(history)
+        if total > MAX_RESUME_FRAMES:
+            client.send(encode_frame(SYSTEM, f"[СЕРВЕР] Пропущено сообщений: {total}, "
+                                             f"показаны последние {MAX_RESUME_FRAMES}."))
+        room.members.add(client)
+        client.room = room
+        client.send(encode_frame(SYSTEM, f"[СЕРВЕР] Вы в комнате {name} (участников: {len(room.members)})."))
+
+    def list_rooms(self):
+        """Описание комнат для ответа на LIST: самые многолюдные первыми.
+
+        В режиме кластера показываются только участники, подключённые к этому процессу.
+        """
+        rooms = sorted(self.rooms.values(), key=lambda room: (-len(room.members), room.name))
+        lines = [f"{room.name} ({len(room.members)})" for room in rooms[:MAX_LISTED_ROOMS]]
+        if len(rooms) > MAX_LISTED_ROOMS:
+            lines.append(f"... и ещё {len(rooms) - MAX_LISTED_ROOMS}")
+        return "[СЕРВЕР] Комнаты: " + ", ".join(lines)
+
+    def disconnect(self, client):
+        departure = self._remove(client)
+        if departure is not None:
+            self.publish(*departure)
+            self._drop_if_empty(departure[0].name)
+
+    def _leave_room(self, client):
+        """Убирает клиента из его комнаты. Опустевшую комнату вызывающий удаляет сам через
+        _drop_if_empty - уже после уведомления об уходе, пока журнал комнаты ещё открыт."""
+        room = client.room
+        client.room = None
+        room.members.discard(client)
+        return room
+
+    def _remove(self, client):
+        """Закрывает клиента; возвращает (комната, уведомление о его уходе) или None."""
+        client.close()
+        if client not in self.clients:
+            return None
+        self.clients.discard(client)
+        if client.room is None:
+            return None
+        room = self._leave_room(client)
+        return room, room_body(SYSTEM, f"[СЕРВЕР] {client.nickname} покинул чат.")
+
+    def handle_frame(self, client, frame_type, payload):
+        """Выполняет кадр, присланный клиентом после HELLO."""
+        if frame_type == TEXT:
+            if client.room is None:
+                client.send(encode_frame(SYSTEM, "[СЕРВЕР] Вход в комнату ещё не завершён, повторите позже."))
+                return
+            # Формируем сообщение для рассылки один раз для всех получателей
+            full_message = f"[{client.nickname}] {payload.decode('utf-8', errors='replace')}"
+            self.metrics.messages_in += 1
+            # Печать каждого сообщения сама становится узким местом, поэтому лог выборочный
+            if self.metrics.should_log():
+                print(f"[РАССЫЛКА] [{client.room.name}] {full_message}")
+            try:
+                body = room_body(TEXT, full_message)
+            except ProtocolError:
+                # Никнейм вместе с сообщением не уместились в кадр
+                client.send(encode_frame(SYSTEM, "[СЕРВЕР] Сообщение слишком длинное."))
+                return
+            self.publish(client.room, body, client)
+        elif frame_type == JOIN:
+            name = payload.decode('utf-8', errors='replace').strip()
+            if not valid_room_name(name):
+                client.send(encode_frame(SYSTEM, "[СЕРВЕР] Некорректное имя комнаты."))
+                return
+            self.join(client, name)
+        elif frame_type == LEAVE:
+            self.join(client, DEFAULT_ROOM)
+        elif frame_type == LIST:
+            client.send(encode_frame(SYSTEM, self.list_rooms()))
+
+    def render_metrics(self):
+        extra = ()
+        if self.relay is not None:
+            extra = (('chat_relay_outstanding', 'gauge', "Публикации, ещё не подтверждённые ретранслятором",
+                      len(self.relay.outstanding)),
+                     ('chat_relay_duplicates_total', 'counter', "Отброшенные повторы кадров от ретранслятора",
+                      self.relay.duplicates))
+        return self.metrics.render(len(self.clients), len(self.rooms),
+                                   (len(client.queue) for client in self.clients), extra)
+
+    async def handle_client(self, reader, writer):
+        """Обслуживает одного клиента: первый кадр - HELLO или RESUME, затем сообщения и команды."""
+        addr = writer.get_extra_info('peername')
+        print(f"[НОВОЕ] Соединение установлено: {addr}")
+        client = ChatClient(self, writer, addr)
+        writer_task = asyncio.ensure_future(client.write_loop())
+        try:
+            frame_type, payload = await read_frame(reader)
+            room, after = DEFAULT_ROOM, None
+            if frame_type == HELLO:
+                client.nickname = payload.decode('utf-8', errors='replace')
+            elif frame_type == RESUME:
+                client.nickname, room, after = decode_resume(payload)
+                if not valid_room_name(room):
+                    room, after = DEFAULT_ROOM, None
+            else:
+                raise ProtocolError("Первым кадром должен быть HELLO или RESUME")
+            print(f"[НИК] Клиент {addr} представился как: {client.nickname}")
+            self.clients.add(client)
+            self.join(client, room, after)
+            print(f"[АКТИВНО] Текущее количество подключений: {len(self.clients)}")
+
+            while not client.closed:
+                frame_type, payload = await read_frame(reader)
+                self.handle_frame(client, frame_type, payload)
+        except ProtocolError as e:
+            print(f"[ОШИБКА] Клиент {addr} нарушил протокол: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            if client.nickname is not None:
+                print(f"[ОТКЛЮЧЕНИЕ] Клиент {client.nickname} ({addr}) отключился.")
+            try:
+                self.disconnect(client)
+            finally:
+                writer_task.cancel()
+
+
+async def serve(host, port, max_queue=MAX_QUEUE, policy=SLOW_CONSUMER_POLICY, relay=None, sock=None,
+                history_dir=None, metrics_port=None, metrics_tries=1, log_sample=LOG_SAMPLE):
+    """Запускает асинхронный чат-сервер и обслуживает клиентов до отмены.
+
+    relay - адрес (host, port) ретранслятора для режима кластера; sock - уже
+    открытый слушающий сокет (при запуске в нескольких процессах); history_dir -
+    каталог журнала истории на диске (в кластере журнал ведёт ретранслятор);
+    metrics_port - порт HTTP-метрик (None - без метрик), процессы кластера
+    занимают первый свободный из metrics_tries портов подряд.
+    """
+    history_log = HistoryLog(history_dir) if history_dir is not None and relay is None else None
+    hub = ChatHub(max_queue, policy, history_log, relay, log_sample)
+    metrics_server = None
+    if metrics_port is not None:
+        metrics_server = await serve_metrics(hub.render_metrics, host, metrics_port, metrics_tries)
+    tasks = []
+    if hub.relay is not None:
+        tasks.append(asyncio.ensure_future(hub.relay.run()))
+    if history_log is not None:
+        tasks.append(asyncio.ensure_future(flush_periodically(history_log)))
+
+    if sock is not None:
+        server = await asyncio.start_server(hub.handle_client, sock=sock)
+    else:
+        server = await asyncio.start_server(hub.handle_client, host, port, backlog=socket.SOMAXCONN)
+    print(f"Чат-сервер (asyncio, PID {os.getpid()}) запущен на {host}:{port}. Ожидание подключений...")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        if history_log is not None:
+            history_log.close()
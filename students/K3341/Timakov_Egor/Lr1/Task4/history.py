@@ -0,0 +1,212 @@
+"""История сообщений комнат чата Task4.
+
+В памяти каждая комната хранит последние HISTORY_SIZE кадров в кольцевом
+буфере, который выделяется целиком при создании комнаты и дальше не растёт.
+Для более долгого хранения можно включить журнал на диске: по файлу на
+комнату, записи только дописываются в конец. Чтобы быстро найти в журнале
+сообщения после номера N, комната помнит смещение каждой CHECKPOINT_EVERY-й
+записи и читает файл с ближайшей контрольной точки, а не с начала.
+
+Кадры в истории - готовые кадры ROOM (protocol.encode_room_frame), их номера
+в комнате идут подряд с единицы.
+"""
+import asyncio
+import bisect
+import hashlib
+import os
+from collections import deque
+
+from protocol import HEADER, ROOM_HEADER
+
+# Сколько последних кадров каждая комната держит в памяти
+HISTORY_SIZE = 256
+# Сколько пропущенных кадров отдавать клиенту за одну докачку
+MAX_RESUME_FRAMES = 1000
+# Как часто запоминать смещение записи в журнале
+CHECKPOINT_EVERY = 256
+# Как часто сбрасывать буферы журнала в ОС, с
+FLUSH_INTERVAL = 0.2
+
+
+def frame_seq(frame, offset=0):
+    """Номер кадра ROOM в комнате."""
+    return ROOM_HEADER.unpack_from(frame, offset + HEADER.size)[0]
+
+
+class History:
+    """Кольцевой буфер последних capacity кадров комнаты фиксированного размера."""
+    __slots__ = ('capacity', 'last_seq', 'count', '_frames')
+
+    def __init__(self, capacity=HISTORY_SIZE):
+        self.capacity = capacity
+        self.last_seq = 0
+        # Сколько кадров сейчас в буфере (не больше capacity)
+        self.count = 0
+        self._frames = [None] * capacity
+
+    def append(self, seq, frame):
+        """Добавляет кадр с номером seq; номера должны идти подряд."""
+        self._frames[seq % self.capacity] = frame
+        self.last_seq = seq
+        self.count = min(self.count + 1, self.capacity)
+
+    @property
+    def first_seq(self):
+        """Номер самого старого кадра в буфере."""
+        return self.last_seq - self.count + 1
+
+    def since(self, after):
+        """Кадры с номерами больше after: (кадры, есть ли среди них все пропущенные)."""
+        if after >= self.last_seq:
+            return [], True
+        start = max(after + 1, self.first_seq)
+        frames = [self._frames[seq % self.capacity] for seq in range(start, self.last_seq + 1)]
+        return frames, start == after + 1
+
+
+class RoomLog:
+    """Журнал одной комнаты на диске."""
+    __slots__ = ('path', '_file', '_checkpoints', '_records', 'dirty')
+
+    def __init__(self, path, history):
+        self.path = path
+        # Пары (номер кадра, смещение в файле) для каждой CHECKPOINT_EVERY-й записи
+        self._checkpoints = []
+        self._records = 0
+        self._replay(history)
+        self._file = open(path, 'ab')
+        self.dirty = False
+
+    def _replay(self, history):
+        """Заполняет history хвостом журнала и отрезает недописанную при сбое запись."""
+        if not os.path.exists(self.path):
+            return
+        good_size = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                length, _ = HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or length < ROOM_HEADER.size:
+                    break
+                frame = header + payload
+                self._remember(frame_seq(frame), good_size)
+                history.append(frame_seq(frame), frame)
+                good_size += len(frame)
+        if good_size < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_size)
+
+    def _remember(self, seq, offset):
+        if self._records % CHECKPOINT_EVERY == 0:
+            self._checkpoints.append((seq, offset))
+        self._records += 1
+
+    def append(self, seq, frame):
+        self._remember(seq, self._file.tell())
+        self._file.write(frame)
+        self.dirty = True
+
+    def read_since(self, after, limit=MAX_RESUME_FRAMES):
+        """Последние limit кадров с номерами больше after и общее число таких кадров."""
+        self.flush()
+        index = bisect.bisect_right(self._checkpoints, (after + 1, float('inf'))) - 1
+        offset = self._checkpoints[index][1] if index >= 0 else 0
+
+        frames = deque(maxlen=limit)
+        total = 0
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                length, _ = HEADER.unpack(header)
+                frame = header + f.read(length)
+                if frame_seq(frame) > after:
+                    frames.append(frame)
+                    total += 1
+        return list(frames), total
+
+    def flush(self):
+        if self.dirty:
+            self._file.flush()
+            self.dirty = False
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class HistoryLog:
+    """Каталог журналов комнат; файл комнаты назван по хэшу её имени."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._open = {}
+
+    def _path(self, name):
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.directory, f"{digest}.log")
+
+    def has_room(self, name):
+        """Есть ли у комнаты журнал на диске."""
+        return os.path.exists(self._path(name))
+
+    def open_room(self, name, history):
+        """Открывает журнал комнаты, заполняя history его хвостом."""
+        log = RoomLog(self._path(name), history)
+        self._open[name] = log
+        return log
+
+    def close_room(self, name):
+        log = self._open.pop(name, None)
+        if log is not None:
+            log.close()
+
+    def flush(self):
+        """Сбрасывает буферы всех открытых журналов в ОС."""
+        for log in self._open.values():
+            log.flush()
+
+    def close(self):
+        for log in self._open.values():
+            log.close()
+        self._open.clear()
+
+
+class RoomHistory:
+    """История комнаты: кольцевой буфер в памяти и, при наличии, журнал на диске."""
+    __slots__ = ('buffer', 'log')
+
+    def __init__(self, name, history_log=None, capacity=HISTORY_SIZE):
+        self.buffer = History(capacity)
+        self.log = history_log.open_room(name, self.buffer) if history_log is not None else None
+
+    @property
+    def last_seq(self):
+        return self.buffer.last_seq
+
+    def append(self, seq, frame):
+        self.buffer.append(seq, frame)
+        if self.log is not None:
+            self.log.append(seq, frame)
+
+    def since(self, after, limit=MAX_RESUME_FRAMES):
+        """Пропущенные кадры после номера after: (последние limit кадров, сколько всего пропущено)."""
+        frames, complete = self.buffer.since(after)
+        if not complete and self.log is not None:
+            # В памяти не всё - дочитываем с диска, начиная с ближайшей контрольной точки
+            return self.log.read_since(after, limit)
+        total = len(frames) if complete else self.buffer.last_seq - after
+        return frames[-limit:], total
+
+
+async def flush_periodically(history_log, interval=FLUSH_INTERVAL):
+    """Периодически сбрасывает журнал: запись в файл не требует системного вызова на каждое сообщение."""
+    while True:
+        await asyncio.sleep(interval)
+        history_log.flush()
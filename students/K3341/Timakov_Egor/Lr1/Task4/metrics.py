@@ -0,0 +1,190 @@
+"""Метрики чат-сервера Task4 в текстовом формате Prometheus.
+
+Счётчики только растут, скорость (сообщений в секунду) считает Prometheus:
+rate(chat_messages_in_total[1m]). Глубина очередей клиентов снимается в
+момент запроса метрик и отдаётся гистограммой, а не отдельным рядом на
+каждого клиента: при 10 000 клиентов иначе получилось бы 10 000 рядов.
+
+Метрики отдаются по HTTP: GET /metrics. Для режима asyncio сервер метрик
+работает в том же цикле событий, для режима threads - в отдельном потоке.
+"""
+import asyncio
+import bisect
+import os
+import socket
+import sys
+import threading
+
+# Разбор HTTP-запросов лежит в каталоге Lr1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_parser import RequestParser  # noqa: E402
+
+HOST = '127.0.0.1'
+METRICS_PORT = 9155
+RECV_SIZE = 4096
+# Границы корзин гистограмм задержек, с
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Границы корзин глубины очереди клиента
+QUEUE_BUCKETS = (0, 1, 2, 5, 10, 50, 100, 500, 1000, 5000)
+# Каждое какое по счёту сообщение печатать в лог; 0 - не печатать сообщения совсем
+LOG_SAMPLE = 0
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe стоит один bisect."""
+    __slots__ = ('name', 'help', 'buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        # Последняя ячейка - значения больше самой большой границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+
+
+def _metric(lines, name, kind, help_text, value):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    lines.append(f"{name} {value}")
+
+
+class ChatMetrics:
+    """Счётчики и гистограммы одного процесса чат-сервера."""
+
+    def __init__(self, log_sample=LOG_SAMPLE):
+        self.log_sample = log_sample
+        self.messages_in = 0
+        self.messages_out = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.broadcast_seconds = Histogram(
+            'chat_broadcast_seconds', "Время раскладки одного сообщения по очередям участников комнаты")
+        self.queue_delay_seconds = Histogram(
+            'chat_queue_delay_seconds', "Сколько кадр ждал в очереди клиента до записи в сокет")
+
+    def should_log(self):
+        """Печатать ли текущее сообщение: логируется каждое log_sample-е принятое сообщение."""
+        return self.log_sample > 0 and self.messages_in % self.log_sample == 0
+
+    def render(self, clients, rooms=None, queue_depths=None, extra=()):
+        """Текст ответа /metrics.
+
+        queue_depths - длины очередей клиентов на момент запроса; extra - пары
+        (имя, тип, описание, значение) для метрик, известных только серверу.
+        """
+        lines = []
+        _metric(lines, 'chat_clients', 'gauge', "Подключённые клиенты", clients)
+        if rooms is not None:
+            _metric(lines, 'chat_rooms', 'gauge', "Комнаты с участниками в этом процессе", rooms)
+        _metric(lines, 'chat_messages_in_total', 'counter', "Сообщения, принятые от клиентов", self.messages_in)
+        _metric(lines, 'chat_messages_out_total', 'counter', "Кадры, отправленные получателям рассылки",
+                self.messages_out)
+        _metric(lines, 'chat_messages_dropped_total', 'counter',
+                "Кадры, выброшенные из переполненных очередей (политика drop)", self.dropped)
+        _metric(lines, 'chat_slow_disconnects_total', 'counter',
+                "Клиенты, отключённые за переполнение очереди (политика disconnect)", self.slow_disconnects)
+        for name, kind, help_text, value in extra:
+            _metric(lines, name, kind, help_text, value)
+        self.broadcast_seconds.render(lines)
+        if queue_depths is not None:
+            depths = Histogram('chat_client_queue_depth', "Длина очереди исходящих кадров клиента", QUEUE_BUCKETS)
+            deepest = 0
+            for depth in queue_depths:
+                depths.observe(depth)
+                deepest = max(deepest, depth)
+            _metric(lines, 'chat_client_queue_depth_max', 'gauge', "Самая длинная очередь клиента", deepest)
+            depths.render(lines)
+            self.queue_delay_seconds.render(lines)
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_response(request, render):
+    """HTTP-ответ на запрос к серверу метрик; render() возвращает текст метрик."""
+    if request.method != 'GET' or request.path.split('?', 1)[0] != '/metrics':
+        body, status, content_type = b"Not Found\n", '404 Not Found', 'text/plain; charset=utf-8'
+    else:
+        body = render().encode('utf-8')
+        status, content_type = '200 OK', 'text/plain; version=0.0.4; charset=utf-8'
+    head = (f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    return head.encode('ascii') + body
+
+
+async def serve_metrics(render, host=HOST, port=METRICS_PORT, tries=1):
+    """Сервер метрик в текущем цикле событий. Перебирает tries портов подряд, начиная с port:
+    при запуске в нескольких процессах каждый занимает свой. Возвращает asyncio.Server."""
+    async def handle(reader, writer):
+        parser = RequestParser()
+        try:
+            while True:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    return
+                requests = parser.feed(data)
+                if requests:
+                    writer.write(metrics_response(requests[0], render))
+                    await writer.drain()
+                    return
+                if parser.error is not None:
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    for offset in range(tries):
+        try:
+            server = await asyncio.start_server(handle, host, port + offset)
+        except OSError:
+            if offset == tries - 1:
+                raise
+            continue
+        print(f"Метрики (PID {os.getpid()}): http://{host}:{port + offset}/metrics")
+        return server
+
+
+def start_metrics_thread(render, host=HOST, port=METRICS_PORT):
+    """Сервер метрик в отдельном потоке для серверов на потоках."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen()
+
+    def loop():
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                conn.settimeout(5.0)
+                parser = RequestParser()
+                try:
+                    while True:
+                        data = conn.recv(RECV_SIZE)
+                        requests = parser.feed(data) if data else []
+                        if requests:
+                            conn.sendall(metrics_response(requests[0], render))
+                        if requests or not data or parser.error is not None:
+                            break
+                except OSError:
+                    pass
+
+    threading.Thread(target=loop, daemon=True).start()
+    print(f"Метрики: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,151 @@
+"""Двоичный протокол чата Task4.
+
+Каждое сообщение передаётся кадром: 4 байта длины полезной нагрузки
+(big-endian), 1 байт типа кадра и сама нагрузка в UTF-8. Благодаря явной
+длине сообщение не режется и не склеивается с соседними, как бы TCP ни
+разбил поток на куски, и многобайтовые символы не разрываются.
+
+Сообщения комнат (ROOM) пронумерованы подряд внутри комнаты. Переподключаясь,
+клиент вместо HELLO присылает RESUME с номером последнего полученного
+сообщения и получает пропущенное одной пачкой (history.py).
+"""
+import struct
+
+HEADER = struct.Struct('!IB')
+# Максимальный размер полезной нагрузки одного кадра
+MAX_PAYLOAD = 64 * 1024
+
+# Типы кадров
+HELLO = 1   # клиент -> сервер: никнейм, первый кадр соединения
+TEXT = 2    # клиент -> сервер: сообщение; сервер -> клиент: сообщение чата
+SYSTEM = 3  # сервер -> клиент: уведомление сервера
+JOIN = 4    # клиент -> сервер: перейти в комнату, нагрузка - имя комнаты
+LEAVE = 5   # клиент -> сервер: вернуться в общую комнату
+LIST = 6    # клиент -> сервер: запросить список комнат
+ROOM = 7    # сервер -> клиент: сообщение комнаты с порядковым номером (asyncio)
+JOINED = 8  # сервер -> клиент: вы в комнате, нагрузка - номер последнего сообщения и имя комнаты
+RESUME = 9  # клиент -> сервер: вместо HELLO при переподключении, докачать сообщения комнаты после номера N
+FRAME_TYPES = (HELLO, TEXT, SYSTEM, JOIN, LEAVE, LIST, ROOM, JOINED, RESUME)
+
+# Кадры между чат-серверами кластера и ретранслятором (relay.py)
+NODE_HELLO = 16   # сервер -> ретранслятор: идентификатор узла; ответ - идентификатор запуска ретранслятора
+SUBSCRIBE = 17    # подписаться на комнату
+UNSUBSCRIBE = 18  # отписаться от комнаты
+PUBLISH = 19      # опубликовать сообщение в комнату (room_body, без номера)
+DELIVER = 20      # ретранслятор -> серверы: готовый кадр ROOM с порядковым номером
+REPLAY = 21       # сервер -> ретранслятор: запросить историю комнаты после номера N
+REPLAYED = 22     # ретранслятор -> сервер: часть запрошенной истории
+RELAY_FRAME_TYPES = (NODE_HELLO, SUBSCRIBE, UNSUBSCRIBE, PUBLISH, DELIVER, REPLAY, REPLAYED)
+
+# Нагрузка ROOM: номер сообщения в комнате, тип исходного сообщения (TEXT или SYSTEM), затем текст
+ROOM_HEADER = struct.Struct('!QB')
+SEQ = struct.Struct('!Q')
+# Нагрузка RESUME: номер последнего полученного сообщения, длина имени комнаты, затем комната и никнейм
+RESUME_HEADER = struct.Struct('!QH')
+
+
+class ProtocolError(ValueError):
+    """Поток данных нарушает формат кадров."""
+
+
+def encode_frame(frame_type, payload, max_payload=MAX_PAYLOAD):
+    """Кодирует кадр; payload - str или bytes."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    if len(payload) > max_payload:
+        raise ProtocolError(f"Сообщение длиннее {max_payload} байт")
+    return HEADER.pack(len(payload), frame_type) + payload
+
+
+def room_body(kind, text):
+    """Тело сообщения комнаты без номера: номер присваивает тот, кто ведёт историю комнаты."""
+    body = bytes([kind]) + text.encode('utf-8')
+    if len(body) > MAX_PAYLOAD - SEQ.size:
+        raise ProtocolError(f"Сообщение длиннее {MAX_PAYLOAD - ROOM_HEADER.size} байт")
+    return body
+
+
+def encode_room_frame(seq, body):
+    return encode_frame(ROOM, SEQ.pack(seq) + body)
+
+
+def decode_room(payload):
+    """Разбирает нагрузку ROOM: (номер, тип исходного сообщения, текст)."""
+    seq, kind = ROOM_HEADER.unpack_from(payload)
+    return seq, kind, payload[ROOM_HEADER.size:].decode('utf-8', errors='replace')
+
+
+def encode_joined(room, seq):
+    return encode_frame(JOINED, SEQ.pack(seq) + room.encode('utf-8'))
+
+
+def decode_joined(payload):
+    return payload[SEQ.size:].decode('utf-8', errors='replace'), SEQ.unpack_from(payload)[0]
+
+
+def encode_resume(nickname, room, after):
+    room = room.encode('utf-8')
+    return encode_frame(RESUME, RESUME_HEADER.pack(after, len(room)) + room + nickname.encode('utf-8'))
+
+
+def decode_resume(payload):
+    """Разбирает нагрузку RESUME: (никнейм, комната, номер последнего полученного сообщения)."""
+    if len(payload) < RESUME_HEADER.size:
+        raise ProtocolError("Слишком короткий кадр RESUME")
+    after, room_len = RESUME_HEADER.unpack_from(payload)
+    room = payload[RESUME_HEADER.size:RESUME_HEADER.size + room_len].decode('utf-8', errors='replace')
+    nickname = payload[RESUME_HEADER.size + room_len:].decode('utf-8', errors='replace')
+    return nickname, room, after
+
+
+def _check_header(length, frame_type, frame_types=FRAME_TYPES, max_payload=MAX_PAYLOAD):
+    if frame_type not in frame_types:
+        raise ProtocolError(f"Неизвестный тип кадра: {frame_type}")
+    if length > max_payload:
+        raise ProtocolError("Слишком длинный кадр")
+
+
+class FrameDecoder:
+    """Инкрементальный разбор кадров для блокирующих сокетов.
+
+    feed(data) принимает очередной кусок, прочитанный recv, и возвращает список
+    готовых кадров (тип, нагрузка). После ошибки она сохраняется в error,
+    а дальнейшие данные игнорируются.
+    """
+    __slots__ = ('_buffer', 'error')
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.error = None
+
+    def feed(self, data):
+        if self.error is not None:
+            return []
+        self._buffer += data
+        frames = []
+        pos = 0
+        try:
+            while len(self._buffer) - pos >= HEADER.size:
+                length, frame_type = HEADER.unpack_from(self._buffer, pos)
+                _check_header(length, frame_type)
+                end = pos + HEADER.size + length
+                if len(self._buffer) < end:
+                    break
+                frames.append((frame_type, bytes(self._buffer[pos + HEADER.size:end])))
+                pos = end
+        except ProtocolError as e:
+            self.error = e
+            self._buffer = bytearray()
+            return frames
+        # Сдвигаем буфер один раз за вызов, а не после каждого кадра
+        del self._buffer[:pos]
+        return frames
+
+
+async def read_frame(reader, frame_types=FRAME_TYPES, max_payload=MAX_PAYLOAD):
+    """Читает один кадр из asyncio.StreamReader; при закрытом соединении бросает IncompleteReadError."""
+    header = await reader.readexactly(HEADER.size)
+    length, frame_type = HEADER.unpack(header)
+    _check_header(length, frame_type, frame_types, max_payload)
+    payload = await reader.readexactly(length) if length else b''
+    return frame_type, payload
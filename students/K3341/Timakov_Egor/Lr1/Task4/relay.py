@@ -0,0 +1,413 @@
+"""Ретранслятор сообщений для кластера чат-серверов Task4.
+
+Несколько процессов chat_hub на одной машине подключаются к ретранслятору
+и публикуют в него кадры комнат. Ретранслятор - единственный источник
+порядка: он присваивает каждому сообщению комнаты следующий порядковый
+номер и рассылает его всем узлам, подписанным на комнату, включая
+отправителя. Узел показывает своим клиентам сообщения только в том виде,
+в каком их вернул ретранслятор, поэтому порядок сообщений комнаты одинаков
+на всех узлах.
+
+Каждое сообщение помечено (идентификатор узла, номер сообщения узла). Узел
+отбрасывает уже виденные сообщения, поэтому повторная отправка после
+обрыва связи с ретранслятором не приводит к дублям. Ретранслятор помнит
+номера недавних сообщений каждого узла: повторно присланное сообщение не
+получает новый номер и не попадает в историю второй раз, а отправителю
+уходит прежний кадр DELIVER.
+
+Раз номера выдаёт ретранслятор, он же хранит историю комнат (history.py):
+переподключившийся клиент может попасть на другой процесс, и тот запрашивает
+пропущенные сообщения у ретранслятора кадром REPLAY. Открытыми держатся
+истории не больше MAX_ROOM_HISTORIES комнат: давно не использованные комнаты
+без подписчиков закрываются (с журналом - остаются на диске и открываются
+снова при следующей публикации или запросе истории).
+
+Запуск отдельно: python relay.py --port 55600 [--history-dir DIR]
+"""
+import argparse
+import asyncio
+import os
+import struct
+import uuid
+from collections import OrderedDict
+
+from history import HistoryLog, RoomHistory, flush_periodically
+from protocol import (DELIVER, MAX_PAYLOAD, NODE_HELLO, PUBLISH, RELAY_FRAME_TYPES, REPLAY, REPLAYED, SUBSCRIBE,
+                      UNSUBSCRIBE, ProtocolError, encode_frame, encode_room_frame, read_frame)
+
+HOST = '127.0.0.1'
+RELAY_PORT = 55600
+# Кадр ретранслятора содержит клиентский кадр плюс имя комнаты и служебные поля
+RELAY_MAX_PAYLOAD = MAX_PAYLOAD + 1024
+PUBLISH_HEADER = struct.Struct('!QH')    # номер сообщения узла, длина имени комнаты
+DELIVER_HEADER = struct.Struct('!QQHH')  # номер в комнате, номер сообщения узла, длины имён комнаты и узла
+REPLAY_HEADER = struct.Struct('!QQ')     # номер запроса, номер последнего полученного клиентом сообщения
+REPLAYED_HEADER = struct.Struct('!QQQB')  # номер запроса, последний номер комнаты, сколько пропущено, последняя ли часть
+# Номер "после" для входа в комнату без истории
+NO_HISTORY = 2 ** 64 - 1
+# Ретранслятор отключает узел, который не успевает забирать данные
+MAX_NODE_BUFFER = 64 * 1024 * 1024
+# Сколько неподтверждённых публикаций узел хранит на время обрыва связи
+MAX_OUTSTANDING = 10000
+RECONNECT_DELAY = 0.5
+# Для скольких узлов ретранслятор помнит номера их сообщений (узел получает новый идентификатор при каждом запуске)
+MAX_KNOWN_NODES = 1024
+# Сколько историй комнат держать открытыми: с журналом на диске каждая занимает файловый дескриптор
+MAX_ROOM_HISTORIES = 512
+
+
+def encode_publish(room, msg_id, body):
+    room = room.encode('utf-8')
+    return encode_frame(PUBLISH, PUBLISH_HEADER.pack(msg_id, len(room)) + room + body, RELAY_MAX_PAYLOAD)
+
+
+def decode_publish(payload):
+    msg_id, room_len = PUBLISH_HEADER.unpack_from(payload)
+    start = PUBLISH_HEADER.size
+    return msg_id, payload[start:start + room_len], payload[start + room_len:]
+
+
+def encode_deliver(room, seq, msg_id, origin, frame):
+    """room и origin - уже закодированные bytes: ретранслятор их не декодирует."""
+    header = DELIVER_HEADER.pack(seq, msg_id, len(room), len(origin))
+    return encode_frame(DELIVER, header + room + origin + frame, RELAY_MAX_PAYLOAD)
+
+
+def decode_deliver(payload):
+    seq, msg_id, room_len, origin_len = DELIVER_HEADER.unpack_from(payload)
+    pos = DELIVER_HEADER.size
+    room = payload[pos:pos + room_len].decode('utf-8')
+    pos += room_len
+    origin = payload[pos:pos + origin_len].decode('utf-8')
+    return room, seq, msg_id, origin, payload[pos + origin_len:]
+
+
+def encode_replay(request_id, after, room):
+    return encode_frame(REPLAY, REPLAY_HEADER.pack(request_id, after) + room.encode('utf-8'), RELAY_MAX_PAYLOAD)
+
+
+def encode_replayed(request_id, last_seq, total, done, frames):
+    header = REPLAYED_HEADER.pack(request_id, last_seq, total, done)
+    return encode_frame(REPLAYED, header + b''.join(frames), RELAY_MAX_PAYLOAD)
+
+
+class Relay:
+    """Сервер-ретранслятор: подписки узлов на комнаты и нумерация сообщений комнат."""
+
+    def __init__(self, history_log=None):
+        # Новый идентификатор при каждом запуске: по нему узлы понимают, что нумерация началась заново
+        self.epoch = uuid.uuid4().hex
+        # Имя комнаты (bytes) -> множество writer'ов подписанных узлов
+        self.subscribers = {}
+        # Имя комнаты (bytes) -> RoomHistory от давно использованных к недавним; история хранится
+        # и для комнат без подписчиков, пока их не больше MAX_ROOM_HISTORIES
+        self.histories = OrderedDict()
+        self.history_log = history_log
+        # Без журнала закрытая история теряется, но номер последнего сообщения комнаты помним:
+        # нумерация продолжается, и узлы не примут новые сообщения за уже виденные
+        self.closed_seq = {}
+        # Идентификатор узла -> {номер сообщения узла: номер в комнате} для последних MAX_OUTSTANDING
+        # сообщений: больше узел повторно не отправит
+        self.published = OrderedDict()
+        self.duplicates = 0
+
+    async def handle_node(self, reader, writer):
+        rooms = set()
+        node_id = None
+        try:
+            frame_type, payload = await read_frame(reader, RELAY_FRAME_TYPES, RELAY_MAX_PAYLOAD)
+            if frame_type != NODE_HELLO:
+                raise ProtocolError("Первым кадром должен быть NODE_HELLO")
+            node_id = payload
+            writer.write(encode_frame(NODE_HELLO, self.epoch))
+            print(f"[RELAY] Подключён узел {node_id.decode('utf-8', errors='replace')}")
+
+            while True:
+                frame_type, payload = await read_frame(reader, RELAY_FRAME_TYPES, RELAY_MAX_PAYLOAD)
+                if frame_type == PUBLISH:
+                    self.publish(writer, node_id, payload)
+                elif frame_type == SUBSCRIBE:
+                    rooms.add(payload)
+                    self.subscribers.setdefault(payload, set()).add(writer)
+                elif frame_type == UNSUBSCRIBE:
+                    rooms.discard(payload)
+                    self._unsubscribe(payload, writer)
+                elif frame_type == REPLAY:
+                    self.replay(writer, payload)
+        except ProtocolError as e:
+            print(f"[RELAY] Узел нарушил протокол: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            for room in rooms:
+                self._unsubscribe(room, writer)
+            writer.transport.abort()
+            if node_id is not None:
+                print(f"[RELAY] Узел {node_id.decode('utf-8', errors='replace')} отключился")
+
+    def history(self, room):
+        history = self.histories.get(room)
+        if history is not None:
+            self.histories.move_to_end(room)
+            return history
+        history = self.histories[room] = RoomHistory(room.decode('utf-8', errors='replace'), self.history_log)
+        last_seq = self.closed_seq.pop(room, None)
+        if last_seq is not None:
+            history.buffer.last_seq = last_seq
+        self._close_idle_histories()
+        return history
+
+    def known_history(self, room):
+        """История комнаты, в которой уже были сообщения, или None; новую историю не создаёт."""
+        if room in self.histories or room in self.closed_seq:
+            return self.history(room)
+        if self.history_log is not None and self.history_log.has_room(room.decode('utf-8', errors='replace')):
+            return self.history(room)
+        return None
+
+    def _close_idle_histories(self):
+        """Закрывает давно не использованные истории комнат без подписчиков сверх MAX_ROOM_HISTORIES."""
+        excess = len(self.histories) - MAX_ROOM_HISTORIES
+        # Последнюю - только что открытую - историю не трогаем: ею сейчас воспользуются
+        for room in list(self.histories)[:-1]:
+            if excess <= 0:
+                break
+            if room in self.subscribers:
+                continue
+            history = self.histories.pop(room)
+            if self.history_log is not None:
+                self.history_log.close_room(room.decode('utf-8', errors='replace'))
+            else:
+                self.closed_seq[room] = history.last_seq
+            excess -= 1
+
+    def publish(self, publisher, node_id, payload):
+        msg_id, room, body = decode_publish(payload)
+        published = self._published_by(node_id)
+        seq = published.get(msg_id)
+        if seq is not None:
+            # Узел повторил сообщение после обрыва, не дождавшись DELIVER: подтверждаем прежним кадром
+            self.duplicates += 1
+            publisher.write(encode_deliver(room, seq, msg_id, node_id, encode_room_frame(seq, body)))
+            return
+
+        history = self.history(room)
+        seq = history.last_seq + 1
+        published[msg_id] = seq
+        if len(published) > MAX_OUTSTANDING:
+            published.popitem(last=False)
+        # Кадр ROOM кодируется один раз: он же хранится в истории и уходит всем узлам
+        frame = encode_room_frame(seq, body)
+        history.append(seq, frame)
+        data = encode_deliver(room, seq, msg_id, node_id, frame)
+        targets = set(self.subscribers.get(room, ()))
+        # Отправитель получает кадр всегда: это подтверждение, даже если он уже отписался от комнаты
+        targets.add(publisher)
+        for writer in targets:
+            if writer.transport.get_write_buffer_size() > MAX_NODE_BUFFER:
+                print("[RELAY] Узел не успевает читать, отключён")
+                writer.transport.abort()
+                continue
+            writer.write(data)
+
+    def _published_by(self, node_id):
+        published = self.published.get(node_id)
+        if published is None:
+            published = self.published[node_id] = OrderedDict()
+            if len(self.published) > MAX_KNOWN_NODES:
+                self.published.popitem(last=False)
+        else:
+            self.published.move_to_end(node_id)
+        return published
+
+    def replay(self, writer, payload):
+        """Отправляет узлу историю комнаты после запрошенного номера частями не длиннее кадра."""
+        request_id, after = REPLAY_HEADER.unpack_from(payload)
+        history = self.known_history(payload[REPLAY_HEADER.size:])
+        if history is None:
+            # В комнате ещё не было сообщений
+            writer.write(encode_replayed(request_id, 0, 0, True, []))
+            return
+        frames, total = history.since(after)
+        chunk, size = [], 0
+        for frame in frames:
+            if chunk and size + len(frame) > MAX_PAYLOAD:
+                writer.write(encode_replayed(request_id, history.last_seq, total, False, chunk))
+                chunk, size = [], 0
+            chunk.append(frame)
+            size += len(frame)
+        writer.write(encode_replayed(request_id, history.last_seq, total, True, chunk))
+
+    def _unsubscribe(self, room, writer):
+        subscribers = self.subscribers.get(room)
+        if subscribers is None:
+            return
+        subscribers.discard(writer)
+        if not subscribers:
+            del self.subscribers[room]
+
+
+async def serve_relay(host=HOST, port=RELAY_PORT, history_dir=None):
+    """Запускает ретранслятор; history_dir - каталог журнала истории комнат на диске."""
+    history_log = HistoryLog(history_dir) if history_dir is not None else None
+    relay = Relay(history_log)
+    server = await asyncio.start_server(relay.handle_node, host, port)
+    print(f"Ретранслятор запущен на {host}:{port} (PID {os.getpid()})")
+    flush_task = asyncio.ensure_future(flush_periodically(history_log)) if history_log is not None else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if history_log is not None:
+            flush_task.cancel()
+            history_log.close()
+
+
+class RelayLink:
+    """Подключение чат-сервера к ретранслятору.
+
+    publish() не ждёт сети: сообщение запоминается как неподтверждённое и
+    уходит в ретранслятор, как только есть связь. Пришедшие от ретранслятора
+    кадры передаются в hub.deliver(room, frame, exclude).
+    """
+
+    def __init__(self, hub, host=HOST, port=RELAY_PORT):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.node_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.writer = None
+        self.epoch = None
+        self._next_msg_id = 0
+        # Номер сообщения -> (комната, тело, клиент-отправитель); удаляется, когда кадр вернулся от ретранслятора
+        self.outstanding = OrderedDict()
+        # Узел-отправитель -> наибольший доставленный номер его сообщения
+        self.seen = {}
+        # Комната -> последний доставленный порядковый номер
+        self.room_seq = {}
+        self.duplicates = 0
+        self._next_request_id = 0
+        # Номер запроса истории -> (обработчик, полученные части)
+        self.replays = {}
+
+    def publish(self, room, body, exclude=None):
+        self._next_msg_id += 1
+        msg_id = self._next_msg_id
+        if len(self.outstanding) >= MAX_OUTSTANDING:
+            self.outstanding.popitem(last=False)
+            print("[КЛАСТЕР] Очередь публикаций переполнена, самое старое сообщение потеряно")
+        self.outstanding[msg_id] = (room, body, exclude)
+        if self.writer is not None:
+            self.writer.write(encode_publish(room, msg_id, body))
+
+    def subscribe(self, room):
+        if self.writer is not None:
+            self.writer.write(encode_frame(SUBSCRIBE, room))
+
+    def unsubscribe(self, room):
+        if self.writer is not None:
+            self.writer.write(encode_frame(UNSUBSCRIBE, room))
+
+    def replay(self, room, after, callback):
+        """Запрашивает историю комнаты после номера after.
+
+        Когда придёт вся история, вызывается callback(last_seq, total, data): номер
+        последнего сообщения комнаты, сколько сообщений пропущено и склеенные кадры
+        ROOM. Без связи с ретранслятором callback сразу вызывается с last_seq=None.
+        Узел должен быть подписан на комнату до запроса: тогда всё, что не вошло
+        в историю, придёт обычными кадрами DELIVER после неё.
+        """
+        if self.writer is None:
+            callback(None, 0, b'')
+            return
+        self._next_request_id += 1
+        self.replays[self._next_request_id] = (callback, [])
+        self.writer.write(encode_replay(self._next_request_id, after, room))
+
+    async def run(self):
+        """Держит связь с ретранслятором, переподключаясь после обрывов."""
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                print(f"[КЛАСТЕР] Ретранслятор {self.host}:{self.port} недоступен: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            try:
+                await self._session(reader, writer)
+            except ProtocolError as e:
+                print(f"[КЛАСТЕР] Ошибка протокола ретранслятора: {e}")
+            except (asyncio.IncompleteReadError, ConnectionError, OSError):
+                pass
+            finally:
+                self.writer = None
+                writer.transport.abort()
+                # Ответов на запросы истории уже не будет
+                replays, self.replays = self.replays, {}
+                for callback, _ in replays.values():
+                    callback(None, 0, b'')
+            print("[КЛАСТЕР] Связь с ретранслятором потеряна, переподключение...")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _session(self, reader, writer):
+        writer.write(encode_frame(NODE_HELLO, self.node_id))
+        frame_type, payload = await read_frame(reader, RELAY_FRAME_TYPES, RELAY_MAX_PAYLOAD)
+        if frame_type != NODE_HELLO:
+            raise ProtocolError("Ретранслятор не прислал NODE_HELLO")
+        epoch = payload.decode('ascii')
+        if epoch != self.epoch:
+            # Перезапущенный ретранслятор нумерует комнаты с начала
+            self.epoch = epoch
+            self.room_seq.clear()
+
+        # Восстанавливаем подписки и отправляем то, что не было подтверждено до обрыва
+        for room in self.hub.rooms:
+            writer.write(encode_frame(SUBSCRIBE, room))
+        for msg_id, (room, body, _) in self.outstanding.items():
+            writer.write(encode_publish(room, msg_id, body))
+        self.writer = writer
+        print(f"[КЛАСТЕР] Узел {self.node_id} подключён к ретранслятору {self.host}:{self.port}")
+
+        while True:
+            frame_type, payload = await read_frame(reader, RELAY_FRAME_TYPES, RELAY_MAX_PAYLOAD)
+            if frame_type == DELIVER:
+                self._on_deliver(*decode_deliver(payload))
+            elif frame_type == REPLAYED:
+                self._on_replayed(payload)
+
+    def _on_deliver(self, room, seq, msg_id, origin, frame):
+        exclude = None
+        if origin == self.node_id:
+            entry = self.outstanding.pop(msg_id, None)
+            if entry is not None:
+                exclude = entry[2]
+
+        # Сообщения одного узла приходят в порядке их номеров, поэтому достаточно наибольшего номера
+        if msg_id <= self.seen.get(origin, 0) or seq <= self.room_seq.get(room, 0):
+            self.duplicates += 1
+            return
+        self.seen[origin] = msg_id
+        self.room_seq[room] = seq
+        self.hub.deliver(room, frame, exclude)
+
+    def _on_replayed(self, payload):
+        request_id, last_seq, total, done = REPLAYED_HEADER.unpack_from(payload)
+        entry = self.replays.get(request_id)
+        if entry is None:
+            return
+        callback, parts = entry
+        parts.append(payload[REPLAYED_HEADER.size:])
+        if done:
+            del self.replays[request_id]
+            callback(last_seq, total, b''.join(parts))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ретранслятор сообщений для кластера чат-серверов")
+    parser.add_argument('--port', type=int, default=RELAY_PORT)
+    parser.add_argument('--history-dir', default=None, help="каталог журнала истории комнат на диске")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_relay(HOST, args.port, args.history_dir))
+    except KeyboardInterrupt:
+        print("\nРетранслятор остановлен.")
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Нагрузочный тест: сравнивает режимы threads и selectors сервера оценок
+HOST = '127.0.0.1'
+BASE_PORT = 18080
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Server.py')
+REQUEST = f"GET / HTTP/1.1\r\nHost: {HOST}\r\nConnection: close\r\n\r\n".encode('utf-8')
+KEEPALIVE_REQUEST = f"GET / HTTP/1.1\r\nHost: {HOST}\r\n\r\n".encode('utf-8')
+
+
+def read_rss_kb(pid):
+    """Возвращает резидентную память процесса в КБ (Linux, /proc)."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def wait_for_port(port, timeout=10.0):
+    """Ждёт, пока сервер начнёт принимать соединения."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Сервер на порту {port} не запустился")
+
+
+async def open_idle(port, count):
+    """Открывает count простаивающих соединений."""
+    writers = []
+    for _ in range(count):
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+        except OSError as e:
+            print(f"  не удалось открыть соединение #{len(writers)}: {e}")
+            break
+        writers.append(writer)
+    return writers
+
+
+async def request_worker(port, deadline, latencies, errors):
+    """Последовательно выполняет GET-запросы до наступления deadline."""
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(HOST, port)
+            writer.write(REQUEST)
+            await reader.read()  # сервер закрывает соединение после ответа
+            writer.close()
+        except OSError:
+            errors[0] += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def read_response(reader):
+    """Читает один ответ постоянного соединения, ориентируясь на Content-Length."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+    await reader.readexactly(length)
+    return head
+
+
+async def keepalive_worker(port, deadline, latencies, errors, pipeline):
+    """Выполняет запросы по одному постоянному соединению, отправляя их пачками по pipeline штук."""
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(HOST, port)
+            start = time.perf_counter()
+            writer.write(KEEPALIVE_REQUEST * pipeline)
+            for _ in range(pipeline):
+                head = await read_response(reader)
+                latencies.append(time.perf_counter() - start)
+                if b'Connection: close' in head:
+                    # Сервер исчерпал лимит запросов на соединение - остаток пачки отброшен, переподключаемся
+                    writer.close()
+                    writer = None
+                    break
+        except (OSError, asyncio.IncompleteReadError):
+            errors[0] += 1
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run_mode(mode, port, idle, concurrency, duration, keep_alive=False, pipeline=1, workers=1):
+    """Запускает сервер в заданном режиме и снимает метрики."""
+    command = [sys.executable, SERVER_SCRIPT, '--mode', mode, '--port', str(port)]
+    tmp_dir = tempfile.TemporaryDirectory()
+    if workers > 1:
+        # Рабочим процессам нужно общее хранилище
+        command += ['--workers', str(workers), '--storage', 'sqlite',
+                    '--data-file', os.path.join(tmp_dir.name, 'grades.sqlite3')]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, cwd=os.path.dirname(SERVER_SCRIPT))
+    try:
+        await wait_for_port(port)
+        # При pre-fork это память главного процесса, а не рабочих
+        rss_before = read_rss_kb(server.pid)
+
+        idle_writers = await open_idle(port, idle)
+        await asyncio.sleep(1.0)
+        rss_idle = read_rss_kb(server.pid)
+
+        latencies, errors = [], [0]
+        deadline = time.monotonic() + duration
+        if keep_alive:
+            clients = (keepalive_worker(port, deadline, latencies, errors, pipeline)
+                       for _ in range(concurrency))
+        else:
+            clients = (request_worker(port, deadline, latencies, errors)
+                       for _ in range(concurrency))
+        await asyncio.gather(*clients)
+
+        for writer in idle_writers:
+            writer.close()
+
+        return {
+            'mode': mode if workers == 1 else f"{mode} x{workers}",
+            'idle_connections': len(idle_writers),
+            'rss_start_kb': rss_before,
+            'rss_idle_kb': rss_idle,
+            'requests': len(latencies),
+            'errors': errors[0],
+            'rps': len(latencies) / duration,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+        tmp_dir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение режимов threads и selectors")
+    parser.add_argument('--idle', type=int, default=2000, help="число простаивающих соединений")
+    parser.add_argument('--concurrency', type=int, default=100, help="число активных клиентов")
+    parser.add_argument('--duration', type=float, default=5.0, help="длительность замера, с")
+    parser.add_argument('--keep-alive', action='store_true', help="переиспользовать соединения клиентов")
+    parser.add_argument('--pipeline', type=int, default=1, help="запросов в одной пачке (с --keep-alive)")
+    parser.add_argument('--workers', type=int, default=1, help="число процессов сервера (pre-fork)")
+    args = parser.parse_args()
+
+    for offset, mode in enumerate(('threads', 'selectors')):
+        result = asyncio.run(run_mode(mode, BASE_PORT + offset, args.idle, args.concurrency,
+                                      args.duration, args.keep_alive, args.pipeline, args.workers))
+        print(f"[{result['mode']}] простаивающих: {result['idle_connections']}, "
+              f"RSS: {result['rss_start_kb']} -> {result['rss_idle_kb']} КБ, "
+              f"запросов: {result['requests']} ({result['rps']:.0f} rps), ошибок: {result['errors']}, "
+              f"p50: {result['p50_ms']:.2f} мс, p99: {result['p99_ms']:.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,68 +1,107 @@
+import argparse
+import os
 import socket
+import sys
 import threading
+import time
 from urllib.parse import parse_qs
 
+import event_loop
+import storage as grades_storage
+
+# Общий потоковый парсер HTTP и pre-fork лежат в каталоге Lr1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prefork  # noqa: E402
+from http_parser import RequestParser  # noqa: E402
+
 
 HOST = '127.0.0.1'
 PORT = 8080
+# Очередь ожидающих соединений: при listen(5) пиковые подключения теряют SYN
+BACKLOG = socket.SOMAXCONN
+# Постоянные соединения: тайм-аут простоя (с) и максимум запросов на одно соединение
+KEEPALIVE_TIMEOUT = 5
+MAX_KEEPALIVE_REQUESTS = 100
+RECV_SIZE = 65536
 # Словарь для хранения данных: {'Дисциплина': 'Оценка'}
 grades_data = {}
+# Постоянное хранилище оценок (см. storage.py); по умолчанию данные только в памяти
+storage = grades_storage.MemoryStorage()
 
 # Блокировка для безопасной работы с общими данными (grades_data) в многопоточной среде
 data_lock = threading.Lock()
 
-
-
-def build_response(status_code, content_type, body):
-    """Формирует полный HTTP-ответ."""
+# Поколение данных: увеличивается при каждом изменении grades_data (под data_lock)
+grades_version = 0
+# Уже закодированные строки таблицы в порядке grades_data: {'Дисциплина': b'<tr>...</tr>'}
+row_cache = {}
+# Последняя отрисованная страница; читается без блокировок, заменяется целиком
+page_cache = None
+# Не даёт нескольким потокам одновременно перерисовывать одну и ту же версию страницы
+render_lock = threading.Lock()
+# Как часто рабочий процесс проверяет, не изменили ли оценки другие процессы (с)
+SHARED_SYNC_INTERVAL = 0.1
+last_shared_sync = 0.0
+# Метка запуска в ETag, чтобы после перезапуска сервера старые версии не совпали с новыми
+BOOT_ID = f"{int(time.time()):x}"
+
+
+def build_response(status_code, content_type, body, keep_alive=False, extra_headers=""):
+    """Формирует полный HTTP-ответ; тело можно передать строкой или уже закодированными байтами."""
     if status_code == 200:
         status_line = "HTTP/1.1 200 OK\r\n"
     elif status_code == 303:
         # 303 See Other для перенаправления после успешного POST
         status_line = "HTTP/1.1 303 See Other\r\n"
+    elif status_code == 304:
+        status_line = "HTTP/1.1 304 Not Modified\r\n"
+    elif status_code == 400:
+        status_line = "HTTP/1.1 400 Bad Request\r\n"
     else:
         status_line = "HTTP/1.1 404 Not Found\r\n"
 
-    headers = (
-            status_line +
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    headers = status_line
+    # Ответ 304 не содержит тела, поэтому и описывающих его заголовков
+    if status_code != 304:
+        headers += (
             f"Content-Type: {content_type}; charset=utf-8\r\n"
-            f"Content-Length: {len(body.encode('utf-8'))}\r\n"
-            "Connection: close\r\n"
-    )
+            f"Content-Length: {len(body)}\r\n"
+        )
+
+    if keep_alive:
+        headers += (
+            "Connection: keep-alive\r\n"
+            f"Keep-Alive: timeout={KEEPALIVE_TIMEOUT}, max={MAX_KEEPALIVE_REQUESTS}\r\n"
+        )
+    else:
+        headers += "Connection: close\r\n"
 
     # Добавляем заголовок для перенаправления после POST
     if status_code == 303:
         headers += "Location: /\r\n"
 
-    return (headers + "\r\n" + body).encode('utf-8')
-
+    return (headers + extra_headers + "\r\n").encode('utf-8') + body
 
-def get_html_page():
-    """Генерирует HTML-страницу для GET-запроса, включая форму и таблицу оценок."""
 
-    # Генерация таблицы с оценками
-    table_rows = ""
-    with data_lock:
-        if grades_data:
-            for discipline, grade in grades_data.items():
-                table_rows += f"<tr><td>{discipline}</td><td>{grade}</td></tr>"
-        else:
-            table_rows = '<tr><td colspan="2">Оценок пока нет.</td></tr>'
+BAD_REQUEST_RESPONSE = build_response(400, "text/html", "<h1>400 Bad Request</h1>")
 
-    html = f"""
+PAGE_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="ru">
 <head>
     <meta charset="UTF-8">
     <title>Система Учета Оценок (Socket)</title>
     <style>
-        body {{ font-family: sans-serif; margin: 40px; }}
-        table {{ border-collapse: collapse; width: 50%; margin-top: 20px; }}
-        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-        th {{ background-color: #f2f2f2; }}
-        form {{ margin-bottom: 30px; padding: 20px; border: 1px solid #ccc; }}
-        input[type="text"] {{ padding: 8px; margin-right: 10px; }}
-        input[type="submit"] {{ padding: 8px 15px; cursor: pointer; }}
+        body { font-family: sans-serif; margin: 40px; }
+        table { border-collapse: collapse; width: 50%; margin-top: 20px; }
+        th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+        th { background-color: #f2f2f2; }
+        form { margin-bottom: 30px; padding: 20px; border: 1px solid #ccc; }
+        input[type="text"] { padding: 8px; margin-right: 10px; }
+        input[type="submit"] { padding: 8px 15px; cursor: pointer; }
     </style>
 </head>
 <body>
@@ -94,66 +133,212 @@ def get_html_page():
 </body>
 </html>
 """
-    return html
+# Неизменные части страницы кодируются один раз при запуске
+PAGE_PREFIX, PAGE_SUFFIX = (part.encode('utf-8') for part in PAGE_TEMPLATE.split('{table_rows}'))
+EMPTY_TABLE_ROW = '<tr><td colspan="2">Оценок пока нет.</td></tr>'.encode('utf-8')
+
+
+class RenderedPage:
+    """Отрисованная версия страницы с готовыми HTTP-ответами."""
+    __slots__ = ('version', 'etag', 'responses', 'not_modified')
+
+    def __init__(self, version, body):
+        self.version = version
+        self.etag = f'"{BOOT_ID}-{version}"'
+        extra = f"ETag: {self.etag}\r\nCache-Control: no-cache\r\n"
+        # Ответы для keep_alive=False и keep_alive=True
+        self.responses = (
+            build_response(200, "text/html", body, False, extra),
+            build_response(200, "text/html", body, True, extra),
+        )
+        self.not_modified = (
+            build_response(304, "text/html", b"", False, extra),
+            build_response(304, "text/html", b"", True, extra),
+        )
+
+    def matches(self, if_none_match):
+        """Проверяет заголовок If-None-Match клиента на совпадение с текущим ETag."""
+        if if_none_match.strip() == '*':
+            return True
+        tags = (tag.strip() for tag in if_none_match.split(','))
+        return any(tag.removeprefix('W/') == self.etag for tag in tags)
+
+
+def render_row(discipline, grade):
+    """Кодирует одну строку таблицы оценок."""
+    return f"<tr><td>{discipline}</td><td>{grade}</td></tr>".encode('utf-8')
+
+
+def save_grade(discipline, grade):
+    """Сохраняет оценку и при изменении данных переводит страницу на новое поколение."""
+    global grades_version
+    with data_lock:
+        if grades_data.get(discipline) == grade:
+            # Копия в памяти могла устареть: общую базу мог изменить другой процесс,
+            # поэтому туда оценку записываем всё равно
+            if storage.shared:
+                storage.put(discipline, grade)
+            return
+        grades_data[discipline] = grade
+        row_cache[discipline] = render_row(discipline, grade)
+        grades_version += 1
+        # Запись в хранилище под той же блокировкой, чтобы порядок на диске совпадал с порядком в памяти
+        storage.put(discipline, grade)
 
 
-def handle_request(conn, addr):
-    """Обрабатывает входящий запрос от клиента."""
-    try:
-        # Принимаем данные
-        request_data = conn.recv(4096).decode('utf-8')
-        if not request_data:
-            return
+def load_grades(backend):
+    """Подключает хранилище и загружает из него сохранённые оценки."""
+    global storage, grades_version
+    saved = backend.load()
+    with data_lock:
+        storage = backend
+        grades_data.update(saved)
+        for discipline, grade in saved.items():
+            row_cache[discipline] = render_row(discipline, grade)
+        grades_version += 1
+    if saved:
+        print(f"Загружено оценок из хранилища: {len(saved)}")
+
+
+def sync_shared_storage():
+    """Подтягивает оценки, сохранённые другими рабочими процессами (не чаще SHARED_SYNC_INTERVAL)."""
+    global last_shared_sync, row_cache, grades_version
+    now = time.monotonic()
+    if now - last_shared_sync < SHARED_SYNC_INTERVAL:
+        return
+    last_shared_sync = now
+    if not storage.changed():
+        return
 
-        # Парсим первую строку запроса для определения метода и пути
-        first_line = request_data.split('\n')[0].strip()
-        method, path, _ = first_line.split()
+    # Снимок читается под той же блокировкой, что и запись в save_grade: иначе оценка, сохранённая
+    # этим процессом между чтением и заменой, пропала бы из памяти, а changed() её не заметит
+    with data_lock:
+        saved = storage.load()
+        rows = {discipline: render_row(discipline, grade) for discipline, grade in saved.items()}
+        grades_data.clear()
+        grades_data.update(saved)
+        row_cache = rows
+        grades_version += 1
 
-        print(f"[{addr[0]}:{addr[1]}] {method} {path}")
 
-        if method == 'GET':
-            # 1. Обработка GET запроса
-            if path == '/':
-                html_body = get_html_page()
-                response = build_response(200, "text/html", html_body)
-            else:
-                response = build_response(404, "text/html", "<h1>404 Not Found</h1>")
+def get_html_page():
+    """Возвращает отрисованную страницу текущего поколения данных.
 
-            conn.sendall(response)
+    Пока данные не менялись, запрос обходится без блокировок и без отрисовки.
+    После изменения страницу собирает один поток из уже закодированных строк таблицы.
+    """
+    global page_cache
+    if storage.shared:
+        sync_shared_storage()
 
-        elif method == 'POST':
-            # 2. Обработка POST запроса
-            if path == '/':
-                # Находим тело POST-запроса (после пустой строки)
-                body_start = request_data.find('\r\n\r\n') + 4
-                post_body = request_data[body_start:].strip()
+    page = page_cache
+    if page is not None and page.version == grades_version:
+        return page
 
-                # Парсим данные из тела запроса
-                params = parse_qs(post_body)
+    with render_lock:
+        page = page_cache
+        if page is not None and page.version == grades_version:
+            return page
 
-                discipline = params.get('discipline', [''])[0].strip()
-                grade = params.get('grade', [''])[0].strip()
+        # Под data_lock только снимаем согласованный снимок строк, собираем страницу уже без неё
+        with data_lock:
+            version = grades_version
+            rows = list(row_cache.values())
 
-                if discipline and grade:
-                    with data_lock:
-                        grades_data[discipline] = grade
-                    print(f"Сохранена новая оценка: {discipline} -> {grade}")
+        table_rows = b"".join(rows) if rows else EMPTY_TABLE_ROW
+        page = RenderedPage(version, PAGE_PREFIX + table_rows + PAGE_SUFFIX)
+        page_cache = page
+    return page
 
-                    # Отправляем 303 Redirect, чтобы избежать повторной отправки формы
-                    response = build_response(303, "text/html", "")
-                else:
-                    response = build_response(200, "text/html", "<h1>Ошибка: Неполные данные</h1>")
 
-                conn.sendall(response)
+def process_request(request, addr, keep_alive=False):
+    """Выполняет маршрутизацию разобранного запроса и возвращает готовый HTTP-ответ в байтах."""
+    method, path = request.method, request.path
 
-            else:
-                response = build_response(404, "text/html", "<h1>404 Not Found</h1>")
-                conn.sendall(response)
+    print(f"[{addr[0]}:{addr[1]}] {method} {path}")
 
-        else:
-            # Обработка неподдерживаемых методов
-            conn.sendall(build_response(405, "text/html", "<h1>405 Method Not Allowed</h1>"))
+    if method == 'GET':
+        # 1. Обработка GET запроса
+        if path == '/':
+            page = get_html_page()
+            if page.matches(request.headers.get('if-none-match', '')):
+                return page.not_modified[keep_alive]
+            return page.responses[keep_alive]
+        return build_response(404, "text/html", "<h1>404 Not Found</h1>", keep_alive)
+
+    if method == 'POST':
+        # 2. Обработка POST запроса
+        if path != '/':
+            return build_response(404, "text/html", "<h1>404 Not Found</h1>", keep_alive)
+
+        # Парсим данные из тела запроса (декодируем только тело, а не весь запрос)
+        params = parse_qs(request.body.decode('utf-8'))
+
+        discipline = params.get('discipline', [''])[0].strip()
+        grade = params.get('grade', [''])[0].strip()
+
+        if discipline and grade:
+            save_grade(discipline, grade)
+            print(f"Сохранена новая оценка: {discipline} -> {grade}")
+
+            # Отправляем 303 Redirect, чтобы избежать повторной отправки формы
+            return build_response(303, "text/html", "", keep_alive)
+        return build_response(200, "text/html", "<h1>Ошибка: Неполные данные</h1>", keep_alive)
+
+    # Обработка неподдерживаемых методов
+    return build_response(405, "text/html", "<h1>405 Method Not Allowed</h1>", keep_alive)
 
+
+def respond(request, addr, served):
+    """Обрабатывает один запрос соединения и решает, оставлять ли соединение открытым.
+
+    served - порядковый номер запроса в соединении. Возвращает пару (ответ, keep_alive).
+    """
+    try:
+        keep_alive = request.keep_alive and served < MAX_KEEPALIVE_REQUESTS
+        return process_request(request, addr, keep_alive), keep_alive
+    except Exception as e:
+        print(f"Ошибка при обработке запроса: {e}")
+        return BAD_REQUEST_RESPONSE, False
+
+
+def handle_request(conn, addr):
+    """Обслуживает соединение клиента в отдельном потоке (режим «поток на соединение»).
+
+    Соединение остаётся открытым между запросами; все запросы, пришедшие
+    одним пакетом (конвейер), обрабатываются по порядку и отвечаются одной отправкой.
+    """
+    parser = RequestParser()
+    served = 0
+    conn.settimeout(KEEPALIVE_TIMEOUT)
+    try:
+        while True:
+            data = conn.recv(RECV_SIZE)
+            if not data:
+                return
+
+            responses = []
+            keep_alive = True
+            for request in parser.feed(data):
+                served += 1
+                response, keep_alive = respond(request, addr, served)
+                responses.append(response)
+                if not keep_alive:
+                    break
+
+            if keep_alive and parser.error is not None:
+                print(f"Некорректный запрос от {addr}: {parser.error}")
+                responses.append(BAD_REQUEST_RESPONSE)
+                keep_alive = False
+
+            if responses:
+                conn.sendall(b''.join(responses))
+            if not keep_alive:
+                return
+
+    except socket.timeout:
+        # Клиент простаивал дольше KEEPALIVE_TIMEOUT
+        pass
     except Exception as e:
         print(f"Ошибка при обработке запроса: {e}")
     finally:
@@ -162,29 +347,27 @@ def handle_request(conn, addr):
 
 
 
-def start_server():
-    """Запуск многопоточного TCP-сервера."""
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+def serve(server_socket, mode='threads', storage_kind='memory', data_file=None):
+    """Обслуживает соединения на уже открытом слушающем сокете до KeyboardInterrupt."""
+    load_grades(grades_storage.open_storage(storage_kind, data_file))
 
-    try:
-        server_socket.bind((HOST, PORT))
-        server_socket.listen(5)
-    except Exception as e:
-        print(f"Не удалось запустить сервер: {e}")
-        return
-
-    print(f"Сервер запущен. Откройте в браузере: http://{HOST}:{PORT}/")
+    host, port = server_socket.getsockname()[:2]
+    print(f"Сервер запущен ({mode}, PID {os.getpid()}). Откройте в браузере: http://{host}:{port}/")
     print("Ожидание подключений...")
 
     try:
-        while True:
-            # Принимаем соединение
-            conn, addr = server_socket.accept()
+        if mode == 'selectors':
+            # Один поток и конечный автомат на каждое соединение
+            event_loop.serve_forever(server_socket, RequestParser, respond,
+                                     BAD_REQUEST_RESPONSE, KEEPALIVE_TIMEOUT)
+        else:
+            while True:
+                # Принимаем соединение
+                conn, addr = server_socket.accept()
 
-            # Запускаем обработку запроса в отдельном потоке
-            thread = threading.Thread(target=handle_request, args=(conn, addr))
-            thread.start()
+                # Запускаем обработку запроса в отдельном потоке
+                thread = threading.Thread(target=handle_request, args=(conn, addr))
+                thread.start()
 
     except KeyboardInterrupt:
         print("\nСервер остановлен пользователем.")
@@ -193,7 +376,45 @@ def start_server():
     finally:
         server_socket.close()
         print("Серверный сокет закрыт.")
+        # Потоки-обработчики могут ещё дописывать оценки - хранилище закрываем только после них
+        prefork.join_threads(prefork.GRACEFUL_TIMEOUT)
+        storage.close()
+
+
+def start_server(mode='threads', port=PORT, storage_kind='memory', data_file=None, workers=1):
+    """Запуск TCP-сервера в режиме «поток на соединение» или в событийном режиме на selectors.
+
+    При workers > 1 запускается pre-fork: несколько процессов слушают один порт.
+    """
+    if workers > 1:
+        if not grades_storage.STORAGE_BACKENDS[storage_kind].shared:
+            print("Для нескольких процессов нужно общее хранилище: используйте --storage sqlite.")
+            return
+        try:
+            prefork.run(lambda sock: serve(sock, mode, storage_kind, data_file), HOST, port, workers, BACKLOG)
+        except OSError as e:
+            print(f"Не удалось запустить сервер: {e}")
+        return
+
+    try:
+        server_socket = prefork.create_listener(HOST, port, BACKLOG)
+    except Exception as e:
+        print(f"Не удалось запустить сервер: {e}")
+        return
+    serve(server_socket, mode, storage_kind, data_file)
 
 
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="HTTP-сервер учёта оценок на сокетах")
+    parser.add_argument('--mode', choices=['threads', 'selectors'], default='threads',
+                        help="threads - поток на соединение, selectors - событийный цикл")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--storage', choices=sorted(grades_storage.STORAGE_BACKENDS), default='memory',
+                        help="memory - только в памяти, log - журнал на диске, sqlite - SQLite в режиме WAL")
+    parser.add_argument('--data-file', default=None,
+                        help="файл хранилища (по умолчанию grades.log или grades.sqlite3)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="число рабочих процессов (pre-fork с SO_REUSEPORT, нужно --storage sqlite)")
+    args = parser.parse_args()
+    data_file = args.data_file or {'log': 'grades.log', 'sqlite': 'grades.sqlite3'}.get(args.storage)
+    start_server(args.mode, args.port, args.storage, data_file, args.workers)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import storage
+
+# Замер скорости записи оценок в разные хранилища
+
+
+def run(name, make_storage, writes, threads, keys):
+    """Пишет writes оценок из threads потоков и возвращает скорость записи и время закрытия."""
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = make_storage(os.path.join(tmp, 'grades'))
+        per_thread = writes // threads
+
+        def writer(offset):
+            for i in range(per_thread):
+                backend.put(f"Дисциплина {(offset + i) % keys}", str(i % 5 + 1))
+
+        workers = [threading.Thread(target=writer, args=(n * per_thread,)) for n in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        close_start = time.perf_counter()
+        backend.close()
+        close_time = time.perf_counter() - close_start
+
+        # Проверяем, что после «перезапуска» данные на месте
+        reopened = make_storage(os.path.join(tmp, 'grades'))
+        restored = len(reopened.load())
+        reopened.close()
+
+    total = per_thread * threads
+    print(f"[{name}] {total} записей за {elapsed:.2f} с: {total / elapsed:.0f} записей/с, "
+          f"close: {close_time * 1000:.1f} мс, восстановлено ключей: {restored}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость записи в хранилища оценок")
+    parser.add_argument('--writes', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--keys', type=int, default=10000, help="число различных дисциплин")
+    parser.add_argument('--sync-writes', type=int, default=2000,
+                        help="число записей для журнала с fsync на каждую запись")
+    args = parser.parse_args()
+
+    run('log, групповой fsync', storage.LogStorage, args.writes, args.threads, args.keys)
+    run('sqlite WAL', storage.SqliteStorage, args.writes, args.threads, args.keys)
+    # Для сравнения: fsync после каждой записи (на диске это на порядки медленнее)
+    run('log, fsync на запись', lambda path: storage.LogStorage(path, fsync_interval=0),
+        args.sync_writes, args.threads, args.keys)
+
+
+if __name__ == '__main__':
+    main()
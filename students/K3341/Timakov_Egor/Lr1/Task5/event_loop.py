@@ -0,0 +1,164 @@
+import selectors
+import socket
+import time
+
+# Сколько байт читаем за один вызов recv
+RECV_SIZE = 65536
+# Через сколько секунд бездействия закрываем соединение
+IDLE_TIMEOUT = 5.0
+
+
+class Connection:
+    """Состояние одного клиентского соединения: конечный автомат «чтение <-> запись».
+
+    Благодаря __slots__ и пустому буферу парсера простаивающее соединение занимает
+    несколько сотен байт, а не целый поток со своим стеком.
+    """
+    __slots__ = ('sock', 'addr', 'state', 'parser', 'outbuf', 'served', 'keep_alive', 'last_active')
+
+    def __init__(self, sock, addr, parser):
+        self.sock = sock
+        self.addr = addr
+        self.state = 'reading'
+        self.parser = parser
+        self.outbuf = None
+        self.served = 0
+        self.keep_alive = True
+        self.last_active = time.monotonic()
+
+
+def serve_forever(server_socket, make_parser, handle_request, bad_request, idle_timeout=IDLE_TIMEOUT):
+    """Обслуживает все соединения в одном потоке с помощью selectors.
+
+    make_parser() создаёт потоковый парсер для нового соединения: его feed(data)
+    возвращает список готовых запросов, а атрибут error сообщает об ошибке разбора.
+    handle_request(request, addr, served)
+    возвращает пару (байты ответа, оставить ли соединение открытым). bad_request - ответ,
+    который отправляется перед закрытием соединения с некорректным запросом.
+    """
+    server_socket.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(server_socket, selectors.EVENT_READ, None)
+    connections = {}
+    last_sweep = time.monotonic()
+
+    try:
+        while True:
+            for key, mask in selector.select(timeout=1.0):
+                if key.data is None:
+                    _accept(selector, server_socket, connections, make_parser)
+                    continue
+
+                conn = key.data
+                if mask & selectors.EVENT_READ and conn.state == 'reading':
+                    _on_readable(selector, conn, connections, handle_request, bad_request)
+                elif mask & selectors.EVENT_WRITE and conn.state == 'writing':
+                    _on_writable(selector, conn, connections)
+
+            # Раз в секунду закрываем соединения, которые простаивают слишком долго
+            now = time.monotonic()
+            if now - last_sweep >= 1.0:
+                last_sweep = now
+                for conn in list(connections.values()):
+                    if now - conn.last_active > idle_timeout:
+                        _close(selector, conn, connections)
+    finally:
+        for conn in list(connections.values()):
+            _close(selector, conn, connections)
+        selector.close()
+
+
+def _accept(selector, server_socket, connections, make_parser):
+    """Принимает все ожидающие соединения из очереди listen за один проход."""
+    while True:
+        try:
+            sock, addr = server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            # Например, закончились файловые дескрипторы: не роняем весь цикл
+            print(f"Ошибка accept: {e}")
+            return
+
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = Connection(sock, addr, make_parser())
+        connections[sock.fileno()] = conn
+        selector.register(sock, selectors.EVENT_READ, conn)
+
+
+def _on_readable(selector, conn, connections, handle_request, bad_request):
+    """Дочитывает данные клиента и, когда запрос полон, формирует ответ."""
+    try:
+        data = conn.sock.recv(RECV_SIZE)
+    except (BlockingIOError, InterruptedError):
+        return
+    except OSError:
+        _close(selector, conn, connections)
+        return
+
+    if not data:
+        _close(selector, conn, connections)
+        return
+
+    conn.last_active = time.monotonic()
+
+    # Клиент может прислать несколько запросов подряд (конвейер): отвечаем на все одной записью
+    responses = []
+    for request in conn.parser.feed(data):
+        conn.served += 1
+        response, conn.keep_alive = handle_request(request, conn.addr, conn.served)
+        responses.append(response)
+        if not conn.keep_alive:
+            break
+
+    if conn.keep_alive and conn.parser.error is not None:
+        responses.append(bad_request)
+        conn.keep_alive = False
+    if not responses:
+        return
+
+    conn.outbuf = memoryview(b''.join(responses))
+    conn.state = 'writing'
+
+    # Пробуем отправить сразу: небольшой ответ обычно уходит без ожидания EVENT_WRITE
+    _on_writable(selector, conn, connections)
+    if conn.state == 'writing':
+        selector.modify(conn.sock, selectors.EVENT_WRITE, conn)
+
+
+def _on_writable(selector, conn, connections):
+    """Отправляет очередную часть ответа; после полной отправки ждёт следующий запрос или закрывает соединение."""
+    try:
+        sent = conn.sock.send(conn.outbuf)
+    except (BlockingIOError, InterruptedError):
+        return
+    except OSError:
+        _close(selector, conn, connections)
+        return
+
+    conn.last_active = time.monotonic()
+    conn.outbuf = conn.outbuf[sent:]
+    if conn.outbuf:
+        return
+
+    conn.outbuf = None
+    if not conn.keep_alive:
+        _close(selector, conn, connections)
+        return
+
+    conn.state = 'reading'
+    selector.modify(conn.sock, selectors.EVENT_READ, conn)
+
+
+def _close(selector, conn, connections):
+    """Снимает соединение с регистрации и закрывает сокет."""
+    if conn.state == 'closed':
+        return
+    conn.state = 'closed'
+    connections.pop(conn.sock.fileno(), None)
+    try:
+        selector.unregister(conn.sock)
+    except (KeyError, ValueError):
+        pass
+    conn.sock.close()
@@ -0,0 +1,224 @@
+"""Хранилища оценок для сервера Task5.
+
+Каждое хранилище умеет load() - вернуть все оценки в порядке добавления,
+put(discipline, grade) - сохранить оценку и close() - сбросить данные на диск.
+Хранилища с shared = True доступны нескольким процессам сразу, а их метод
+changed() сообщает, записал ли что-то другой процесс.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+# Как часто фоновый поток сбрасывает накопленные записи на диск (с)
+FSYNC_INTERVAL = 0.05
+# Сжатие журнала: не раньше стольких записей и когда записей в COMPACT_RATIO раз больше, чем ключей
+COMPACT_MIN_RECORDS = 10000
+COMPACT_RATIO = 2
+
+
+class MemoryStorage:
+    """Оценки живут только в памяти процесса (поведение по умолчанию)."""
+    shared = False
+
+    def __init__(self, path=None):
+        pass
+
+    def load(self):
+        return {}
+
+    def put(self, discipline, grade):
+        pass
+
+    def close(self):
+        pass
+
+
+class LogStorage:
+    """Журнал только на дозапись с групповым fsync и периодическим сжатием.
+
+    Каждая оценка - строка JSON в конце файла. put() лишь пишет в буфер файла,
+    а fsync выполняет фоновый поток раз в fsync_interval секунд, поэтому при
+    сбое теряются не более последних fsync_interval секунд записей. При
+    fsync_interval=0 каждая запись синхронно сбрасывается на диск.
+    """
+    shared = False
+
+    def __init__(self, path, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._data = {}
+        self._records = 0
+        self._replay()
+
+        self._file = open(path, 'ab')
+        self._dirty = False
+        # Строки, записанные во время сжатия: их нужно перенести в новый файл
+        self._compacting = None
+        self._stopped = threading.Event()
+        self._flusher = None
+        if fsync_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name='grades-log-flusher', daemon=True)
+            self._flusher.start()
+
+    def _replay(self):
+        """Восстанавливает состояние из журнала, отбрасывая недописанный при сбое хвост."""
+        if not os.path.exists(self.path):
+            return
+
+        good_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    discipline, grade = json.loads(line)
+                except ValueError:
+                    if line.endswith(b'\n'):
+                        # Повреждённая строка в середине журнала: пропускаем только её
+                        print(f"Пропущена повреждённая запись журнала {self.path}")
+                        good_size += len(line)
+                        continue
+                    break
+                self._data[discipline] = grade
+                self._records += 1
+                good_size += len(line)
+
+        if good_size < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_size)
+
+    def load(self):
+        with self._lock:
+            return dict(self._data)
+
+    def put(self, discipline, grade):
+        line = json.dumps([discipline, grade], ensure_ascii=False).encode('utf-8') + b'\n'
+        with self._lock:
+            self._file.write(line)
+            self._data[discipline] = grade
+            self._records += 1
+            if self._compacting is not None:
+                self._compacting.append(line)
+            if self._flusher is None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            else:
+                self._dirty = True
+
+    def flush(self):
+        """Сбрасывает накопленные записи на диск одним fsync."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._file.flush()
+            fd = self._file.fileno()
+            self._dirty = False
+        # fsync выполняется без блокировки: писатели тем временем продолжают дописывать журнал
+        os.fsync(fd)
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.fsync_interval):
+            self.flush()
+            if self._records >= COMPACT_MIN_RECORDS and self._records > COMPACT_RATIO * len(self._data):
+                self.compact()
+
+    def compact(self):
+        """Переписывает журнал так, чтобы в нём осталась одна запись на дисциплину."""
+        with self._lock:
+            snapshot = list(self._data.items())
+            self._compacting = []
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as tmp:
+            for discipline, grade in snapshot:
+                tmp.write(json.dumps([discipline, grade], ensure_ascii=False).encode('utf-8') + b'\n')
+
+            # Атомарно подменяем журнал, дописав строки, пришедшие во время сжатия
+            with self._lock:
+                tmp.writelines(self._compacting)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+                os.replace(tmp_path, self.path)
+                self._file.close()
+                self._file = open(self.path, 'ab')
+                self._records = len(snapshot) + len(self._compacting)
+                self._compacting = None
+                self._dirty = False
+
+        # Фиксируем переименование в каталоге
+        dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def close(self):
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self._file.close()
+
+
+class SqliteStorage:
+    """SQLite в режиме WAL: база доступна нескольким процессам одновременно.
+
+    С synchronous=NORMAL фиксация транзакции в WAL не требует fsync: на диск
+    журнал сбрасывается при контрольных точках, т.е. пачками.
+    """
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Ждём, а не падаем, если базу в этот момент пишет другой процесс
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS grades (discipline TEXT PRIMARY KEY, grade TEXT NOT NULL)"
+        )
+        self._data_version = self._read_data_version()
+
+    def _read_data_version(self):
+        # data_version меняется только после фиксаций из других соединений
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed(self):
+        """Проверяет, меняли ли базу другие процессы с момента прошлого вызова."""
+        with self._lock:
+            version = self._read_data_version()
+            if version == self._data_version:
+                return False
+            self._data_version = version
+            return True
+
+    def load(self):
+        with self._lock:
+            # rowid сохраняется при обновлении, поэтому порядок совпадает с порядком добавления
+            rows = self._conn.execute("SELECT discipline, grade FROM grades ORDER BY rowid").fetchall()
+        return dict(rows)
+
+    def put(self, discipline, grade):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO grades (discipline, grade) VALUES (?, ?) "
+                "ON CONFLICT(discipline) DO UPDATE SET grade = excluded.grade",
+                (discipline, grade),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+STORAGE_BACKENDS = {
+    'memory': MemoryStorage,
+    'log': LogStorage,
+    'sqlite': SqliteStorage,
+}
+
+
+def open_storage(kind, path):
+    """Создаёт хранилище заданного типа."""
+    return STORAGE_BACKENDS[kind](path)
@@ -0,0 +1,213 @@
+"""Потоковый разбор HTTP/1.x запросов для серверов на сокетах.
+
+Парсер принимает данные кусками в том виде, в каком их вернул recv,
+и отдаёт полностью прочитанные запросы. Заголовки разбираются прямо из
+bytes, тело запроса остаётся в bytes и не декодируется целиком.
+"""
+import string
+
+# Ограничения на размер заголовков и тела одного запроса
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 10 * 1024 * 1024
+HEX_DIGITS = string.hexdigits.encode('ascii')
+
+
+class ParseError(ValueError):
+    """Запрос нарушает формат HTTP или превышает допустимые размеры."""
+
+
+class HTTPRequest:
+    """Полностью прочитанный HTTP-запрос."""
+    __slots__ = ('method', 'path', 'version', 'headers', 'body')
+
+    def __init__(self, method, path, version, headers, body=b''):
+        self.method = method
+        self.path = path
+        self.version = version
+        # Имена заголовков приведены к нижнему регистру
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        """Хочет ли клиент сохранить соединение после ответа."""
+        connection = self.headers.get('connection', '').lower()
+        # В HTTP/1.1 соединение постоянное по умолчанию, в HTTP/1.0 - только по запросу клиента
+        if self.version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+    def __repr__(self):
+        return f"HTTPRequest({self.method} {self.path} {self.version}, body={len(self.body)} байт)"
+
+
+class RequestParser:
+    """Инкрементальный парсер запросов одного соединения.
+
+    Состояния: 'head' - ждём конец заголовков, 'body' - тело по Content-Length,
+    'chunk_size' / 'chunk_data' / 'chunk_trailer' - тело в chunked-кодировке.
+    После ошибки разбора в error сохраняется ParseError, и дальнейшие данные игнорируются.
+    """
+    __slots__ = ('_buffer', '_pos', '_scan', '_state', '_request', '_remaining', '_chunks', '_body_size',
+                 'error')
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # Позиция начала ещё не разобранных данных в буфере
+        self._pos = 0
+        # С какого места продолжать поиск конца заголовков, чтобы не сканировать их заново
+        self._scan = 0
+        self._state = 'head'
+        self._request = None
+        self._remaining = 0
+        self._chunks = None
+        self._body_size = 0
+        self.error = None
+
+    def feed(self, data):
+        """Добавляет очередную порцию данных (bytes или memoryview) и возвращает список готовых запросов.
+
+        Запросы, полностью прочитанные до ошибки, тоже возвращаются: сервер должен
+        ответить на них, а затем проверить error и закрыть соединение.
+        """
+        if self.error is not None:
+            return []
+        self._buffer += data
+        requests = []
+
+        try:
+            self._parse(requests)
+        except ParseError as e:
+            self.error = e
+            self._buffer = bytearray()
+            return requests
+
+        # Сдвигаем буфер один раз за вызов, а не после каждого запроса конвейера
+        if self._pos:
+            del self._buffer[:self._pos]
+            self._scan = max(0, self._scan - self._pos)
+            self._pos = 0
+        return requests
+
+    def _parse(self, requests):
+        while True:
+            if self._state == 'head':
+                if not self._parse_head():
+                    break
+            elif self._state == 'body':
+                if len(self._buffer) - self._pos < self._remaining:
+                    break
+                end = self._pos + self._remaining
+                self._request.body = bytes(self._buffer[self._pos:end])
+                self._pos = end
+                self._state = 'done'
+            elif self._state == 'chunk_size':
+                if not self._parse_chunk_size():
+                    break
+            elif self._state == 'chunk_data':
+                # Данные чанка и завершающий их CRLF
+                end = self._pos + self._remaining
+                if len(self._buffer) < end + 2:
+                    break
+                if self._buffer[end:end + 2] != b'\r\n':
+                    raise ParseError("Чанк не завершён CRLF")
+                self._chunks.append(bytes(self._buffer[self._pos:end]))
+                self._pos = end + 2
+                self._state = 'chunk_size'
+            elif self._state == 'chunk_trailer':
+                if not self._parse_trailer():
+                    break
+
+            if self._state == 'done':
+                requests.append(self._request)
+                self._request = None
+                self._state = 'head'
+
+    def _parse_head(self):
+        start = max(self._pos, self._scan)
+        end = self._buffer.find(b'\r\n\r\n', start)
+        if end == -1:
+            if len(self._buffer) - self._pos > MAX_HEADER_SIZE:
+                raise ParseError("Слишком большие заголовки")
+            # Конец заголовков может оказаться на стыке с ещё не пришедшими данными
+            self._scan = max(self._pos, len(self._buffer) - 3)
+            return False
+        if end - self._pos > MAX_HEADER_SIZE:
+            raise ParseError("Слишком большие заголовки")
+
+        lines = bytes(self._buffer[self._pos:end]).split(b'\r\n')
+        self._pos = end + 4
+        self._scan = self._pos
+
+        parts = lines[0].split()
+        if len(parts) != 3 or not parts[2].startswith(b'HTTP/'):
+            raise ParseError("Некорректная строка запроса")
+        method, path, version = (part.decode('latin-1') for part in parts)
+
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(b':')
+            if not sep or not name or name != name.strip():
+                raise ParseError("Некорректный заголовок")
+            headers[name.decode('latin-1').lower()] = value.strip().decode('latin-1')
+
+        self._request = HTTPRequest(method, path, version, headers)
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            # Transfer-Encoding имеет приоритет над Content-Length (RFC 9112, 6.3)
+            self._chunks = []
+            self._body_size = 0
+            self._state = 'chunk_size'
+            return True
+
+        length = headers.get('content-length', '0')
+        # isdigit() принимает и не-ASCII цифры вроде '¹', поэтому проверяем ещё isascii()
+        if not (length.isascii() and length.isdigit()):
+            raise ParseError("Некорректный Content-Length")
+        self._remaining = int(length)
+        if self._remaining > MAX_BODY_SIZE:
+            raise ParseError("Слишком большое тело запроса")
+        self._state = 'body' if self._remaining else 'done'
+        return True
+
+    def _parse_chunk_size(self):
+        end = self._buffer.find(b'\r\n', self._pos)
+        if end == -1:
+            if len(self._buffer) - self._pos > 1024:
+                raise ParseError("Некорректный размер чанка")
+            return False
+
+        # Расширения чанка после ';' игнорируем
+        size_line = bytes(self._buffer[self._pos:end]).split(b';', 1)[0].strip()
+        if not size_line or size_line.strip(HEX_DIGITS):
+            raise ParseError("Некорректный размер чанка")
+        size = int(size_line, 16)
+        self._pos = end + 2
+
+        if size == 0:
+            self._state = 'chunk_trailer'
+            return True
+        self._body_size += size
+        if self._body_size > MAX_BODY_SIZE:
+            raise ParseError("Слишком большое тело запроса")
+        self._remaining = size
+        self._state = 'chunk_data'
+        return True
+
+    def _parse_trailer(self):
+        # Необязательные trailer-заголовки заканчиваются пустой строкой
+        while True:
+            end = self._buffer.find(b'\r\n', self._pos)
+            if end == -1:
+                if len(self._buffer) - self._pos > MAX_HEADER_SIZE:
+                    raise ParseError("Слишком большие trailer-заголовки")
+                return False
+            line_empty = end == self._pos
+            self._pos = end + 2
+            if line_empty:
+                break
+
+        self._request.body = b''.join(self._chunks)
+        self._chunks = None
+        self._state = 'done'
+        return True
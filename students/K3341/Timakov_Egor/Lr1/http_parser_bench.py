@@ -0,0 +1,113 @@
+"""Фаззинг и замер пропускной способности потокового парсера http_parser.
+
+Запуск: python http_parser_bench.py --requests 1000000
+"""
+import argparse
+import random
+import time
+
+from http_parser import ParseError, RequestParser
+
+METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'HEAD']
+
+
+def make_request(rng):
+    """Генерирует случайный корректный запрос и ожидаемый результат разбора."""
+    method = rng.choice(METHODS)
+    path = '/' + '/'.join(str(rng.randint(0, 999)) for _ in range(rng.randint(0, 3)))
+    version = rng.choice(['HTTP/1.0', 'HTTP/1.1'])
+    headers = {'host': '127.0.0.1', f'x-test-{rng.randint(0, 99)}': 'значение'.encode('utf-8').decode('latin-1')}
+    body = bytes(rng.getrandbits(8) for _ in range(rng.choice([0, 0, 1, 17, 300, 5000])))
+
+    lines = [f"{method} {path} {version}".encode('latin-1')]
+    lines += [f"{name}: {value}".encode('latin-1') for name, value in headers.items()]
+    if body and rng.random() < 0.5:
+        headers['transfer-encoding'] = 'chunked'
+        lines.append(b'Transfer-Encoding: chunked')
+        encoded = bytearray()
+        pos = 0
+        while pos < len(body):
+            size = rng.randint(1, 1000)
+            chunk = body[pos:pos + size]
+            encoded += f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n"
+            pos += size
+        encoded += b"0\r\n\r\n"
+        raw_body = bytes(encoded)
+    else:
+        headers['content-length'] = str(len(body))
+        lines.append(f"Content-Length: {len(body)}".encode('ascii'))
+        raw_body = body
+
+    raw = b'\r\n'.join(lines) + b'\r\n\r\n' + raw_body
+    return raw, (method, path, version, headers, body)
+
+
+def split_randomly(data, rng):
+    """Режет поток на куски случайной длины, как это делает TCP."""
+    pos = 0
+    while pos < len(data):
+        size = rng.choice([1, 2, 3, 7, 64, 1460, 65536])
+        yield memoryview(data)[pos:pos + size]
+        pos += size
+
+
+def fuzz(iterations, seed):
+    """Проверяет, что разбиение потока на куски не влияет на результат, а мусор даёт только ParseError."""
+    rng = random.Random(seed)
+    for _ in range(iterations):
+        samples = [make_request(rng) for _ in range(rng.randint(1, 5))]
+        stream = b''.join(raw for raw, _ in samples)
+
+        parser = RequestParser()
+        parsed = []
+        for piece in split_randomly(stream, rng):
+            parsed.extend(parser.feed(piece))
+
+        assert parser.error is None, parser.error
+        assert len(parsed) == len(samples), (len(parsed), len(samples))
+        for request, (_, expected) in zip(parsed, samples):
+            assert (request.method, request.path, request.version, request.headers, request.body) == expected
+
+        # Порча случайных байт не должна приводить ни к чему, кроме ParseError
+        corrupted = bytearray(stream)
+        for _ in range(rng.randint(1, 10)):
+            corrupted[rng.randrange(len(corrupted))] = rng.getrandbits(8)
+        parser = RequestParser()
+        for piece in split_randomly(bytes(corrupted), rng):
+            parser.feed(piece)
+        assert parser.error is None or isinstance(parser.error, ParseError)
+
+
+def throughput(count, seed):
+    """Разбирает count запросов, переданных конвейером кусками по 64 КБ."""
+    rng = random.Random(seed)
+    templates = [make_request(rng)[0] for _ in range(100)]
+    stream = b''.join(templates[i % len(templates)] for i in range(count))
+    view = memoryview(stream)
+
+    parser = RequestParser()
+    parsed = 0
+    start = time.perf_counter()
+    for pos in range(0, len(stream), 65536):
+        parsed += len(parser.feed(view[pos:pos + 65536]))
+    elapsed = time.perf_counter() - start
+
+    assert parsed == count, (parsed, count)
+    print(f"Разобрано {parsed} запросов ({len(stream) / 2 ** 20:.1f} МБ) за {elapsed:.2f} с: "
+          f"{parsed / elapsed:.0f} запросов/с, {len(stream) / 2 ** 20 / elapsed:.1f} МБ/с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фаззинг и замер скорости http_parser")
+    parser.add_argument('--fuzz', type=int, default=2000, help="число итераций фаззинга")
+    parser.add_argument('--requests', type=int, default=1000000, help="число запросов для замера")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fuzz(args.fuzz, args.seed)
+    print(f"Фаззинг: {args.fuzz} итераций без ошибок")
+    throughput(args.requests, args.seed)
+
+
+if __name__ == '__main__':
+    main()
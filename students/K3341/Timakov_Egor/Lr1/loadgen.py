@@ -0,0 +1,419 @@
+"""Генератор нагрузки для серверов Lr1.
+
+Сценарии: udp (эхо task1), quadratic (JSON-сервис Task2), chat (чат Task4),
+http (HTTP-серверы Task3 и Task5). Нагрузку создают несколько процессов, в
+каждом - asyncio и свои соединения. Результат - одна строка JSON с
+пропускной способностью и перцентилями задержки; с --output она дописывается
+в файл, и прогоны можно сравнивать между собой.
+
+При --rate > 0 нагрузка открытая: запросы назначаются по расписанию,
+независимо от ответов, а задержка считается от назначенного времени отправки.
+Так медленный ответ не прячет очередь, которая за ним выстроилась
+(coordinated omission). При --rate 0 каждое соединение шлёт следующий запрос
+сразу после ответа на предыдущий.
+
+Пример: python loadgen.py http --port 8090 --concurrency 64 --rate 2000 --duration 10
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+# Протокол чата лежит в Task4
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Task4'))
+import protocol as chat_protocol  # noqa: E402
+
+HOST = '127.0.0.1'
+DEFAULT_PORTS = {'udp': 8080, 'quadratic': 8089, 'chat': 55555, 'http': 8090}
+# Сколько ждать ответа, прежде чем считать запрос ошибкой, с
+REQUEST_TIMEOUT = 5.0
+# Сколько двоичных разрядов точности в каждом диапазоне гистограммы: погрешность не больше 1/2^(SUB_BUCKET_BITS-1)
+SUB_BUCKET_BITS = 7
+PERCENTILES = (50, 90, 99, 99.9, 99.99)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек в духе HdrHistogram.
+
+    Значения хранятся в микросекундах. Диапазон [2^k, 2^(k+1)) делится на
+    одинаковое число линейных корзин, поэтому относительная погрешность
+    одинакова и для 50 мкс, и для 5 с, а память не зависит от числа замеров.
+    Счётчики - обычный dict, его можно передать между процессами и сложить.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = counts or {}
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1_000_000))
+        shift = max(0, value.bit_length() - SUB_BUCKET_BITS)
+        key = (shift << SUB_BUCKET_BITS) | (value >> shift)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    @staticmethod
+    def _value(key):
+        """Середина корзины в микросекундах."""
+        shift = key >> SUB_BUCKET_BITS
+        low = (key & ((1 << SUB_BUCKET_BITS) - 1)) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        """Перцентили, среднее и максимум в миллисекундах."""
+        total = self.total
+        if not total:
+            return {}
+        keys = sorted(self.counts)
+        result = {}
+        targets = iter(PERCENTILES)
+        target = next(targets)
+        seen = 0
+        for key in keys:
+            seen += self.counts[key]
+            while target is not None and seen >= total * target / 100:
+                result[f'p{target:g}'] = round(self._value(key) / 1000, 3)
+                target = next(targets, None)
+        result['mean'] = round(sum(self._value(key) * count for key, count in self.counts.items()) / total / 1000, 3)
+        result['max'] = round(self._value(keys[-1]) / 1000, 3)
+        return result
+
+
+# --- Сценарии: у каждого соединения есть request() и close() ---
+
+class UdpConnection(asyncio.DatagramProtocol):
+    """Эхо-сервер task1 отвечает одинаковой строкой, поэтому ответы сопоставляются с запросами по порядку."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.waiting = []
+        self.transport = None
+
+    @classmethod
+    async def open(cls, args, payload):
+        loop = asyncio.get_running_loop()
+        _, connection = await loop.create_datagram_endpoint(lambda: cls(payload), remote_addr=(args.host, args.port))
+        return connection
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        while self.waiting:
+            future = self.waiting.pop(0)
+            if not future.done():
+                future.set_result(data)
+                return
+
+    async def request(self):
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        self.transport.sendto(self.payload)
+        # Ответ на потерянный пакет не ждём: по таймауту run_connection открывает новый сокет
+        await future
+
+    def close(self):
+        self.transport.close()
+
+
+class QuadraticConnection:
+    """JSON-сервис Task2: постоянное соединение, запросы и ответы - строки NDJSON."""
+
+    def __init__(self, payload, reader, writer):
+        self.payload = payload + b'\n'
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, args, payload):
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        return cls(payload, reader, writer)
+
+    async def request(self):
+        self.writer.write(self.payload)
+        response = json.loads(await self.reader.readuntil(b'\n'))
+        if response.get("status") != "success":
+            raise ValueError(response.get("message"))
+
+    def close(self):
+        self.writer.close()
+
+
+class ChatConnection:
+    """Чат Task4: пара клиентов в своей комнате; задержка - от отправки до получения вторым клиентом."""
+    _numbers = itertools.count()
+
+    def __init__(self, sender, receiver, payload):
+        self.sender = sender
+        self.receiver = receiver
+        self.payload = payload
+        self.waiting = {}
+        self._ids = itertools.count()
+        self._reader_task = None
+
+    @classmethod
+    async def open(cls, args, payload):
+        room = f"load-{os.getpid()}-{next(cls._numbers)}"
+        pair = []
+        for role in ('sender', 'receiver'):
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+            writer.writelines([chat_protocol.encode_frame(chat_protocol.HELLO, f"{role}-{room}"),
+                               chat_protocol.encode_frame(chat_protocol.JOIN, room)])
+            pair.append((reader, writer))
+        connection = cls(pair[0], pair[1], payload.decode('ascii'))
+        connection._reader_task = asyncio.ensure_future(connection._read())
+        return connection
+
+    async def _read(self):
+        reader = self.receiver[0]
+        try:
+            while True:
+                frame_type, payload = await chat_protocol.read_frame(reader)
+                if frame_type == chat_protocol.ROOM:
+                    text = chat_protocol.decode_room(payload)[2]
+                elif frame_type == chat_protocol.TEXT:
+                    text = payload.decode('utf-8', errors='replace')
+                else:
+                    continue
+                # Текст сообщения: "[никнейм] #номер ..."
+                marker = text.partition('] #')[2].partition(' ')[0]
+                future = self.waiting.pop(marker, None)
+                if future is not None and not future.done():
+                    future.set_result(None)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, chat_protocol.ProtocolError) as e:
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"чат закрыл соединение: {e}"))
+
+    async def request(self):
+        marker = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[marker] = future
+        writer = self.sender[1]
+        writer.write(chat_protocol.encode_frame(chat_protocol.TEXT, f"#{marker} {self.payload}"))
+        try:
+            await future
+        finally:
+            self.waiting.pop(marker, None)
+
+    def close(self):
+        self._reader_task.cancel()
+        for _, writer in (self.sender, self.receiver):
+            writer.close()
+
+
+class HttpConnection:
+    """HTTP/1.1 с постоянным соединением; при payload > 0 отправляется POST с телом такого размера."""
+
+    def __init__(self, args, payload, reader, writer):
+        self.args = args
+        self.reader = reader
+        self.writer = writer
+        method = 'POST' if payload else args.method
+        head = (f"{method} {args.path} HTTP/1.1\r\nHost: {args.host}:{args.port}\r\n"
+                f"Content-Length: {len(payload)}\r\n")
+        if payload:
+            head += "Content-Type: application/x-www-form-urlencoded\r\n"
+        self.request_bytes = (head + "\r\n").encode('ascii') + payload
+
+    @classmethod
+    async def open(cls, args, payload):
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        return cls(args, payload, reader, writer)
+
+    async def request(self):
+        if self.writer.is_closing():
+            # Сервер закрыл постоянное соединение - открываем новое
+            self.reader, self.writer = await asyncio.open_connection(self.args.host, self.args.port)
+        self.writer.write(self.request_bytes)
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        status_line, _, headers = head.decode('latin-1').partition('\r\n')
+        length = 0
+        close = False
+        for line in headers.split('\r\n'):
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection' and value.strip().lower() == 'close':
+                close = True
+        if length:
+            await self.reader.readexactly(length)
+        if close:
+            self.writer.close()
+        if not status_line.split(' ')[1].startswith(('2', '3')):
+            raise ConnectionError(status_line)
+
+    def close(self):
+        self.writer.close()
+
+
+SCENARIOS = {'udp': UdpConnection, 'quadratic': QuadraticConnection, 'chat': ChatConnection, 'http': HttpConnection}
+
+
+def make_payload(scenario, size):
+    """Полезная нагрузка запроса примерно заданного размера в байтах."""
+    if scenario == 'quadratic':
+        body = {"a": 1, "b": -3, "c": 2}
+        if size:
+            body["pad"] = "x" * max(0, size - len(json.dumps(body)) - 10)
+        return json.dumps(body).encode('utf-8')
+    if scenario == 'http':
+        return b"message=" + b"x" * max(0, size - 8) if size else b''
+    return b"x" * max(1, size)
+
+
+# --- Один процесс нагрузки ---
+
+async def run_connection(connection, reopen, interval, start, deadline, histogram, stats):
+    """Отправляет запросы по расписанию (interval > 0) или подряд (interval == 0).
+
+    После ошибки соединение закрывается и открывается заново через reopen():
+    ответ на прерванный запрос может прийти позже и быть принят за ответ на
+    следующий. Возвращает соединение, открытое к концу замера, или None.
+    """
+    loop = asyncio.get_running_loop()
+    scheduled = start
+    while True:
+        if interval:
+            scheduled += interval
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            scheduled = loop.time()
+        if scheduled >= deadline:
+            return connection
+        try:
+            if connection is None:
+                connection = await asyncio.wait_for(reopen(), REQUEST_TIMEOUT)
+            await asyncio.wait_for(connection.request(), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                IndexError):
+            stats['errors'] += 1
+            if connection is not None:
+                connection.close()
+                connection = None
+            continue
+        # Задержка от назначенного времени: ожидание в очереди соединения тоже считается
+        histogram.record(loop.time() - scheduled)
+        stats['requests'] += 1
+
+
+async def run_process(args, concurrency, rate):
+    loop = asyncio.get_running_loop()
+    connection_class = SCENARIOS[args.scenario]
+    payload = make_payload(args.scenario, args.payload)
+    connections = []
+    stats = {'requests': 0, 'errors': 0, 'connect_errors': 0}
+    for _ in range(concurrency):
+        try:
+            connections.append(await connection_class.open(args, payload))
+        except OSError:
+            stats['connect_errors'] += 1
+    if args.scenario == 'chat':
+        # Даём серверу развести клиентов по комнатам
+        await asyncio.sleep(0.5)
+
+    histogram = LatencyHistogram()
+    interval = len(connections) / rate if rate else 0.0
+    start = loop.time()
+    deadline = start + args.duration
+    reopen = functools.partial(connection_class.open, args, payload)
+    # Соединения стартуют вразнобой, чтобы запросы не шли пачками
+    tasks = [run_connection(connection, reopen, interval, start + (interval * number / max(1, len(connections))),
+                            deadline, histogram, stats)
+             for number, connection in enumerate(connections)]
+    connections = await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+    for connection in connections:
+        if connection is not None:
+            connection.close()
+    return stats, histogram.counts, elapsed
+
+
+def process_main(args, concurrency, rate, results):
+    results.put(asyncio.run(run_process(args, concurrency, rate)))
+
+
+def run(args):
+    """Запускает args.processes процессов и сводит их результаты."""
+    processes = max(1, min(args.processes, args.concurrency))
+    results = multiprocessing.Queue()
+    workers = []
+    for number in range(processes):
+        # Соединения и темп делятся между процессами поровну
+        concurrency = args.concurrency // processes + (number < args.concurrency % processes)
+        rate = args.rate * concurrency / args.concurrency
+        workers.append(multiprocessing.Process(target=process_main, args=(args, concurrency, rate, results)))
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    histogram = LatencyHistogram()
+    totals = {'requests': 0, 'errors': 0, 'connect_errors': 0}
+    elapsed = 0.0
+    for stats, counts, process_elapsed in collected:
+        histogram.merge(LatencyHistogram(counts))
+        for key in totals:
+            totals[key] += stats[key]
+        elapsed = max(elapsed, process_elapsed)
+
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scenario': args.scenario,
+        'target': f"{args.host}:{args.port}",
+        'processes': processes,
+        'concurrency': args.concurrency,
+        'rate': args.rate,
+        'duration_s': args.duration,
+        'payload_bytes': args.payload,
+        **totals,
+        'throughput_rps': round(totals['requests'] / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': histogram.summary(),
+        'python': platform.python_version(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор нагрузки для серверов Lr1")
+    parser.add_argument('scenario', choices=sorted(SCENARIOS))
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=None, help="по умолчанию - порт сервера сценария")
+    parser.add_argument('--concurrency', type=int, default=16, help="число соединений")
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help="запросов в секунду суммарно (открытая нагрузка), 0 - как можно быстрее")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность, с")
+    parser.add_argument('--payload', type=int, default=0, help="размер полезной нагрузки запроса, байт")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="число процессов нагрузки")
+    parser.add_argument('--path', default='/', help="путь запроса (http)")
+    parser.add_argument('--method', default='GET', help="метод запроса без тела (http)")
+    parser.add_argument('--output', default=None, help="дописать результат строкой JSON в этот файл")
+    args = parser.parse_args()
+    if args.port is None:
+        args.port = DEFAULT_PORTS[args.scenario]
+
+    report = run(args)
+    line = json.dumps(report, ensure_ascii=False)
+    print(line)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Запуск сервера в нескольких процессах (pre-fork), разделяющих один порт.
+
+Если ОС поддерживает SO_REUSEPORT, каждый рабочий процесс открывает свой
+слушающий сокет на том же порту, и ядро само распределяет между ними
+соединения. Иначе сокет создаётся в главном процессе и наследуется потомками.
+Для UDP (sock_type=SOCK_DGRAM) ядро так же распределяет датаграммы между
+сокетами рабочих по адресу отправителя.
+
+Сигналы главного процесса: SIGINT/SIGTERM - плавная остановка всех рабочих,
+SIGHUP - поочерёдный перезапуск рабочих без остановки приёма соединений.
+"""
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+# Сколько ждать завершения рабочего процесса после SIGTERM, прежде чем послать SIGKILL
+GRACEFUL_TIMEOUT = 10.0
+# Рабочий, упавший быстрее этого срока после запуска, перезапускается с задержкой
+MIN_WORKER_LIFETIME = 1.0
+
+
+def create_listener(host, port, backlog=socket.SOMAXCONN, reuse_port=False, sock_type=socket.SOCK_STREAM):
+    """Создаёт слушающий TCP-сокет (или UDP-сокет для SOCK_DGRAM); с reuse_port несколько процессов
+    могут слушать один порт."""
+    server_socket = socket.socket(socket.AF_INET, sock_type)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        server_socket.bind((host, port))
+        if sock_type == socket.SOCK_STREAM:
+            server_socket.listen(backlog)
+    except OSError:
+        server_socket.close()
+        raise
+    return server_socket
+
+
+def run(worker_main, host, port, workers=None, backlog=socket.SOMAXCONN, sock_type=socket.SOCK_STREAM):
+    """Запускает workers процессов, каждый из которых вызывает worker_main(server_socket).
+
+    worker_main должен обслуживать соединения, пока не получит KeyboardInterrupt
+    (в рабочих процессах SIGTERM превращается в KeyboardInterrupt), и закрыть сокет.
+    """
+    workers = workers or os.cpu_count() or 1
+    reuse_port = hasattr(socket, 'SO_REUSEPORT')
+    # Без SO_REUSEPORT один сокет на всех, он наследуется при fork
+    shared_socket = None if reuse_port else create_listener(host, port, backlog, sock_type=sock_type)
+    if reuse_port:
+        # Проверяем порт заранее, чтобы не плодить падающих рабочих
+        create_listener(host, port, backlog, True, sock_type).close()
+
+    state = {'stopping': False, 'restart': False}
+
+    def on_stop(signum, frame):
+        state['stopping'] = True
+
+    def on_restart(signum, frame):
+        state['restart'] = True
+
+    def spawn():
+        # Иначе недописанный буфер stdout напечатается ещё и в потомке
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid:
+            return pid
+
+        # Рабочий процесс
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+            signal.signal(signal.SIGINT, _raise_keyboard_interrupt)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            server_socket = shared_socket or create_listener(host, port, backlog, True, sock_type)
+            worker_main(server_socket)
+        except KeyboardInterrupt:
+            pass
+        except BaseException as e:
+            print(f"[pre-fork] Рабочий процесс {os.getpid()} завершился с ошибкой: {e}")
+            exit_code = 1
+        finally:
+            # Даём потокам-обработчикам дослужить начатые соединения и не возвращаемся в код главного процесса
+            join_threads(GRACEFUL_TIMEOUT)
+            os._exit(exit_code)
+
+    signal.signal(signal.SIGINT, on_stop)
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGHUP, on_restart)
+
+    started = {}
+    for _ in range(workers):
+        started[spawn()] = time.monotonic()
+    mode = "SO_REUSEPORT" if reuse_port else "общий сокет"
+    print(f"[pre-fork] Запущено рабочих процессов: {workers} ({mode}), PID: {sorted(started)}")
+
+    try:
+        while not state['stopping']:
+            if state['restart']:
+                state['restart'] = False
+                _rolling_restart(started, spawn)
+
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.2)
+                continue
+            if pid not in started or state['stopping']:
+                started.pop(pid, None)
+                continue
+
+            lifetime = time.monotonic() - started.pop(pid)
+            print(f"[pre-fork] Рабочий {pid} неожиданно завершился (статус {status}), перезапуск")
+            if lifetime < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            started[spawn()] = time.monotonic()
+    finally:
+        print("[pre-fork] Остановка рабочих процессов...")
+        _stop_workers(list(started))
+        if shared_socket is not None:
+            shared_socket.close()
+        print("[pre-fork] Все рабочие процессы остановлены.")
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def join_threads(timeout):
+    """Ждёт завершения не-фоновых потоков рабочего процесса."""
+    deadline = time.monotonic() + timeout
+    for thread in threading.enumerate():
+        if thread is threading.current_thread() or thread.daemon:
+            continue
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def _rolling_restart(started, spawn):
+    """Заменяет рабочих по одному: новый процесс запускается раньше, чем останавливается старый."""
+    for old_pid in list(started):
+        started[spawn()] = time.monotonic()
+        del started[old_pid]
+        _stop_workers([old_pid])
+    print(f"[pre-fork] Рабочие перезапущены, PID: {sorted(started)}")
+
+
+def _stop_workers(pids):
+    """Посылает SIGTERM и ждёт завершения; зависшие процессы добиваются SIGKILL."""
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + GRACEFUL_TIMEOUT
+    remaining = set(pids)
+    while remaining and time.monotonic() < deadline:
+        for pid in list(remaining):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                remaining.discard(pid)
+        if remaining:
+            time.sleep(0.05)
+
+    for pid in remaining:
+        print(f"[pre-fork] Рабочий {pid} не завершился за {GRACEFUL_TIMEOUT} с, SIGKILL")
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
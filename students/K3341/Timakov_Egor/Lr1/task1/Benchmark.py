@@ -0,0 +1,129 @@
+import argparse
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# Замер пропускной способности UDP-сервера в пакетах в секунду
+HOST = '127.0.0.1'
+BASE_PORT = 18080
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Server.py')
+MESSAGE = "Hello Server".encode()
+RECV_SIZE = 1024
+# Сколько пакетов клиент держит "в полёте", не дожидаясь ответов
+WINDOW = 64
+# Если ответов нет дольше этого, считаем пакеты окна потерянными и отправляем окно заново
+RECV_TIMEOUT = 0.2
+# Как часто (в пакетах) сверяться с часами
+CLOCK_EVERY = 256
+
+
+def blast(port, duration, window, results):
+    """Процесс-клиент: держит window пакетов в полёте и считает полученные ответы."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # connect у UDP только запоминает адрес: send/recv без адреса дешевле sendto/recvfrom
+    sock.connect((HOST, port))
+    sock.settimeout(RECV_TIMEOUT)
+    buffer = bytearray(RECV_SIZE)
+    sent = received = timeouts = steps = 0
+
+    for _ in range(window):
+        sock.send(MESSAGE)
+    sent += window
+    deadline = time.monotonic() + duration
+    while True:
+        try:
+            sock.recv_into(buffer)
+            received += 1
+            sock.send(MESSAGE)
+            sent += 1
+        except socket.timeout:
+            # Всё окно потерялось: начинаем заново
+            timeouts += 1
+            for _ in range(window):
+                sock.send(MESSAGE)
+            sent += window
+        except ConnectionRefusedError:
+            time.sleep(RECV_TIMEOUT)
+        steps += 1
+        if steps % CLOCK_EVERY == 0 and time.monotonic() >= deadline:
+            break
+    sock.close()
+    results.put((sent, received, timeouts))
+
+
+def wait_for_server(port, timeout=10.0):
+    """Ждёт, пока сервер начнёт отвечать на датаграммы."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.2)
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            try:
+                sock.sendto(MESSAGE, (HOST, port))
+                sock.recvfrom(RECV_SIZE)
+                return
+            except OSError:
+                time.sleep(0.1)
+    finally:
+        sock.close()
+    raise RuntimeError(f"Сервер на порту {port} не запустился")
+
+
+def run_mode(mode, port, workers, clients, duration, window):
+    command = [sys.executable, SERVER_SCRIPT, '--mode', mode, '--port', str(port), '--workers', str(workers)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_server(port)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=blast, args=(port, duration, window, results))
+                     for _ in range(clients)]
+        start = time.monotonic()
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        elapsed = time.monotonic() - start
+        for process in processes:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    sent = sum(total[0] for total in totals)
+    received = sum(total[1] for total in totals)
+    return {
+        'mode': mode,
+        'workers': workers,
+        'sent': sent,
+        'received': received,
+        'pps': received / elapsed,
+        # Пакеты последнего окна ещё в полёте в момент остановки, их не считаем потерянными
+        'lost': max(0, sent - received - clients * window),
+        'timeouts': sum(total[2] for total in totals),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер пакетов в секунду для UDP-сервера task1")
+    parser.add_argument('--modes', nargs='+', default=['fast', 'asyncio'], choices=['simple', 'fast', 'asyncio'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1],
+                        help="число процессов сервера (SO_REUSEPORT), можно несколько значений")
+    parser.add_argument('--clients', type=int, default=4, help="число процессов-клиентов")
+    parser.add_argument('--duration', type=float, default=5.0, help="длительность замера, с")
+    parser.add_argument('--window', type=int, default=WINDOW, help="пакетов в полёте на одного клиента")
+    args = parser.parse_args()
+
+    offset = 0
+    for mode in args.modes:
+        for workers in dict.fromkeys(args.workers):
+            result = run_mode(mode, BASE_PORT + offset, workers, args.clients, args.duration, args.window)
+            offset += 1
+            print(f"[{result['mode']}, процессов: {result['workers']}] {result['pps']:.0f} пакетов/с, "
+                  f"отправлено: {result['sent']}, получено ответов: {result['received']}, "
+                  f"потеряно: {result['lost']}, таймаутов окна: {result['timeouts']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,109 @@
+import argparse
+import asyncio
+import os
 import socket
+import sys
+
+# Запуск в нескольких процессах (pre-fork) лежит в каталоге Lr1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prefork  # noqa: E402
 
 # Настройки сервера
 host = "127.0.0.1"
 port = 8080
 message = "Hello client"
+# Ответ не меняется, поэтому кодируем его один раз, а не на каждый пакет
+REPLY = message.encode()
+RECV_SIZE = 1024
+# Буфер приёма сокета: при всплеске трафика ядро держит датаграммы здесь, а не выбрасывает
+SOCKET_BUFFER = 4 * 1024 * 1024
+MODES = ('simple', 'fast', 'asyncio')
+
+
+def serve_simple(server_socket):
+    """Учебный режим: печатает каждое сообщение."""
+    while True:
+        data, address = server_socket.recvfrom(RECV_SIZE)
+        print(f" Message from {address} : {data.decode(errors='replace')}")
+
+        server_socket.sendto(REPLY, address)
+
+
+def serve_fast(server_socket):
+    """Режим высокой нагрузки: без печати и без выделения памяти на каждый пакет.
+
+    recvfrom_into пишет датаграмму в заранее выделенный буфер, ответ закодирован
+    заранее, а методы сокета вынесены в локальные переменные.
+    """
+    buffer = bytearray(RECV_SIZE)
+    receive = server_socket.recvfrom_into
+    send = server_socket.sendto
+    reply = REPLY
+    while True:
+        _, address = receive(buffer)
+        try:
+            send(reply, address)
+        except OSError:
+            # Буфер отправки переполнен (ENOBUFS): UDP не гарантирует доставку, ответ теряется
+            pass
+
+
+class EchoProtocol(asyncio.DatagramProtocol):
+    """Режим asyncio: цикл событий сам читает сокет, пока в нём есть датаграммы."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.transport.sendto(REPLY, address)
+
+
+async def serve_asyncio(server_socket):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(EchoProtocol, sock=server_socket)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+
 
-# Создание юдп сокета
-ServerSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-ServerSocket.bind((host, port))
+def serve(server_socket, mode='simple'):
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    print(f"Server has been started at {host}:{server_socket.getsockname()[1]} "
+          f"(mode: {mode}, PID {os.getpid()})")
+    try:
+        if mode == 'asyncio':
+            asyncio.run(serve_asyncio(server_socket))
+        elif mode == 'fast':
+            serve_fast(server_socket)
+        else:
+            serve_simple(server_socket)
+    finally:
+        server_socket.close()
 
-print(f"Server has been started at {host}:{port}")
 
-while True:
-    data, address = ServerSocket.recvfrom(1024)
-    print(f" Message from {address} : {data.decode()}")
+def start_server(server_port=port, mode='simple', workers=1):
+    """Запускает UDP-сервер; при workers > 1 - в нескольких процессах со своими сокетами (SO_REUSEPORT)."""
+    try:
+        if workers > 1:
+            prefork.run(lambda server_socket: serve(server_socket, mode), host, server_port, workers,
+                        sock_type=socket.SOCK_DGRAM)
+        else:
+            serve(prefork.create_listener(host, server_port, sock_type=socket.SOCK_DGRAM), mode)
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    except OSError as e:
+        print(f"Не удалось запустить сервер: {e}")
 
-    ServerSocket.sendto(message.encode(), address)
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UDP-сервер: отвечает на каждую датаграмму")
+    parser.add_argument('--port', type=int, default=port)
+    parser.add_argument('--mode', choices=MODES, default='simple',
+                        help="simple - печатать каждое сообщение, fast - recvfrom_into без печати, "
+                             "asyncio - DatagramProtocol")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="число процессов, каждый со своим сокетом на том же порту (SO_REUSEPORT)")
+    args = parser.parse_args()
+    start_server(args.port, args.mode, args.workers)
@@ -22,6 +22,10 @@ class Flight(models.Model):
         verbose_name = 'Рейс'
         verbose_name_plural = 'Рейсы'
         ordering = ['departure_time']
+        indexes = [
+            # Табло всегда сортируется по времени отлёта
+            models.Index(fields=['departure_time'], name='flight_departure_idx'),
+        ]
     
     def __str__(self):
         return f"{self.flight_number} - {self.airline} ({self.get_flight_type_display()})"
@@ -52,6 +56,11 @@ class Reservation(models.Model):
         verbose_name_plural = 'Резервирования'
         unique_together = [['flight', 'seat_number']]
         ordering = ['-created_at']
+        indexes = [
+            # "Мои резервирования" и подтверждённые места рейса
+            models.Index(fields=['user', '-created_at'], name='reservation_user_created_idx'),
+            models.Index(fields=['flight', 'status'], name='reservation_flight_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.flight.flight_number} - Место {self.seat_number}"
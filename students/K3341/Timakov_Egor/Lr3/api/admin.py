@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Employee, Author, Book, FinancialStatus, Report
+from .models import Employee, Author, Book, FinancialStatus, FinancialRollup, Report
 
 
 @admin.register(Employee)
@@ -31,6 +31,12 @@ class FinancialStatusAdmin(admin.ModelAdmin):
     search_fields = ['description']
 
 
+@admin.register(FinancialRollup)
+class FinancialRollupAdmin(admin.ModelAdmin):
+    list_display = ['period', 'date', 'transaction_type', 'category', 'total', 'records_count']
+    list_filter = ['period', 'transaction_type', 'category']
+
+
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
     list_display = ['title', 'report_type', 'created_by', 'created_at']
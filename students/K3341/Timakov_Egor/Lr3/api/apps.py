@@ -6,3 +6,7 @@ class ApiConfig(AppConfig):
     name = 'api'
     verbose_name = 'API для типографии'
 
+    
+    def ready(self):
+        # Сигналы, поддерживающие таблицу финансовых итогов и поисковые индексы
+        from . import rollups, search  # noqa: F401
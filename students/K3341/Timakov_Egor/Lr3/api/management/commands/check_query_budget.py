@@ -0,0 +1,97 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import Employee, Author, Book, FinancialStatus, Report
+
+
+# Сколько SQL-запросов может сделать каждый адрес API. Бюджет не зависит от числа
+# записей: если он превышен, значит, сериализатор снова ходит в базу за каждой строкой
+QUERY_BUDGET = {
+    'books-list': 3,
+    'books-detail': 2,
+    'authors-list': 2,
+    'authors-detail': 1,
+    'authors-books': 3,
+    'employees-list': 2,
+    'financial-list': 2,
+    'reports-list': 2,
+}
+
+BOOKS = 30
+AUTHORS_PER_BOOK = 3
+
+
+class Rollback(Exception):
+    """Откатывает тестовые данные после замера."""
+
+
+class Command(BaseCommand):
+    help = 'Проверяет, что адреса API укладываются в бюджет SQL-запросов (данные создаются и откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=BOOKS, help='сколько книг создать для замера')
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                paths = self.seed(options['books'])
+                client = APIClient()
+                client.force_authenticate(user=self.user)
+                for name, path in paths.items():
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.get(path)
+                    if response.status_code != 200:
+                        raise CommandError(f'{path}: ответ {response.status_code}')
+                    results.append((name, path, len(queries), QUERY_BUDGET[name]))
+                raise Rollback
+        except Rollback:
+            pass
+
+        failed = []
+        for name, path, count, budget in results:
+            mark = 'OK' if count <= budget else 'ПРЕВЫШЕН'
+            self.stdout.write(f'{name:16} {path:32} запросов: {count:3} (бюджет {budget}) {mark}')
+            if count > budget:
+                failed.append(name)
+        if failed:
+            raise CommandError(f'Бюджет запросов превышен: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('Все адреса укладываются в бюджет запросов'))
+
+    def seed(self, books_count):
+        """Создаёт книги с несколькими авторами и редакторами; возвращает адреса для замера."""
+        self.user = User.objects.create_user('query-budget', first_name='Бюджет', last_name='Запросов')
+        employee = Employee.objects.create(user=self.user, position='editor', phone='-', hire_date=date.today(),
+                                           salary=Decimal('1000'), department='Редакция')
+        editors = [employee]
+        for number in range(3):
+            user = User.objects.create_user(f'query-budget-editor-{number}', first_name='Редактор', last_name=str(number))
+            editors.append(Employee.objects.create(user=user, position='editor', phone='-', hire_date=date.today(),
+                                                   salary=Decimal('1000'), department='Редакция'))
+        authors = Author.objects.bulk_create(
+            Author(first_name='Автор', last_name=str(number)) for number in range(books_count)
+        )
+        for number in range(books_count):
+            book = Book.objects.create(title=f'Книга {number}', isbn=f'query-budget-{number}',
+                                       editor=editors[number % len(editors)], pages=100, print_run=1000,
+                                       price=Decimal('500'), cost=Decimal('200'), status='published')
+            book.authors.set(authors[number:number + AUTHORS_PER_BOOK] or authors[:AUTHORS_PER_BOOK])
+            FinancialStatus.objects.create(date=date.today(), transaction_type='income', category='book_sales',
+                                           amount=Decimal('1000'), book=book)
+            Report.objects.create(title=f'Отчёт {number}', report_type='books', created_by=employee)
+        return {
+            'books-list': '/api/books/',
+            'books-detail': f'/api/books/{book.pk}/',
+            'authors-list': '/api/authors/',
+            'authors-detail': f'/api/authors/{authors[0].pk}/',
+            'authors-books': f'/api/authors/{authors[0].pk}/books/',
+            'employees-list': '/api/employees/',
+            'financial-list': '/api/financial/',
+            'reports-list': '/api/reports/',
+        }
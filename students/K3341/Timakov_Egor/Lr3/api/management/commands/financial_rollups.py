@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import rollups
+
+
+# Сколько расхождений печатать при проверке
+SHOW_MISMATCHES = 20
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает (rebuild) или сверяет с журналом (verify) таблицу финансовых итогов. '
+            'rebuild нужен после изменений FinancialStatus мимо сигналов: queryset.update, bulk_create, SQL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['rebuild', 'verify'])
+
+    def handle(self, *args, **options):
+        if options['action'] == 'rebuild':
+            count = rollups.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Итоги пересчитаны, строк: {count}'))
+            return
+
+        mismatches = rollups.verify()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Итоги совпадают с журналом'))
+            return
+        for key, expected, actual in mismatches[:SHOW_MISMATCHES]:
+            self.stdout.write(f'{key}: ожидалось {expected}, в таблице {actual}')
+        raise CommandError(f'Расхождений: {len(mismatches)}. Исправить: manage.py financial_rollups rebuild')
@@ -0,0 +1,177 @@
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.models import Employee, Author, Book, FinancialStatus, Report
+
+
+BENCH_PREFIX = 'index-benchmark'
+BATCH_SIZE = 10000
+START_DATE = date(2015, 1, 1)
+DAYS = 3650
+MODELS = [Employee, Book, FinancialStatus, Report, Author]
+
+
+def query_shapes(employee_id):
+    """Запросы в том виде, в каком их строят фильтры api/views.py (одна страница - 20 строк)."""
+    period = {'date__gte': date(2020, 3, 1), 'date__lte': date(2020, 5, 31)}
+    return {
+        'financial: тип + категория + период': lambda: FinancialStatus.objects.filter(
+            transaction_type='income', category='book_sales', **period)[:20],
+        'financial: категория + период': lambda: FinancialStatus.objects.filter(category='rent', **period)[:20],
+        'financial: период': lambda: FinancialStatus.objects.filter(**period)[:20],
+        'financial: весь журнал': lambda: FinancialStatus.objects.all()[:20],
+        'books: статус, новые сверху': lambda: Book.objects.filter(status='printing')[:20],
+        'books: весь список': lambda: Book.objects.all()[:20],
+        'books: отчёт по продажам за период': lambda: Book.objects.filter(
+            status='published', publication_date__gte=date(2020, 1, 1), publication_date__lte=date(2020, 12, 31)
+        ).values('print_run'),
+        'reports: тип': lambda: Report.objects.filter(report_type='sales')[:20],
+        'reports: автор': lambda: Report.objects.filter(created_by_id=employee_id)[:20],
+        'employees: должность': lambda: Employee.objects.filter(position='designer')[:20],
+        'authors: список': lambda: Author.objects.all()[:20],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Замер запросов API без индексов из Meta.indexes и с ними: заполняет базу миллионами строк, '
+            'пишет планы EXPLAIN и задержки. Индексы в конце остаются созданными')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--financial', type=int, default=2000000, help='сколько финансовых записей создать')
+        parser.add_argument('--books', type=int, default=500000, help='сколько книг создать')
+        parser.add_argument('--reports', type=int, default=200000, help='сколько отчётов создать')
+        parser.add_argument('--employees', type=int, default=20000, help='сколько сотрудников создать')
+        parser.add_argument('--repeat', type=int, default=7, help='повторов каждого запроса')
+        parser.add_argument('--output', default=None, help='дописать результаты в файл JSONL')
+        parser.add_argument('--keep', action='store_true', help='не удалять созданные строки после замера')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        results = []
+        try:
+            employee_id = self.populate(rng, options)
+            for phase, create in (('без индексов', False), ('с индексами', True)):
+                self.set_indexes(create)
+                for name, build in query_shapes(employee_id).items():
+                    results.append(self.measure(phase, name, build, options['repeat']))
+        finally:
+            self.set_indexes(True)
+            if not options['keep']:
+                self.cleanup()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'a', encoding='utf-8') as f:
+                for result in results:
+                    f.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+    def populate(self, rng, options):
+        """Создаёт данные для замера пачками bulk_create; возвращает id одного из сотрудников."""
+        self.stdout.write('Заполнение базы...')
+        positions = [choice for choice, _ in Employee.POSITION_CHOICES]
+        users = User.objects.bulk_create(
+            (User(username=f'{BENCH_PREFIX}-{number}') for number in range(options['employees'])),
+            batch_size=BATCH_SIZE
+        )
+        if users[0].pk is None:
+            # Не все базы возвращают id из bulk_create
+            users = list(User.objects.filter(username__startswith=BENCH_PREFIX).order_by('pk'))
+        self.bulk(Employee, options['employees'], lambda number: Employee(
+            user=users[number], position=rng.choice(positions), phone='-',
+            hire_date=START_DATE + timedelta(days=rng.randrange(DAYS)), salary=Decimal(rng.randrange(30000, 200000)),
+            department=BENCH_PREFIX))
+        employee_ids = list(Employee.objects.filter(department=BENCH_PREFIX).values_list('pk', flat=True))
+
+        self.bulk(Author, options['books'] // 5, lambda number: Author(
+            first_name=f'Имя {rng.randrange(1000)}', last_name=f'Фамилия {rng.randrange(50000)}',
+            biography=BENCH_PREFIX))
+
+        statuses = [choice for choice, _ in Book.STATUS_CHOICES]
+        self.bulk(Book, options['books'], lambda number: Book(
+            title=f'Книга {number}', isbn=f'{BENCH_PREFIX}-{number}', pages=rng.randrange(50, 900),
+            print_run=rng.randrange(100, 50000), price=Decimal(rng.randrange(100, 5000)),
+            cost=Decimal(rng.randrange(50, 2000)), status=rng.choice(statuses), description=BENCH_PREFIX,
+            publication_date=START_DATE + timedelta(days=rng.randrange(DAYS))))
+
+        types = [choice for choice, _ in FinancialStatus.TRANSACTION_TYPE_CHOICES]
+        categories = [choice for choice, _ in FinancialStatus.CATEGORY_CHOICES]
+        # bulk_create обходит сигналы - таблица итогов этими строками не затрагивается
+        self.bulk(FinancialStatus, options['financial'], lambda number: FinancialStatus(
+            date=START_DATE + timedelta(days=rng.randrange(DAYS)), transaction_type=rng.choice(types),
+            category=rng.choice(categories), amount=Decimal(rng.randrange(100, 10 ** 7)) / 100,
+            description=BENCH_PREFIX))
+
+        report_types = [choice for choice, _ in Report.REPORT_TYPE_CHOICES]
+        self.bulk(Report, options['reports'], lambda number: Report(
+            title=BENCH_PREFIX, report_type=rng.choice(report_types), created_by_id=rng.choice(employee_ids)))
+        return employee_ids[0]
+
+    def bulk(self, model, count, make):
+        for start in range(0, count, BATCH_SIZE):
+            model.objects.bulk_create([make(number) for number in range(start, min(count, start + BATCH_SIZE))])
+        self.stdout.write(f'  {model.__name__}: {count}')
+
+    def set_indexes(self, create):
+        """Создаёт или удаляет индексы из Meta.indexes и обновляет статистику планировщика."""
+        with connection.cursor() as cursor:
+            for model in MODELS:
+                table = model._meta.db_table
+                existing = connection.introspection.get_constraints(cursor, table)
+                with connection.schema_editor() as editor:
+                    for index in model._meta.indexes:
+                        if create and index.name not in existing:
+                            editor.add_index(model, index)
+                        elif not create and index.name in existing:
+                            editor.remove_index(model, index)
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+    def measure(self, phase, name, build, repeat):
+        plan = build().explain()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(build())
+            timings.append(time.perf_counter() - start)
+        return {
+            'phase': phase,
+            'query': name,
+            'median_ms': round(statistics.median(timings) * 1000, 3),
+            'max_ms': round(max(timings) * 1000, 3),
+            'plan': plan,
+        }
+
+    def report(self, results):
+        before = {result['query']: result for result in results if result['phase'] == 'без индексов'}
+        for result in results:
+            if result['phase'] != 'с индексами':
+                continue
+            old = before[result['query']]
+            speedup = old['median_ms'] / result['median_ms'] if result['median_ms'] else float('inf')
+            self.stdout.write(f"{result['query']:40} {old['median_ms']:10.2f} мс -> {result['median_ms']:8.2f} мс "
+                              f"(x{speedup:.1f})")
+            self.stdout.write(f"    было:  {' | '.join(old['plan'].splitlines())}")
+            self.stdout.write(f"    стало: {' | '.join(result['plan'].splitlines())}")
+
+    def cleanup(self):
+        # Удаление через ORM собирало бы связанные объекты и слало сигналы на каждую из миллионов строк
+        self.stdout.write('Удаление данных замера...')
+        deletions = [
+            (FinancialStatus, 'description', '='), (Report, 'title', '='), (Book, 'description', '='),
+            (Author, 'biography', '='), (Employee, 'department', '='), (User, 'username', 'LIKE'),
+        ]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model, field, operator in deletions:
+                value = f'{BENCH_PREFIX}-%' if operator == 'LIKE' else BENCH_PREFIX
+                column = model._meta.get_field(field).column
+                cursor.execute(f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(column)} {operator} %s',
+                               [value])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api import search
+from api.models import Book
+
+
+class Command(BaseCommand):
+    help = ('Создаёт расширение pg_trgm и индексы поиска и пересчитывает tsvector всех книг. '
+            'Нужна после массовых изменений книг мимо сигналов (queryset.update, bulk_create, SQL)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not search.uses_postgres(using):
+            self.stdout.write('База не PostgreSQL: поиск работает на запасном индексе в памяти, делать нечего')
+            return
+        search.install_postgres_search(using)
+        count = search.refresh_book_vectors(Book.objects.using(using))
+        self.stdout.write(self.style.SUCCESS(f'Индексы поиска на месте, векторов пересчитано: {count}'))
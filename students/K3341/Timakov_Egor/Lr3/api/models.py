@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -26,11 +27,26 @@ class Employee(models.Model):
         verbose_name = 'Сотрудник'
         verbose_name_plural = 'Сотрудники'
         ordering = ['-hire_date']
+        indexes = [
+            models.Index(fields=['position', '-hire_date'], name='employee_position_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.get_position_display()}"
 
 
+class AuthorQuerySet(models.QuerySet):
+    """Запросы к авторам"""
+    
+    def with_books_count(self):
+        """Число книг считается в том же запросе, а не отдельным COUNT на каждого автора"""
+        queryset = self.annotate(books_count=models.Count('books', distinct=True))
+        # В запросах с GROUP BY Django не применяет Meta.ordering - задаём порядок явно
+        if not self.query.order_by:
+            queryset = queryset.order_by(*self.model._meta.ordering)
+        return queryset
+
+
 class Author(models.Model):
     """Модель автора книги"""
     
@@ -43,10 +59,15 @@ class Author(models.Model):
     biography = models.TextField(blank=True, null=True, verbose_name='Биография')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     
+    objects = AuthorQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Автор'
         verbose_name_plural = 'Авторы'
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='author_name_idx'),
+        ]
     
     def __str__(self):
         if self.middle_name:
@@ -61,6 +82,43 @@ class Author(models.Model):
         return f"{self.last_name} {self.first_name}"
 
 
+# Прибыль и выручка книги как выражения SQL: суммы по каталогу считает база, а не Python
+BOOK_PROFIT = models.ExpressionWrapper(
+    (models.F('price') - models.F('cost')) * models.F('print_run'),
+    output_field=models.DecimalField(max_digits=20, decimal_places=2)
+)
+BOOK_REVENUE = models.ExpressionWrapper(
+    models.F('price') * models.F('print_run'),
+    output_field=models.DecimalField(max_digits=20, decimal_places=2)
+)
+
+
+class BookQuerySet(models.QuerySet):
+    """Запросы к книгам"""
+    
+    def with_relations(self):
+        """Книги вместе с авторами и редактором: сериализаторы не делают запросов на каждую книгу.
+        
+        Редактор и его пользователь приходят JOIN-ом, авторы со счётчиком книг -
+        одним дополнительным запросом на всю страницу.
+        """
+        return self.select_related('editor__user').prefetch_related(
+            models.Prefetch('authors', queryset=Author.objects.with_books_count())
+        )
+    
+    def totals(self):
+        """Сводка по книгам одним агрегирующим запросом, без загрузки строк в память"""
+        totals = self.aggregate(
+            total_books=models.Count('id'),
+            total_sold=models.Sum('print_run'),
+            total_profit=models.Sum(BOOK_PROFIT),
+            total_revenue=models.Sum(BOOK_REVENUE),
+            average_price=models.Avg('price'),
+        )
+        # SUM и AVG по пустому набору дают NULL
+        return {name: value or 0 for name, value in totals.items()}
+
+
 class Book(models.Model):
     """Модель книги"""
     
@@ -88,11 +146,22 @@ class Book(models.Model):
     description = models.TextField(blank=True, null=True, verbose_name='Описание')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    # tsvector для полнотекстового поиска на PostgreSQL, поддерживается api/search.py
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name='Поисковый вектор')
+    
+    objects = BookQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Книга'
         verbose_name_plural = 'Книги'
         ordering = ['-created_at']
+        indexes = [
+            # Список книг: без фильтра и с фильтром по статусу, новые сверху
+            models.Index(fields=['-created_at'], name='book_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='book_status_created_idx'),
+            # Отчёты по книгам и продажам за период
+            models.Index(fields=['publication_date'], name='book_publication_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -135,6 +204,13 @@ class FinancialStatus(models.Model):
         verbose_name = 'Финансовая запись'
         verbose_name_plural = 'Финансовые записи'
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Журнал за период в порядке по умолчанию
+            models.Index(fields=['-date', '-created_at'], name='financial_date_idx'),
+            # Фильтры type и category (вместе или только category) с периодом
+            models.Index(fields=['transaction_type', 'category', '-date'], name='financial_type_category_idx'),
+            models.Index(fields=['category', '-date'], name='financial_category_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.amount} ({self.date})"
@@ -163,6 +239,43 @@ class Report(models.Model):
         verbose_name = 'Отчёт'
         verbose_name_plural = 'Отчёты'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['report_type', '-created_at'], name='report_type_idx'),
+            models.Index(fields=['created_by', '-created_at'], name='report_created_by_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} ({self.get_report_type_display()})"
+
+
+class FinancialRollup(models.Model):
+    """Суммы финансовых записей, заранее сгруппированные по дню или месяцу, типу и категории.
+    
+    Поддерживается сигналами при сохранении и удалении FinancialStatus (api/rollups.py);
+    после массовых изменений мимо ORM - команда financial_rollups rebuild.
+    """
+    
+    PERIOD_CHOICES = [
+        ('day', 'День'),
+        ('month', 'Месяц'),
+    ]
+    
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES, verbose_name='Период')
+    date = models.DateField(verbose_name='Дата (для месяца - первое число)')
+    transaction_type = models.CharField(max_length=10, choices=FinancialStatus.TRANSACTION_TYPE_CHOICES,
+                                        verbose_name='Тип операции')
+    category = models.CharField(max_length=50, choices=FinancialStatus.CATEGORY_CHOICES, verbose_name='Категория')
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name='Сумма')
+    records_count = models.PositiveIntegerField(default=0, verbose_name='Количество записей')
+    
+    class Meta:
+        verbose_name = 'Финансовый итог'
+        verbose_name_plural = 'Финансовые итоги'
+        ordering = ['period', '-date']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'date', 'transaction_type', 'category'],
+                                    name='unique_financial_rollup'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_period_display()} {self.date}: {self.get_transaction_type_display()} - {self.total}"
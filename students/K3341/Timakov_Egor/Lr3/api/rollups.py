@@ -0,0 +1,179 @@
+"""Итоги по финансовым записям: поддержание таблицы FinancialRollup и сводки по ней.
+
+Каждая запись FinancialStatus учитывается в двух строках итогов - за свой день
+и за свой месяц. Сводка за произвольный период берёт месячные итоги для
+полностью попавших в него месяцев и дневные - для неполных месяцев по краям,
+поэтому читает сотни строк, а не весь журнал.
+"""
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import FinancialStatus, FinancialRollup
+
+BATCH_SIZE = 1000
+
+
+def _record_key(record):
+    """(дата, тип, категория, сумма) записи; поля приводятся к типам модели,
+    даже если запись создана со строками вместо даты и суммы."""
+    field = FinancialStatus._meta.get_field
+    return (field('date').to_python(record.date), record.transaction_type, record.category,
+            field('amount').to_python(record.amount))
+
+
+def apply_record(record_date, transaction_type, category, amount, sign):
+    """Добавляет (sign=1) или вычитает (sign=-1) запись из дневного и месячного итога."""
+    with transaction.atomic():
+        for period, day in (('day', record_date), ('month', record_date.replace(day=1))):
+            rows = FinancialRollup.objects.filter(period=period, date=day, transaction_type=transaction_type,
+                                                  category=category)
+            changes = {'total': F('total') + sign * amount, 'records_count': F('records_count') + sign}
+            if rows.update(**changes) or sign < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    FinancialRollup.objects.create(period=period, date=day, transaction_type=transaction_type,
+                                                   category=category, total=amount, records_count=1)
+            except IntegrityError:
+                # Строку итога успел создать параллельный запрос - добавляем к ней
+                rows.update(**changes)
+        if sign < 0:
+            FinancialRollup.objects.filter(
+                Q(period='day', date=record_date) | Q(period='month', date=record_date.replace(day=1)),
+                transaction_type=transaction_type, category=category, records_count=0
+            ).delete()
+
+
+@receiver(pre_save, sender=FinancialStatus)
+def remember_previous(sender, instance, **kwargs):
+    """pre_save: запоминает, как запись выглядела в базе, чтобы post_save вычел старые значения."""
+    instance._rollup_previous = None
+    if instance.pk is not None:
+        previous = FinancialStatus.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._rollup_previous = _record_key(previous)
+
+
+@receiver(post_save, sender=FinancialStatus)
+def record_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    current = _record_key(instance)
+    if previous == current:
+        return
+    if previous is not None:
+        apply_record(*previous, sign=-1)
+    apply_record(*current, sign=1)
+
+
+@receiver(post_delete, sender=FinancialStatus)
+def record_deleted(sender, instance, **kwargs):
+    apply_record(*_record_key(instance), sign=-1)
+
+
+def _month_after(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def rollup_filter(start_date=None, end_date=None):
+    """Условие на строки итогов, в сумме покрывающие период [start_date, end_date] ровно один раз."""
+    # Полные месяцы: с первого месяца, начинающегося не раньше start_date,
+    # до месяца, который заканчивается не позже end_date
+    first_month = None
+    if start_date:
+        first_month = start_date if start_date.day == 1 else _month_after(start_date)
+    after_last_month = None
+    if end_date:
+        next_day = end_date + timedelta(days=1)
+        after_last_month = next_day if next_day.day == 1 else end_date.replace(day=1)
+
+    if first_month and after_last_month and first_month >= after_last_month:
+        # Период внутри одного месяца - только дневные итоги
+        return Q(period='day', date__gte=start_date, date__lte=end_date)
+
+    months = Q(period='month')
+    edges = []
+    if first_month:
+        months &= Q(date__gte=first_month)
+        edges.append(Q(period='day', date__gte=start_date, date__lt=first_month))
+    if after_last_month:
+        months &= Q(date__lt=after_last_month)
+        edges.append(Q(period='day', date__gte=after_last_month, date__lte=end_date))
+    condition = months
+    for days in edges:
+        condition |= days
+    return condition
+
+
+def summarize(start_date=None, end_date=None):
+    """Сводка за период одним запросом к итогам: доходы, расходы, число записей и суммы по категориям."""
+    rows = list(
+        FinancialRollup.objects.filter(rollup_filter(start_date, end_date))
+        .values('category', 'transaction_type')
+        .annotate(total=Sum('total'), records_count=Sum('records_count'))
+        .order_by('transaction_type', 'category')
+    )
+    total_income = sum((row['total'] for row in rows if row['transaction_type'] == 'income'), 0)
+    total_expense = sum((row['total'] for row in rows if row['transaction_type'] == 'expense'), 0)
+    return {
+        'total_income': total_income,
+        'total_expense': total_expense,
+        'records_count': sum(row['records_count'] for row in rows),
+        'by_category': [{'category': row['category'], 'transaction_type': row['transaction_type'],
+                         'total': row['total']} for row in rows],
+    }
+
+
+def expected_rollups():
+    """Итоги, посчитанные заново по журналу FinancialStatus: {(период, дата, тип, категория): (сумма, число)}."""
+    expected = {}
+    grouped = [
+        ('day', FinancialStatus.objects.values('date', 'transaction_type', 'category')),
+        ('month', FinancialStatus.objects.annotate(month=TruncMonth('date'))
+         .values('month', 'transaction_type', 'category')),
+    ]
+    for period, rows in grouped:
+        for row in rows.annotate(total=Sum('amount'), records_count=Count('id')).order_by():
+            day = row['date'] if period == 'day' else row['month']
+            expected[(period, day, row['transaction_type'], row['category'])] = (row['total'], row['records_count'])
+    return expected
+
+
+def rebuild():
+    """Пересчитывает таблицу итогов с нуля; возвращает число строк итогов."""
+    with transaction.atomic():
+        expected = expected_rollups()
+        FinancialRollup.objects.all().delete()
+        FinancialRollup.objects.bulk_create(
+            (FinancialRollup(period=period, date=day, transaction_type=transaction_type, category=category,
+                             total=total, records_count=records_count)
+             for (period, day, transaction_type, category), (total, records_count) in expected.items()),
+            batch_size=BATCH_SIZE
+        )
+    return len(expected)
+
+
+def verify():
+    """Сравнивает таблицу итогов с журналом; возвращает список расхождений (ключ, ожидалось, в таблице)."""
+    expected = expected_rollups()
+    actual = {
+        (row['period'], row['date'], row['transaction_type'], row['category']): (row['total'], row['records_count'])
+        for row in FinancialRollup.objects.values('period', 'date', 'transaction_type', 'category',
+                                                  'total', 'records_count')
+    }
+    return [(key, expected.get(key), actual.get(key))
+            for key in sorted(expected.keys() | actual.keys(), key=str)
+            if expected.get(key) != actual.get(key)]
+
+
+def parse_date(value):
+    """Дата из параметра запроса в формате ГГГГ-ММ-ДД; пустое значение - без ограничения."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
@@ -0,0 +1,235 @@
+"""Полнотекстовый поиск книг и нечёткий поиск авторов.
+
+На PostgreSQL у книги хранится tsvector (Book.search_vector): название и ISBN
+с весом A, описание с весом B. Его пересчитывает сигнал после сохранения книги,
+а поиск идёт по GIN-индексу и сортируется по SearchRank. Имена авторов ищутся
+по триграммам (pg_trgm) с GIN-индексами gin_trgm_ops. Расширение и индексы
+создаются после migrate; команда search_index пересчитывает векторы всех книг.
+
+На других базах (SQLite в тестовых запусках) работает запасной вариант на
+Python: инвертированный индекс слов книг в памяти процесса и та же, что в
+pg_trgm, мера триграммного сходства для имён авторов.
+"""
+import re
+import sys
+from bisect import bisect_left
+
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import DatabaseError, connections
+from django.db.models import Case, CharField, F, IntegerField, Q, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .models import Author, Book
+
+# Без приложения django.contrib.postgres (ему нужен psycopg) оператор % регистрируем сами
+CharField.register_lookup(TrigramSimilar)
+
+SEARCH_CONFIG = 'russian'
+BOOK_VECTOR = (
+    SearchVector('title', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('isbn', weight='A', config='simple')
+    + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+)
+# Порог сходства оператора % в pg_trgm по умолчанию
+TRIGRAM_THRESHOLD = 0.3
+# Короче этого триграммы почти ничего не находят - ищем по началу имени
+TRIGRAM_MIN_LENGTH = 3
+AUTHOR_NAME_FIELDS = ['last_name', 'first_name', 'middle_name']
+# Веса слов в запасном индексе, как веса A и B у SearchRank
+WEIGHT_A = 1.0
+WEIGHT_B = 0.4
+# Больше результатов запасной поиск не возвращает: их id уходят в запрос списком
+MAX_FALLBACK_RESULTS = 1000
+
+WORD = re.compile(r'\w+')
+
+
+def uses_postgres(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def tokenize(text):
+    return WORD.findall(text.lower()) if text else []
+
+
+def install_postgres_search(using='default'):
+    """Расширение pg_trgm, GIN-индекс по вектору книг и триграммные индексы имён авторов."""
+    quote = connections[using].ops.quote_name
+    book_table, author_table = quote(Book._meta.db_table), quote(Author._meta.db_table)
+    statements = ['CREATE EXTENSION IF NOT EXISTS pg_trgm',
+                  f'CREATE INDEX IF NOT EXISTS book_search_vector_idx ON {book_table} USING gin (search_vector)']
+    statements += [f'CREATE INDEX IF NOT EXISTS author_{field}_trgm_idx ON {author_table} '
+                   f'USING gin ({quote(field)} gin_trgm_ops)' for field in AUTHOR_NAME_FIELDS]
+    with connections[using].cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def refresh_book_vectors(queryset=None):
+    """Пересчитывает tsvector одним UPDATE; возвращает число книг."""
+    if queryset is None:
+        queryset = Book.objects.all()
+    return queryset.update(search_vector=BOOK_VECTOR)
+
+
+class BookIndex:
+    """Инвертированный индекс слов книг в памяти процесса - запасной поиск без PostgreSQL.
+
+    Строится при первом поиске и дальше поддерживается сигналами сохранения и удаления.
+    """
+
+    def __init__(self):
+        self.postings = {}   # слово -> {id книги: вес}
+        self.documents = {}  # id книги -> {слово: вес}
+        self.sorted_words = None
+        self.loaded = False
+
+    def load(self):
+        for book in Book.objects.values('pk', 'title', 'isbn', 'description').iterator():
+            self._add(book['pk'], book['title'], book['isbn'], book['description'])
+        self.loaded = True
+
+    def _add(self, pk, title, isbn, description):
+        weights = {}
+        for text, weight in ((title, WEIGHT_A), (isbn, WEIGHT_A), (description, WEIGHT_B)):
+            for word in tokenize(text):
+                weights[word] = max(weights.get(word, 0), weight)
+        self.documents[pk] = weights
+        for word, weight in weights.items():
+            self.postings.setdefault(word, {})[pk] = weight
+        self.sorted_words = None
+
+    def update(self, book):
+        if self.loaded:
+            self.remove(book.pk)
+            self._add(book.pk, book.title, book.isbn, book.description)
+
+    def remove(self, pk):
+        for word in self.documents.pop(pk, {}):
+            books = self.postings[word]
+            books.pop(pk, None)
+            if not books:
+                del self.postings[word]
+        self.sorted_words = None
+
+    def _words_with_prefix(self, prefix):
+        if self.sorted_words is None:
+            self.sorted_words = sorted(self.postings)
+        position = bisect_left(self.sorted_words, prefix)
+        while position < len(self.sorted_words) and self.sorted_words[position].startswith(prefix):
+            yield self.sorted_words[position]
+            position += 1
+
+    def search(self, query):
+        """Книги, в которых есть все слова запроса (как начало слова), - [(id, вес)] по убыванию веса."""
+        if not self.loaded:
+            self.load()
+        scores = None
+        for term in tokenize(query):
+            matched = {}
+            for word in self._words_with_prefix(term):
+                for pk, weight in self.postings[word].items():
+                    matched[pk] = max(matched.get(pk, 0), weight)
+            if scores is None:
+                scores = matched
+            else:
+                scores = {pk: scores[pk] + weight for pk, weight in matched.items() if pk in scores}
+        ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[:MAX_FALLBACK_RESULTS]
+
+
+book_index = BookIndex()
+
+
+def trigrams(text):
+    """Триграммы строки так же, как их строит pg_trgm: по словам, с двумя пробелами в начале и одним в конце."""
+    result = set()
+    for word in tokenize(text):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(first, second):
+    """Сходство строк по триграммам, как similarity() в pg_trgm."""
+    first, second = trigrams(first), trigrams(second)
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def _ordered_by(queryset, ranked):
+    """Строки queryset с id из ranked в порядке ranked."""
+    if not ranked:
+        return queryset.none()
+    order = Case(*[When(pk=pk, then=position) for position, (pk, _) in enumerate(ranked)],
+                 output_field=IntegerField())
+    return queryset.filter(pk__in=[pk for pk, _ in ranked]).order_by(order)
+
+
+def search_books(queryset, query):
+    """Книги по запросу: сначала наиболее подходящие."""
+    if uses_postgres(queryset.db):
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return (queryset.filter(Q(search_vector=search_query) | Q(isbn=query))
+                .annotate(rank=SearchRank(F('search_vector'), search_query))
+                .order_by('-rank', '-created_at'))
+    return _ordered_by(queryset, book_index.search(query))
+
+
+def search_authors(queryset, query):
+    """Авторы, похожие по имени на запрос (с опечатками), - сначала самые похожие."""
+    if uses_postgres(queryset.db):
+        if len(query) < TRIGRAM_MIN_LENGTH:
+            condition = Q()
+            for field in AUTHOR_NAME_FIELDS:
+                condition |= Q(**{f'{field}__istartswith': query})
+            return queryset.filter(condition)
+        condition = Q()
+        for field in AUTHOR_NAME_FIELDS:
+            condition |= Q(**{f'{field}__trigram_similar': query})
+        similar = Greatest(*[TrigramSimilarity(field, query) for field in AUTHOR_NAME_FIELDS])
+        return queryset.filter(condition).annotate(similarity=similar).order_by('-similarity', 'last_name')
+
+    # Запасной вариант: то же сходство на Python; вхождение подстроки тоже считается совпадением
+    needle = query.lower()
+    ranked = []
+    for author in queryset.values('pk', *AUTHOR_NAME_FIELDS):
+        names = [author[field] or '' for field in AUTHOR_NAME_FIELDS]
+        if any(needle in name.lower() for name in names):
+            score = 1.0
+        else:
+            score = max(similarity(name, query) for name in names)
+        if score >= TRIGRAM_THRESHOLD:
+            ranked.append((author['pk'], score))
+    ranked.sort(key=lambda item: -item[1])
+    return _ordered_by(queryset, ranked[:MAX_FALLBACK_RESULTS])
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, using='default', **kwargs):
+    if uses_postgres(using):
+        # UPDATE не шлёт post_save, поэтому рекурсии нет
+        refresh_book_vectors(Book.objects.using(using).filter(pk=instance.pk))
+    else:
+        book_index.update(instance)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    book_index.remove(instance.pk)
+
+
+@receiver(post_migrate)
+def create_search_indexes(sender, using='default', **kwargs):
+    if sender.name != 'api' or not uses_postgres(using):
+        return
+    try:
+        install_postgres_search(using)
+    except DatabaseError as e:
+        # Например, нет прав на CREATE EXTENSION: миграции не срываем, поиск останется без индексов
+        print(f'Индексы поиска не созданы: {e}. Выполните manage.py search_index с правами владельца базы',
+              file=sys.stderr)
@@ -36,6 +36,10 @@ class AuthorSerializer(serializers.ModelSerializer):
     
     def get_books_count(self, obj):
         """Количество книг автора"""
+        # Запросы из AuthorQuerySet.with_books_count() уже посчитали его в базе
+        books_count = getattr(obj, 'books_count', None)
+        if books_count is not None:
+            return books_count
         return obj.books.count()
 
 
@@ -2,10 +2,12 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Sum, Count, Avg
+from django.db.models import Count, Avg
 from django.utils import timezone
 from datetime import timedelta
 
+from . import rollups
+from .search import search_authors, search_books
 from .models import Employee, Author, Book, FinancialStatus, Report
 from .serializers import (
     EmployeeSerializer, AuthorSerializer, BookListSerializer, 
@@ -20,7 +22,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Employee.objects.all()
+        queryset = Employee.objects.select_related('user')
         position = self.request.query_params.get('position', None)
         department = self.request.query_params.get('department', None)
         
@@ -54,15 +56,12 @@ class AuthorViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Author.objects.all()
+        queryset = Author.objects.with_books_count()
         search = self.request.query_params.get('search', None)
         
         if search:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(middle_name__icontains=search)
-            )
+            # Нечёткий поиск по триграммам вместо трёх icontains
+            queryset = search_authors(queryset, search)
         
         return queryset
     
@@ -70,7 +69,7 @@ class AuthorViewSet(viewsets.ModelViewSet):
     def books(self, request, pk=None):
         """Книги автора"""
         author = self.get_object()
-        books = author.books.all()
+        books = author.books.with_relations()
         serializer = BookListSerializer(books, many=True)
         return Response(serializer.data)
 
@@ -86,7 +85,7 @@ class BookViewSet(viewsets.ModelViewSet):
         return BookDetailSerializer
     
     def get_queryset(self):
-        queryset = Book.objects.all()
+        queryset = Book.objects.with_relations()
         status_filter = self.request.query_params.get('status', None)
         author_id = self.request.query_params.get('author', None)
         search = self.request.query_params.get('search', None)
@@ -95,30 +94,26 @@ class BookViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(status=status_filter)
         if author_id:
             queryset = queryset.filter(authors__id=author_id)
+        queryset = queryset.distinct()
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(isbn__icontains=search) |
-                Q(description__icontains=search)
-            )
+            # Полнотекстовый поиск с ранжированием вместо icontains по всем текстовым полям
+            queryset = search_books(queryset, search)
         
-        return queryset.distinct()
+        return queryset
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Статистика по книгам"""
-        total_books = Book.objects.count()
+        totals = Book.objects.totals()
         by_status = Book.objects.values('status').annotate(
             count=Count('id')
         )
-        total_profit = sum(book.profit for book in Book.objects.all())
-        avg_price = Book.objects.aggregate(avg=Avg('price'))['avg'] or 0
         
         return Response({
-            'total_books': total_books,
+            'total_books': totals['total_books'],
             'by_status': list(by_status),
-            'total_profit': float(total_profit),
-            'average_price': float(avg_price)
+            'total_profit': float(totals['total_profit']),
+            'average_price': float(totals['average_price'])
         })
 
 
@@ -129,7 +124,7 @@ class FinancialStatusViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = FinancialStatus.objects.all()
+        queryset = FinancialStatus.objects.select_related('book')
         transaction_type = self.request.query_params.get('type', None)
         category = self.request.query_params.get('category', None)
         start_date = self.request.query_params.get('start_date', None)
@@ -149,34 +144,26 @@ class FinancialStatusViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Сводка по финансам"""
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        
-        queryset = FinancialStatus.objects.all()
-        if start_date:
-            queryset = queryset.filter(date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(date__lte=end_date)
-        
-        total_income = queryset.filter(transaction_type='income').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        
-        total_expense = queryset.filter(transaction_type='expense').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        try:
+            start_date = rollups.parse_date(request.query_params.get('start_date', None))
+            end_date = rollups.parse_date(request.query_params.get('end_date', None))
+        except ValueError:
+            return Response(
+                {'error': 'Даты указываются в формате ГГГГ-ММ-ДД'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
+        # Сводка читается из заранее посчитанных итогов, а не из всего журнала
+        summary = rollups.summarize(start_date, end_date)
+        total_income = summary['total_income']
+        total_expense = summary['total_expense']
         balance = total_income - total_expense
         
-        by_category = queryset.values('category', 'transaction_type').annotate(
-            total=Sum('amount')
-        )
-        
         return Response({
             'total_income': float(total_income),
             'total_expense': float(total_expense),
             'balance': float(balance),
-            'by_category': list(by_category)
+            'by_category': summary['by_category']
         })
 
 
@@ -187,7 +174,7 @@ class ReportViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Report.objects.all()
+        queryset = Report.objects.select_related('created_by__user')
         report_type = self.request.query_params.get('type', None)
         created_by = self.request.query_params.get('created_by', None)
         
@@ -220,18 +207,11 @@ class ReportViewSet(viewsets.ModelViewSet):
         data = {}
         
         if report_type == 'financial':
-            financial_records = FinancialStatus.objects.all()
-            if start_date:
-                financial_records = financial_records.filter(date__gte=start_date)
-            if end_date:
-                financial_records = financial_records.filter(date__lte=end_date)
-            
+            summary = rollups.summarize(start_date, end_date)
             data = {
-                'total_income': float(financial_records.filter(transaction_type='income').aggregate(
-                    total=Sum('amount'))['total'] or 0),
-                'total_expense': float(financial_records.filter(transaction_type='expense').aggregate(
-                    total=Sum('amount'))['total'] or 0),
-                'records_count': financial_records.count()
+                'total_income': float(summary['total_income']),
+                'total_expense': float(summary['total_expense']),
+                'records_count': summary['records_count']
             }
         
         elif report_type == 'books':
@@ -241,10 +221,11 @@ class ReportViewSet(viewsets.ModelViewSet):
             if end_date:
                 books = books.filter(publication_date__lte=end_date)
             
+            totals = books.totals()
             data = {
-                'total_books': books.count(),
+                'total_books': totals['total_books'],
                 'by_status': list(books.values('status').annotate(count=Count('id'))),
-                'total_profit': float(sum(book.profit for book in books))
+                'total_profit': float(totals['total_profit'])
             }
         
         elif report_type == 'employees':
@@ -262,10 +243,11 @@ class ReportViewSet(viewsets.ModelViewSet):
             if end_date:
                 books = books.filter(publication_date__lte=end_date)
             
+            totals = books.totals()
             data = {
-                'total_sold': books.aggregate(total=Sum('print_run'))['total'] or 0,
-                'total_revenue': float(sum(book.price * book.print_run for book in books)),
-                'books_count': books.count()
+                'total_sold': totals['total_sold'],
+                'total_revenue': float(totals['total_revenue']),
+                'books_count': totals['total_books']
             }
         
         serializer.save(created_by=employee, data=data)